@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+'''
+Compares the PDB call count and run time of the legacy per-pixel
+extraction (one pdb.gimp_drawable_get_pixel call per LED) against the
+bulk pixel region extraction used by the plug-in.
+
+Runs outside of GIMP using the gimpfu stand-in from this directory.
+Usage: python Benchmarks/bench_extraction.py [width] [height] [layers]
+'''
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+import gimpfu
+from gimpfu import pdb, FakeImage, FakeLayer
+import GimpLedPatternPlugin as plugin
+
+
+# Copy of the original per-pixel extraction loop, kept as the baseline.
+def legacyExtractLayerPixelInformation(layer, rowOrderType, parentOpacity = 100.0):
+	outPixels = bytearray()
+	for y in range(0, layer.height):
+		rowPixels = bytearray()
+		for x in range(0, layer.width):
+			num_channels, pixel = pdb.gimp_drawable_get_pixel(layer, x, y)
+			ledAlpha = int(255 * layer.opacity/100.0 * parentOpacity/100.0)
+			if num_channels == 4:
+				ledAlpha = int(pixel[3] * layer.opacity/100.0 * parentOpacity/100.0)
+			rowPixels.extend((pixel[0], pixel[1], pixel[2], ledAlpha))
+		if ((rowOrderType == plugin.ROW_PROCESSING_ODD and y % 2 == 1)
+			or (rowOrderType == plugin.ROW_PROCESSING_EVEN and y % 2 == 0)):
+			# Reverse the pixels of the row, one pixel at a time.
+			rowPixels = bytearray(value for pixelStart in range(len(rowPixels) - 4, -1, -4)
+				for value in rowPixels[pixelStart:pixelStart + 4])
+		outPixels += rowPixels
+	return outPixels
+
+
+def buildImage(width, height, layerCount):
+	layers = []
+	for index in range(0, layerCount):
+		data = bytearray((index * 7 + offset) % 256 for offset in range(0, width * height * 4))
+		layers.append(FakeLayer("Frame %d" % index, width, height, data, opacity=75.0))
+	return FakeImage("Bench %dx%d.xcf" % (width, height), width, height, layers)
+
+
+def measure(extractFunction, image):
+	pdb.reset()
+	start = time.time()
+	frames = []
+	for layer in image.layers:
+		frames.append(extractFunction(layer, plugin.ROW_PROCESSING_ODD))
+	elapsed = time.time() - start
+	return frames, elapsed, pdb.totalCalls()
+
+
+def main():
+	width = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+	height = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+	layerCount = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+	image = buildImage(width, height, layerCount)
+
+	legacyFrames, legacyTime, legacyCalls = measure(legacyExtractLayerPixelInformation, image)
+	ledLayout = plugin.MatrixLayout(plugin.ROW_PROCESSING_ODD)
+	bulkFrames, bulkTime, bulkCalls = measure(
+		lambda layer, rowOrderType: plugin.extractLayerPixelInformation(layer, ledLayout), image)
+	if legacyFrames != bulkFrames:
+		raise RuntimeError("Bulk extraction does not match the legacy extraction.")
+
+	print("Image: %dx%d, %d layers" % (width, height, layerCount))
+	print("%-8s %14s %16s %10s" % ("mode", "pdb calls", "calls per layer", "time (s)"))
+	print("%-8s %14d %16.1f %10.3f" % ("legacy", legacyCalls, legacyCalls / float(layerCount), legacyTime))
+	print("%-8s %14d %16.1f %10.3f" % ("bulk", bulkCalls, bulkCalls / float(layerCount), bulkTime))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+'''
+Measures the peak memory allocated by the plug-in while generating
+patterns with a growing number of layers. The image itself (the pixels
+GIMP would hold) is built before the measure starts, so only the memory
+used by the generation is reported. With frames streamed from extraction
+to the header file the peak should stay about the same for any number
+of layers.
+
+Runs outside of GIMP using the gimpfu stand-in from this directory.
+Needs Python 3 (tracemalloc).
+Usage: python3 Benchmarks/bench_memory.py [width] [height] [encoding] [layers ...]
+'''
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+from gimpfu import FakeImage, FakeLayer
+import GimpLedPatternPlugin as plugin
+
+
+def buildImage(width, height, layerCount):
+	layers = []
+	for index in range(0, layerCount):
+		data = bytearray(((index * 7 + offset) // 64) % 256 for offset in range(0, width * height * 4))
+		layers.append(FakeLayer("Frame %d" % index, width, height, data))
+	return FakeImage("Memory %dx%d.xcf" % (width, height), width, height, layers)
+
+
+def measure(image, encoding, outDir):
+	tracemalloc.start()
+	plugin.generate_led_pattern(plugin.CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO, image, 200,
+		plugin.ROW_PROCESSING_STANDARD, ledPin=6, frameEncoding=encoding, dir=outDir)
+	currentBytes, peakBytes = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return peakBytes
+
+
+def main():
+	width = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+	height = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+	encoding = plugin.COMMAND_LINE_ENCODINGS[sys.argv[3] if len(sys.argv) > 3 else "full"]
+	layerCounts = [int(layerCount) for layerCount in sys.argv[4:]] or [25, 100, 400]
+
+	frameBytes = width * height * plugin.PIXEL_BYTES
+	print("Frame: %dx%d (%d bytes of RGBA pixels)" % (width, height, frameBytes))
+	print("%-8s %14s %16s" % ("layers", "peak (KB)", "peak / frame"))
+	workDir = tempfile.mkdtemp()
+	try:
+		for layerCount in layerCounts:
+			image = buildImage(width, height, layerCount)
+			peakBytes = measure(image, encoding, workDir)
+			print("%-8d %14.1f %16.1f" % (layerCount, peakBytes / 1024.0, peakBytes / float(frameBytes)))
+	finally:
+		shutil.rmtree(workDir)
+
+
+if __name__ == "__main__":
+	main()
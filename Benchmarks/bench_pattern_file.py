@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+'''
+Measures what saving the extracted frames to a pattern file (.ledpattern)
+saves. Every case generates the same image read straight from its layers
+and again with the frames saved to a pattern file first, and reports the
+wall time and the layer reads (pixel regions) of each. Encodings that go
+over the frames more than once (Palette, Auto with its flash plan, the
+--verify check) read every layer once per pass without the pattern file,
+and only once with it. Generating again from the saved file reads no
+layers at all.
+
+The pixels of the pattern file are then read in place (memory-mapped,
+without copies) and as frames in LED order, to report how fast tools
+can go over them.
+
+Runs outside of GIMP using the gimpfu stand-in from this directory.
+Usage: python Benchmarks/bench_pattern_file.py [frames] [width] [height]
+'''
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+from gimpfu import FakeImage, FakeLayer
+import GimpLedPatternPlugin as plugin
+
+# (name, encoding, verify) of the cases measured.
+CASES = [
+	("full", "full", False),
+	("palette", "palette", False),
+	("auto", "auto", False),
+	("auto+verify", "auto", True),
+]
+
+
+class QuietProgress:
+
+	def pulse(self):
+		pass
+
+	def setText(self, text):
+		pass
+
+	def update(self, percentage):
+		pass
+
+	def end(self):
+		pass
+
+
+def buildImage(frameCount, width, height):
+	layers = []
+	for frameIndex in range(0, frameCount):
+		# Few colors so the palette fits, moving so every frame differs.
+		pixels = bytearray()
+		for y in range(0, height):
+			for x in range(0, width):
+				band = ((x + y + frameIndex) // 4) % 8
+				pixels.extend((band * 32, 255 - band * 32, (y * 16) % 256, 255))
+		layers.append(FakeLayer("Frame %d" % frameIndex, width, height, pixels))
+	return FakeImage("Bench.xcf", width, height, layers)
+
+
+# Returns (seconds, layers read) of a generation.
+def generate(imageSource, encodingName, verify, savePattern, outDir):
+	if os.path.isdir(outDir):
+		shutil.rmtree(outDir)
+	os.makedirs(outDir)
+	start = time.time()
+	plugin.generateLedPatternFromSource(imageSource, plugin.CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO, 200,
+		plugin.createLedLayout(plugin.ROW_PROCESSING_ODD), 6, plugin.COMMAND_LINE_ENCODINGS[encodingName],
+		outDir, QuietProgress(), profileReport=plugin.PROFILE_REPORT_JSON, verify=verify, savePattern=savePattern)
+	elapsed = time.time() - start
+	reportFile = open(plugin.getProfilePath(outDir, "BENCH", ".json"), "r")
+	report = json.load(reportFile)
+	reportFile.close()
+	return elapsed, report["counters"].get("pixelRegionReads", 0)
+
+
+def main():
+	frameCount = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+	width = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+	height = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+
+	image = buildImage(frameCount, width, height)
+	print("Pattern: %d frames, %dx%d" % (frameCount, width, height))
+	print("%-12s %-14s %10s %12s" % ("case", "frames from", "time (s)", "layer reads"))
+	workDir = tempfile.mkdtemp()
+	try:
+		for caseName, encodingName, verify in CASES:
+			outDir = os.path.join(workDir, caseName)
+			for sourceName, savePattern in (("layers", False), ("pattern file", True)):
+				elapsed, layerReads = generate(plugin.GimpImageSource(image), encodingName, verify, savePattern, outDir)
+				print("%-12s %-14s %10.3f %12d" % (caseName, sourceName, elapsed, layerReads))
+			patternPath = plugin.getPatternFilePath(outDir, "BENCH")
+			elapsed, layerReads = generate(plugin.createImageSource(patternPath), encodingName, verify, False,
+				os.path.join(workDir, caseName + "-again"))
+			print("%-12s %-14s %10.3f %12d" % (caseName, "saved file", elapsed, layerReads))
+
+		patternFile = plugin.PatternFile(patternPath)
+		try:
+			fileBytes = os.path.getsize(patternPath)
+			start = time.time()
+			frameHash = hashlib.sha1()
+			for framePos in range(0, patternFile.getFrameCount()):
+				frameHash.update(patternFile.getFramePixels(framePos))
+			viewTime = time.time() - start
+			ledLayout = plugin.createLedLayout(plugin.ROW_PROCESSING_ODD)
+			start = time.time()
+			for framePos in range(0, patternFile.getFrameCount()):
+				patternFile.readFrame(framePos, ledLayout)
+			readTime = time.time() - start
+		finally:
+			patternFile.close()
+		print("Pattern file: %d bytes, hashed in place at %.1f MB/s, read as LED frames at %.1f frames/s" % (
+			fileBytes, fileBytes / 1048576.0 / max(viewTime, 0.001), frameCount / max(readTime, 0.001)))
+	finally:
+		shutil.rmtree(workDir)
+
+
+if __name__ == "__main__":
+	main()
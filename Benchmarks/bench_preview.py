@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+'''
+Measures how fast the emulator plays a generated pattern back and draws
+its previews. The code of a long pattern is generated once, then read
+back and drawn as a PNG contact sheet and an animated GIF (when Pillow is
+installed). The check of the generated code against its frames (--verify)
+is timed as the extra time it adds to the generation.
+
+Runs outside of GIMP using the gimpfu stand-in from this directory.
+Usage: python Benchmarks/bench_preview.py [frames] [width] [height] [encoding]
+'''
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+from gimpfu import FakeImage, FakeLayer
+import GimpLedPatternPlugin as plugin
+
+
+class QuietProgress:
+
+	def pulse(self):
+		pass
+
+	def setText(self, text):
+		pass
+
+	def update(self, percentage):
+		pass
+
+	def end(self):
+		pass
+
+
+def buildImage(frameCount, width, height):
+	layers = []
+	for frameIndex in range(0, frameCount):
+		# Moving diagonal bands with a few flat areas so every encoding has work to do.
+		pixels = bytearray()
+		for y in range(0, height):
+			for x in range(0, width):
+				band = ((x + y + frameIndex) // 4) % 8
+				pixels.extend((band * 32, (x * 8 + frameIndex) % 256 if band < 4 else 0, y * 8 % 256, 255))
+		layers.append(FakeLayer("Frame %d" % frameIndex, width, height, pixels))
+	return FakeImage("Preview.xcf", width, height, layers)
+
+
+def generate(image, encoding, outDir, verify):
+	start = time.time()
+	plugin.generateLedPatternFromSource(plugin.GimpImageSource(image), plugin.CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO,
+		200, plugin.createLedLayout(plugin.ROW_PROCESSING_ODD), 6, encoding, outDir, QuietProgress(),
+		verify = verify)
+	return time.time() - start
+
+
+def main():
+	frameCount = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+	width = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+	height = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+	encoding = plugin.COMMAND_LINE_ENCODINGS[sys.argv[4] if len(sys.argv) > 4 else "auto"]
+
+	image = buildImage(frameCount, width, height)
+	print("Pattern: %d frames, %dx%d" % (frameCount, width, height))
+	print("%-10s %10s %12s" % ("step", "time (s)", "frames/s"))
+	workDir = tempfile.mkdtemp()
+	try:
+		generateTime = generate(image, encoding, workDir, False)
+		print("%-10s %10.3f %12.1f" % ("generate", generateTime, frameCount / generateTime))
+		verifyTime = generate(image, encoding, workDir, True) - generateTime
+		print("%-10s %10.3f %12.1f" % ("verify", verifyTime, frameCount / max(verifyTime, 0.001)))
+
+		headerPath = os.path.join(workDir, "Pattern_PREVIEW.h")
+		start = time.time()
+		emulator = plugin.LedPatternEmulator(headerPath)
+		for shownFrame in emulator.iterShownFrames():
+			pass
+		playTime = time.time() - start
+		print("%-10s %10.3f %12.1f" % ("play", playTime, frameCount / playTime))
+
+		previewTypes = [("png", plugin.PREVIEW_PNG)]
+		try:
+			import PIL
+			previewTypes.append(("gif", plugin.PREVIEW_GIF))
+		except ImportError:
+			print("Pillow is not installed, no GIF preview.")
+		for previewName, previewType in previewTypes:
+			start = time.time()
+			summary = plugin.writePatternPreview(plugin.LedPatternEmulator(headerPath),
+				plugin.createLedLayout(plugin.ROW_PROCESSING_ODD), width, height, workDir, previewType, QuietProgress())
+			previewTime = time.time() - start
+			print("%-10s %10.3f %12.1f  %s" % (previewName, previewTime, frameCount / previewTime, summary))
+	finally:
+		shutil.rmtree(workDir)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+'''
+Streams a pattern to the pseudo-terminal stand-in of the receiver sketch
+(serial_loopback.py) with every packet encoding and reports the frames per
+second reached and the bytes sent per frame. The last run rejects a few
+packets to go through the frames sent again.
+The frames shown by the stand-in must match the colors of the pattern.
+
+The pattern is a strip of moving color bands with a few flat areas, so the
+Delta and RLE packets have work to do. Use a short delay to measure how fast
+the link can go, the pattern delay otherwise limits the frames per second.
+
+Runs outside of GIMP using the gimpfu stand-in from this directory.
+Needs a POSIX system (pty).
+Usage: python Benchmarks/bench_stream.py [frames] [leds] [baud] [delay]
+'''
+import os
+import shutil
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+from gimpfu import FakeImage, FakeLayer
+from serial_loopback import LoopbackReceiver
+import GimpLedPatternPlugin as plugin
+
+
+class QuietProgress:
+
+	def pulse(self):
+		pass
+
+	def setText(self, text):
+		pass
+
+	def update(self, percentage):
+		pass
+
+	def end(self):
+		pass
+
+
+def buildFrameColors(ledCount, frameIndex):
+	colors = bytearray()
+	for ledPos in range(0, ledCount):
+		band = ((ledPos + frameIndex) // 8) % 4
+		if band == 0:
+			colors.extend((0, 0, 0))
+		else:
+			colors.extend((band * 64, (ledPos * 4 + frameIndex) % 256 if band == 3 else 32, 255 - band * 64))
+	return colors
+
+
+def buildImage(frameColors):
+	ledCount = len(frameColors[0]) // 3
+	layers = []
+	for frameIndex, colors in enumerate(frameColors):
+		pixels = bytearray()
+		for ledPos in range(0, ledCount):
+			pixels.extend(colors[ledPos * 3:ledPos * 3 + 3])
+			pixels.append(255)
+		layers.append(FakeLayer("Frame %d" % frameIndex, ledCount, 1, pixels))
+	return FakeImage("Stream.xcf", ledCount, 1, layers)
+
+
+def stream(image, encoding, baudRate, delay, outDir, rejectPackets=()):
+	ledCount = image.width
+	receiver = LoopbackReceiver(ledCount, baudRate, rejectPackets).start()
+	try:
+		plugin.generateLedPatternFromSource(plugin.GimpImageSource(image), plugin.CHOICE_SERIAL_STREAM,
+			delay, plugin.createLedLayout(plugin.ROW_PROCESSING_STANDARD), 6, encoding, outDir, QuietProgress(),
+			streamPort=receiver.path, streamBaud=baudRate)
+	finally:
+		receiver.stop()
+	return receiver
+
+
+def main():
+	frameCount = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+	ledCount = int(sys.argv[2]) if len(sys.argv) > 2 else 150
+	baudRate = int(sys.argv[3]) if len(sys.argv) > 3 else plugin.STREAM_BAUD_RATES[-1]
+	delay = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+
+	frameColors = [buildFrameColors(ledCount, frameIndex) for frameIndex in range(0, frameCount)]
+	image = buildImage(frameColors)
+	print("Pattern: %d frames of %d LEDs, %d baud, %d ms delay" % (frameCount, ledCount, baudRate, delay))
+	print("%-10s %8s %10s %16s %8s" % ("encoding", "frames", "fps", "bytes / frame", "resent"))
+	workDir = tempfile.mkdtemp()
+	try:
+		runs = [(encodingName, ()) for encodingName in ("full", "delta", "rle", "auto")]
+		runs.append(("auto", (3, 10, 11)))
+		for encodingName, rejectPackets in runs:
+			receiver = stream(image, plugin.COMMAND_LINE_ENCODINGS[encodingName], baudRate, delay, workDir,
+				rejectPackets)
+			shownColors = [colors for shownTime, colors in receiver.shownFrames]
+			if shownColors != [bytes(colors) for colors in frameColors]:
+				raise RuntimeError("Frames shown with %s packets differ from the pattern." % encodingName)
+			shownTimes = [shownTime for shownTime, colors in receiver.shownFrames]
+			framesPerSecond = (len(shownTimes) - 1) / max(shownTimes[-1] - shownTimes[0], 0.001)
+			frameBytes = receiver.bytesReceived / float(len(shownTimes))
+			print("%-10s %8d %10.1f %16.1f %8d" % (encodingName, len(shownTimes), framesPerSecond, frameBytes,
+				receiver.rejected))
+	finally:
+		shutil.rmtree(workDir)
+
+
+if __name__ == "__main__":
+	main()
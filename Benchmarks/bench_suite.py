@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+'''
+Runs generate_led_pattern end to end on synthetic images and reports,
+as JSON, the wall time, PDB calls, peak RSS and bytes of code generated
+for every case, so results can be compared between changes.
+
+Cases are a matrix of image sizes (300x1 strip, 16x16 and 64x64 matrices,
+four tiled 16x16 panels), frame counts and frame encodings. Every case
+runs in its own Python process so the peak RSS of one case doesn't hide
+the next one.
+
+Runs outside of GIMP using the gimpfu stand-in from this directory.
+Usage: python Benchmarks/bench_suite.py [--frames 10 100] [--encodings full rle]
+                                        [--sizes strip matrix16 ...] [--out results.json]
+'''
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+# Image sizes of the matrix: (width, height, tiles per frame).
+IMAGE_SIZES = {
+	"strip300x1": (300, 1, 0),
+	"matrix16x16": (16, 16, 0),
+	"matrix64x64": (64, 64, 0),
+	"tiled4x16x16": (64, 16, 4),
+}
+
+
+# Pixels of a frame: a gradient that moves a bit every frame, with some
+# transparency so the dimming has work to do.
+def buildPixels(width, height, frameIndex, seed=0):
+	pixels = bytearray()
+	for y in range(0, height):
+		for x in range(0, width):
+			band = (x + y + frameIndex + seed) // 4
+			pixels.extend((band * 16 % 256, (x * 4 + frameIndex) % 256, (y * 8 + seed) % 256,
+				255 if band % 3 else 128))
+	return pixels
+
+
+def buildImage(sizeName, frameCount):
+	from gimpfu import FakeImage, FakeLayer, FakeGroupLayer
+	width, height, tileCount = IMAGE_SIZES[sizeName]
+	layers = []
+	for frameIndex in range(0, frameCount):
+		if tileCount == 0:
+			layers.append(FakeLayer("Frame %d" % frameIndex, width, height,
+				buildPixels(width, height, frameIndex), opacity=90.0))
+			continue
+		# Panels side by side, chained left to right.
+		tileWidth = width // tileCount
+		tiles = [FakeLayer("Tile %d" % tileIndex, tileWidth, height,
+			buildPixels(tileWidth, height, frameIndex, tileIndex), offsets=(tileIndex * tileWidth, 0))
+			for tileIndex in range(0, tileCount)]
+		layers.append(FakeGroupLayer("TLF_Frame %d" % frameIndex, width, height, tiles))
+	return FakeImage("Bench %s.xcf" % sizeName, width, height, layers)
+
+
+# Peak resident set size of this process in KB, None where it can't be read.
+def getPeakRssKb():
+	try:
+		import resource
+	except ImportError:
+		return None
+	peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == "darwin":
+		# Reported in bytes instead of KB.
+		peakRss //= 1024
+	return peakRss
+
+
+def getOutputBytes(outDir):
+	outputBytes = {}
+	for fileName in sorted(os.listdir(outDir)):
+		outputBytes[fileName] = os.path.getsize(os.path.join(outDir, fileName))
+	return outputBytes
+
+
+# Runs a single case in this process and returns its results.
+def runCase(sizeName, frameCount, encodingName):
+	from gimpfu import pdb
+	import GimpLedPatternPlugin as plugin
+
+	image = buildImage(sizeName, frameCount)
+	imageRssKb = getPeakRssKb()
+	outDir = tempfile.mkdtemp()
+	try:
+		pdb.reset()
+		start = time.time()
+		plugin.generate_led_pattern(ledType=plugin.CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO, newimg=image,
+			frameDelay=200, rowOrderType=plugin.ROW_PROCESSING_ODD, ledPin=6,
+			frameEncoding=plugin.COMMAND_LINE_ENCODINGS[encodingName], dir=outDir)
+		wallTime = time.time() - start
+		outputBytes = getOutputBytes(outDir)
+	finally:
+		shutil.rmtree(outDir)
+
+	width, height, tileCount = IMAGE_SIZES[sizeName]
+	return {
+		"size": sizeName,
+		"width": width,
+		"height": height,
+		"tiles": tileCount,
+		"frames": frameCount,
+		"encoding": encodingName,
+		"wallTimeSeconds": round(wallTime, 6),
+		"pdbCalls": pdb.totalCalls(),
+		"pdbCallsByName": dict(pdb.calls),
+		"imageRssKb": imageRssKb,
+		"peakRssKb": getPeakRssKb(),
+		"outputBytes": sum(outputBytes.values()),
+		"outputFileBytes": outputBytes,
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Runs the plug-in benchmark suite.")
+	parser.add_argument("--sizes", nargs="+", choices=sorted(IMAGE_SIZES), default=sorted(IMAGE_SIZES))
+	parser.add_argument("--frames", nargs="+", type=int, default=[10, 100])
+	parser.add_argument("--encodings", nargs="+", default=["full"],
+		help="Frame encodings to run (full, delta, rle, palette).")
+	parser.add_argument("--out", help="File to write the JSON results to, printed when not set.")
+	# Internal: run a single case and print its JSON.
+	parser.add_argument("--case", nargs=3, metavar=("SIZE", "FRAMES", "ENCODING"), help=argparse.SUPPRESS)
+	options = parser.parse_args()
+
+	if options.case is not None:
+		sizeName, frameCount, encodingName = options.case
+		print(json.dumps(runCase(sizeName, int(frameCount), encodingName)))
+		return
+
+	results = []
+	for sizeName in options.sizes:
+		for frameCount in options.frames:
+			for encodingName in options.encodings:
+				caseOutput = subprocess.check_output([sys.executable, os.path.abspath(__file__),
+					"--case", sizeName, str(frameCount), encodingName])
+				results.append(json.loads(caseOutput.decode("utf-8").strip().splitlines()[-1]))
+				sys.stderr.write("%-14s %5d frames %-8s %8.3fs\n" % (sizeName, frameCount, encodingName,
+					results[-1]["wallTimeSeconds"]))
+
+	report = {
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"results": results,
+	}
+	reportText = json.dumps(report, indent=2, sort_keys=True)
+	if options.out:
+		outFile = open(options.out, "w")
+		outFile.write(reportText + "\n")
+		outFile.close()
+	else:
+		print(reportText)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+'''
+Measures how the headless generation scales with the number of worker
+processes. A pattern of PNG frames is written to a temporary directory
+and generated with 1, 2, 4, ... worker processes up to the CPU count
+(or the given maximum).
+The generated code must be identical for every worker count.
+
+Runs without GIMP or any extra package.
+Usage: python Benchmarks/bench_workers.py [frames] [width] [height] [encoding] [max workers]
+'''
+import multiprocessing
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import GimpLedPatternPlugin as plugin
+
+
+class QuietProgress:
+
+	def pulse(self):
+		pass
+
+	def setText(self, text):
+		pass
+
+	def update(self, percentage):
+		pass
+
+	def end(self):
+		pass
+
+
+def pngChunk(chunkType, chunkData):
+	return (struct.pack(">I", len(chunkData)) + chunkType + chunkData
+		+ struct.pack(">I", zlib.crc32(chunkType + chunkData) & 0xffffffff))
+
+
+# Writes an RGBA PNG using the Sub filter on every row, so reading it
+# exercises the same row unfiltering real files need.
+def writePng(path, width, height, pixels):
+	rowBytes = width * 4
+	filtered = bytearray()
+	for y in range(0, height):
+		row = pixels[y * rowBytes:(y + 1) * rowBytes]
+		filtered.append(1)
+		filtered.extend((row[i] - (row[i - 4] if i >= 4 else 0)) & 0xFF for i in range(0, rowBytes))
+	pngFile = open(path, "wb")
+	pngFile.write(plugin.PNG_SIGNATURE
+		+ pngChunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+		+ pngChunk(b"IDAT", zlib.compress(bytes(filtered)))
+		+ pngChunk(b"IEND", b""))
+	pngFile.close()
+
+
+def writeFrames(frameDir, frameCount, width, height):
+	os.makedirs(frameDir)
+	for index in range(0, frameCount):
+		# Moving diagonal bands with a few flat areas so every encoding has work to do.
+		pixels = bytearray()
+		for y in range(0, height):
+			for x in range(0, width):
+				band = ((x + y + index) // 4) % 8
+				pixels.extend((band * 32, (x * 8 + index) % 256 if band < 4 else 0, y * 8 % 256, 255))
+		writePng(os.path.join(frameDir, "%04d.png" % index), width, height, pixels)
+
+
+def generate(frameDir, outDir, encoding, workers):
+	os.makedirs(outDir)
+	start = time.time()
+	plugin.generateLedPatternFromSource(plugin.createImageSource(frameDir),
+		plugin.CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO, 200, plugin.MatrixLayout(plugin.ROW_PROCESSING_ODD), 6,
+		encoding, outDir, QuietProgress(), workers=workers)
+	elapsed = time.time() - start
+	outFile = open(os.path.join(outDir, "Pattern_BENCH.h"), "r")
+	code = outFile.read()
+	outFile.close()
+	return elapsed, code
+
+
+def main():
+	frameCount = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+	width = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+	height = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+	encoding = plugin.COMMAND_LINE_ENCODINGS[sys.argv[4] if len(sys.argv) > 4 else "rle"]
+
+	cpuCount = multiprocessing.cpu_count()
+	maxWorkers = int(sys.argv[5]) if len(sys.argv) > 5 else cpuCount
+	workerCounts = [1]
+	while workerCounts[-1] * 2 <= maxWorkers:
+		workerCounts.append(workerCounts[-1] * 2)
+	if workerCounts[-1] != maxWorkers:
+		workerCounts.append(maxWorkers)
+
+	workDir = tempfile.mkdtemp()
+	try:
+		frameDir = os.path.join(workDir, "Bench")
+		writeFrames(frameDir, frameCount, width, height)
+
+		print("Pattern: %d frames, %dx%d, %d CPU cores" % (frameCount, width, height, cpuCount))
+		print("%-8s %10s %12s %8s" % ("workers", "time (s)", "frames/s", "speedup"))
+		baseTime, baseCode = None, None
+		for workers in workerCounts:
+			# Every run reads the files again.
+			plugin.lastImageFile[0] = None
+			elapsed, code = generate(frameDir, os.path.join(workDir, "out%d" % workers), encoding, workers)
+			if baseCode is None:
+				baseTime, baseCode = elapsed, code
+			elif code != baseCode:
+				raise RuntimeError("Generated code with %d workers differs from 1 worker." % workers)
+			print("%-8d %10.3f %12.1f %7.2fx" % (workers, elapsed, frameCount / elapsed, baseTime / elapsed))
+	finally:
+		shutil.rmtree(workDir)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+'''
+Regression check for CI: generates a pattern for every frame encoding,
+color format, LED layout and player, plays the generated code back with
+the emulator and checks every frame against the layers it was generated
+from (the --verify option of the command line). A PNG preview of every
+case is drawn too, so the drawing is exercised as well.
+
+The pattern has a linear fade (tweened with --tween), two identical
+frames (merged), a frame with a duration of its own and a half
+transparent frame. A second pattern with few colors uses palettes. Some
+cases save the frames to a pattern file and generate from it, so every
+LED layout is applied to frames read back from the file as well, and
+the saved file is previewed without generating code. A single
+frame pattern is also played again over other content drawn on the strip,
+which its frame has to replace. The layers of a last pattern are named the
+same once their GIMP animation tags are removed, each must get its own frame.
+
+Runs outside of GIMP using the gimpfu stand-in from this directory.
+Exits with 1 when any case fails.
+Usage: python Benchmarks/check_patterns.py [--gif] [--keep DIR]
+'''
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import traceback
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(1, os.path.dirname(BENCH_DIR))
+
+from gimpfu import FakeImage, FakeLayer
+import GimpLedPatternPlugin as plugin
+
+WIDTH = 8
+HEIGHT = 6
+FRAME_COUNT = 24
+# Layer names of the pattern whose frame names collide once their tags are removed.
+TAGGED_FRAME_NAMES = ("Walk (100ms)", "Walk (300ms)", "Walk (100ms)(replace)", "Walk_2")
+
+# (name, layout) of the LED layouts checked.
+LAYOUTS = [
+	("rows", lambda: plugin.createLedLayout(plugin.ROW_PROCESSING_STANDARD)),
+	("flip-even-90", lambda: plugin.createLedLayout(plugin.ROW_PROCESSING_EVEN, rotation = 90)),
+	("columns-flip-odd", lambda: plugin.createLedLayout(plugin.ROW_PROCESSING_ODD, plugin.LED_WIRING_COLUMNS)),
+	# Every other LED of the last row has no pixel, LED 0 is at the bottom right.
+	("mapped", lambda: plugin.MappedLayout([[WIDTH * HEIGHT - 1 - (y * WIDTH + x)
+		if y < HEIGHT - 1 or x % 2 == 0 else plugin.NO_PIXEL for x in range(0, WIDTH)]
+		for y in range(0, HEIGHT)], "check mapped")),
+]
+
+
+class QuietProgress:
+
+	def pulse(self):
+		pass
+
+	def setText(self, text):
+		pass
+
+	def update(self, percentage):
+		pass
+
+	def end(self):
+		pass
+
+
+def buildPattern(colorCount=None, frameCount=FRAME_COUNT):
+	layers = []
+	for frameIndex in range(0, frameCount):
+		pixels = bytearray()
+		for y in range(0, HEIGHT):
+			for x in range(0, WIDTH):
+				if colorCount is not None:
+					colorIndex = (x + y * 3 + frameIndex) % colorCount
+					color = ((colorIndex * 53) % 256, (colorIndex * 97) % 256, (colorIndex * 151) % 256)
+				elif frameIndex < 6:
+					color = (frameIndex * 40, 10, 250 - frameIndex * 40)
+				elif (x + frameIndex) % 5 == 0:
+					color = (255, y * 40, 0)
+				else:
+					color = ((x * 29 + frameIndex * 3) % 256, y * 41, (x * y * 7) % 256)
+				pixels.extend(color)
+				pixels.append(128 if frameIndex == 12 and x == 1 else 255)
+		name = "Frame %d" % frameIndex
+		if frameIndex == FRAME_COUNT - 1:
+			name += " (350ms)"
+		layers.append(FakeLayer(name, WIDTH, HEIGHT, pixels))
+		if frameIndex == 9:
+			layers.append(FakeLayer(name + " again", WIDTH, HEIGHT, bytearray(pixels)))
+	if frameCount == 1:
+		return FakeImage("CheckSingle.xcf", WIDTH, HEIGHT, layers)
+	return FakeImage("Check.xcf" if colorCount is None else "CheckPalette.xcf", WIDTH, HEIGHT, layers)
+
+
+def buildTaggedPattern():
+	image = buildPattern(frameCount=len(TAGGED_FRAME_NAMES))
+	for layer, name in zip(image.layers, TAGGED_FRAME_NAMES):
+		layer.name = name
+	image.name = "CheckTagged.xcf"
+	return image
+
+
+def buildCases():
+	cases = []
+	for encodingName in sorted(plugin.COMMAND_LINE_ENCODINGS):
+		for formatName in sorted(plugin.COMMAND_LINE_COLOR_FORMATS):
+			cases.append(dict(encoding=encodingName, colorFormat=formatName))
+	for layoutName, layout in LAYOUTS:
+		for encodingName in ("full", "delta", "rle", "native"):
+			cases.append(dict(encoding=encodingName, layout=layoutName))
+		cases.append(dict(encoding="auto", layout=layoutName, savePattern=True))
+		cases.append(dict(encoding="full", layout=layoutName, colorFormat="rgb565-dither"))
+	for encodingName in ("full", "rle", "auto"):
+		for formatName in ("rgb24", "rgb565"):
+			cases.append(dict(encoding=encodingName, colorFormat=formatName, tween=plugin.TWEEN_TOLERANCE))
+			cases.append(dict(encoding=encodingName, colorFormat=formatName, tween=plugin.TWEEN_TOLERANCE,
+				player="non-blocking"))
+	for formatName in ("rgb24", "rgb565"):
+		for colorCount in (12, 40):
+			cases.append(dict(encoding="palette", colorFormat=formatName, colors=colorCount))
+	for encodingName in ("full", "rle", "native"):
+		for playerName in sorted(plugin.COMMAND_LINE_PLAYERS):
+			cases.append(dict(encoding=encodingName, player=playerName, replay=True))
+	cases.append(dict(encoding="native", colorOrder="bgr", gamma=2.2, brightness=60))
+	cases.append(dict(encoding="palette", colorOrder="brg", colors=12, gamma=2.2))
+	for encodingName in ("full", "delta"):
+		cases.append(dict(encoding=encodingName, tagged=True))
+	return cases
+
+
+def getCaseName(case):
+	return " ".join("%s=%s" % (key, case[key]) for key in sorted(case))
+
+
+def runCase(case, images, outDir, preview):
+	if case.get("tagged"):
+		image = images["tagged"]
+	else:
+		image = images["single" if case.get("replay") else case.get("colors")]
+	ledLayout = dict(LAYOUTS)[case.get("layout", "rows")]()
+	plugin.generateLedPatternFromSource(plugin.GimpImageSource(image),
+		plugin.CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO, 200, ledLayout, 6,
+		plugin.COMMAND_LINE_ENCODINGS[case["encoding"]], outDir, QuietProgress(),
+		player = plugin.COMMAND_LINE_PLAYERS[case.get("player", "blocking")],
+		colorOrder = case.get("colorOrder", "grb").upper(),
+		colorFormat = plugin.COMMAND_LINE_COLOR_FORMATS[case.get("colorFormat", "rgb32")],
+		gamma = case.get("gamma", plugin.GAMMA_NONE), brightness = case.get("brightness", plugin.BRIGHTNESS_FULL),
+		tweenTolerance = case.get("tween"), preview = preview, verify = True,
+		savePattern = case.get("savePattern", False))
+	patternId = plugin.nameToConst(os.path.splitext(image.name)[0])
+	if case.get("savePattern"):
+		plugin.previewPatternFile(plugin.getPatternFilePath(outDir, patternId), ledLayout, 200, outDir, 
+			preview, QuietProgress())
+	if case.get("replay"):
+		checkReplay(os.path.join(outDir, "Pattern_%s.h" % patternId))
+
+
+# Plays the pattern again after the sketch drew something else on the strip. 
+# Every frame must show the same as when the pattern is played from a clear strip, 
+# even a frame whose data the player showed last time.
+def checkReplay(headerPath):
+	emulator = plugin.LedPatternEmulator(headerPath)
+	clearFrames = list(emulator.iterShownFrames())
+	otherRgb = bytearray(b"\x5a\x21\xc3") * emulator.getTotalLeds()
+	for framePos, (shownFrame, clearFrame) in enumerate(zip(emulator.iterShownFrames(otherRgb), clearFrames)):
+		if shownFrame != clearFrame:
+			raise ValueError("Frame %d keeps the other content of the strip when played again." % framePos)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Checks the generated code of every option against its frames.")
+	parser.add_argument("--gif", action="store_true", help="Draws animated GIF previews (needs Pillow).")
+	parser.add_argument("--keep", metavar="DIR", help="Keeps the generated code and previews in DIR.")
+	options = parser.parse_args()
+	if options.gif:
+		try:
+			import PIL
+		except ImportError:
+			parser.error("--gif needs the Pillow package.")
+
+	images = dict((colorCount, buildPattern(colorCount)) for colorCount in (None, 12, 40))
+	images["single"] = buildPattern(frameCount=1)
+	images["tagged"] = buildTaggedPattern()
+	preview = plugin.PREVIEW_GIF if options.gif else plugin.PREVIEW_PNG
+	workDir = options.keep or tempfile.mkdtemp()
+	failures = 0
+	try:
+		for caseIndex, case in enumerate(buildCases()):
+			outDir = os.path.join(workDir, "case%03d" % caseIndex)
+			if not os.path.isdir(outDir):
+				os.makedirs(outDir)
+			try:
+				runCase(case, images, outDir, preview)
+				print("ok    %s" % getCaseName(case))
+			except Exception:
+				failures += 1
+				print("FAIL  %s" % getCaseName(case))
+				traceback.print_exc(file=sys.stdout)
+	finally:
+		if options.keep is None:
+			shutil.rmtree(workDir)
+	print("%d cases failed." % failures if failures else "All cases passed.")
+	return 1 if failures else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
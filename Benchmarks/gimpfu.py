@@ -0,0 +1,171 @@
+'''
+Minimal stand-in for GIMP's gimpfu module.
+
+Only the parts of the Python-Fu API used by GimpLedPatternPlugin.py are
+provided. Images and layers are backed by in-memory byte buffers so the
+plug-in can be exercised and measured outside of a running GIMP. Every
+call made through the fake pdb object is counted in pdb.calls.
+'''
+
+# Python-Fu parameter types used by register().
+PF_OPTION = 0
+PF_IMAGE = 1
+PF_SPINNER = 2
+PF_DIRNAME = 3
+PF_TOGGLE = 4
+PF_STRING = 5
+PF_FILENAME = 6
+PF_SLIDER = 7
+
+# Image base types.
+RGB = 0
+GRAY = 1
+INDEXED = 2
+
+
+class FakePixelRegion:
+
+	def __init__(self, layer, x, y, width, height):
+		self.layer = layer
+		self.x = x
+		self.y = y
+		self.w = width
+		self.h = height
+
+	# Supports rgn[x0:x1, y0:y1] the same way gimp.PixelRgn does.
+	def __getitem__(self, key):
+		xSlice, ySlice = key
+		x0, x1 = xSlice.start, xSlice.stop
+		y0, y1 = ySlice.start, ySlice.stop
+		layer = self.layer
+		bpp = layer.bpp
+		rowBytes = layer.width * bpp
+		if x0 == 0 and x1 == layer.width:
+			return bytes(layer.data[y0 * rowBytes:y1 * rowBytes])
+		out = bytearray()
+		for y in range(y0, y1):
+			start = y * rowBytes + x0 * bpp
+			out.extend(layer.data[start:start + (x1 - x0) * bpp])
+		return bytes(out)
+
+
+class FakeLayer:
+
+	def __init__(self, name, width, height, data=None, bpp=4, opacity=100.0,
+			visible=True, offsets=(0, 0), image=None):
+		self.name = name
+		self.width = width
+		self.height = height
+		self.bpp = bpp
+		self.opacity = opacity
+		self.visible = visible
+		self.offsets = offsets
+		self.image = image
+		self.layers = []
+		if data is None:
+			data = bytearray(width * height * bpp)
+		self.data = bytearray(data)
+
+	@property
+	def has_alpha(self):
+		if self.image is not None and self.image.base_type == INDEXED:
+			return self.bpp == 2
+		return self.bpp in (2, 4)
+
+	@property
+	def is_indexed(self):
+		return self.image is not None and self.image.base_type == INDEXED
+
+	@property
+	def is_gray(self):
+		return self.image is not None and self.image.base_type == GRAY
+
+	def get_pixel_rgn(self, x, y, width, height, dirty=False, shadow=False):
+		return FakePixelRegion(self, x, y, width, height)
+
+
+class FakeGroupLayer(FakeLayer):
+
+	def __init__(self, name, width, height, layers, opacity=100.0,
+			visible=True, offsets=(0, 0), image=None):
+		FakeLayer.__init__(self, name, width, height, bpp=4, opacity=opacity,
+			visible=visible, offsets=offsets, image=image)
+		self.layers = list(layers)
+
+
+class FakeImage:
+
+	def __init__(self, name, width, height, layers, base_type=RGB, colormap=None):
+		self.name = name
+		self.width = width
+		self.height = height
+		self.layers = list(layers)
+		self.base_type = base_type
+		self.colormap = colormap or []
+		for layer in self.allLayers():
+			layer.image = self
+
+	def allLayers(self, parent=None):
+		out = []
+		for layer in (parent or self).layers:
+			out.append(layer)
+			out.extend(self.allLayers(layer))
+		return out
+
+
+class FakePdb:
+
+	def __init__(self):
+		self.calls = {}
+
+	def reset(self):
+		self.calls = {}
+
+	def totalCalls(self):
+		return sum(self.calls.values())
+
+	def _count(self, name):
+		self.calls[name] = self.calls.get(name, 0) + 1
+
+	def gimp_drawable_get_pixel(self, layer, x, y):
+		self._count("gimp_drawable_get_pixel")
+		start = (y * layer.width + x) * layer.bpp
+		return layer.bpp, tuple(layer.data[start:start + layer.bpp])
+
+	def gimp_item_is_group(self, layer):
+		self._count("gimp_item_is_group")
+		return isinstance(layer, FakeGroupLayer)
+
+	def gimp_drawable_get_visible(self, layer):
+		self._count("gimp_drawable_get_visible")
+		return layer.visible
+
+	def gimp_image_get_colormap(self, image):
+		self._count("gimp_image_get_colormap")
+		flat = []
+		for color in image.colormap:
+			flat.extend(color)
+		return len(flat), tuple(flat)
+
+	def gimp_progress_pulse(self):
+		self._count("gimp_progress_pulse")
+
+	def gimp_progress_set_text(self, text):
+		self._count("gimp_progress_set_text")
+
+	def gimp_progress_update(self, percentage):
+		self._count("gimp_progress_update")
+
+	def gimp_progress_end(self):
+		self._count("gimp_progress_end")
+
+
+pdb = FakePdb()
+
+
+def register(*args, **kwargs):
+	pass
+
+
+def main():
+	pass
@@ -0,0 +1,161 @@
+'''
+Pseudo-terminal stand-in for a board running the stream receiver sketch
+(StreamReceiver_<NAME>.ino), so the serial streaming can be exercised
+without a board.
+
+The plug-in streams to the slave end of a pty (LoopbackReceiver.path) while
+a thread decodes the packets from the master end the same way the sketch
+does: colors are written into the LEDs as they arrive, the frame is only
+shown once the checksum matches and every packet is answered. The decoder
+is written from the protocol, not taken from the plug-in, so it checks the
+packets the plug-in sends. The time the bytes take on a serial line and
+the time the strip takes to show a frame can be simulated, so the frames
+per second reached come close to a real board.
+
+Needs a POSIX system (pty, termios).
+'''
+import os
+import pty
+import select
+import threading
+import time
+import tty
+
+# Values of the receiver sketch.
+STREAM_SYNC = 0xA5
+PACKET_PING = 0
+PACKET_FULL = 1
+PACKET_DELTA = 2
+PACKET_RLE = 3
+STREAM_ACK = 0x06
+STREAM_NAK = 0x15
+STREAM_TIMEOUT = 0.1
+
+# Microseconds a WS2812 strip takes to show each LED.
+SHOW_MICROS_PER_LED = 30
+
+
+class PacketTimeout(Exception):
+	pass
+
+
+class LoopbackReceiver:
+
+	# ledCount - LEDs of the strip, colors sent past the end are dropped like the sketch does.
+	# baudRate - Serial line speed to simulate (10 bits per byte), None for no delay.
+	# rejectPackets - Numbers (from 0) of the packets answered as if their checksum didn't match.
+	def __init__(self, ledCount, baudRate=None, rejectPackets=()):
+		self.ledCount = ledCount
+		self.baudRate = baudRate
+		self.rejectPackets = set(rejectPackets)
+		self.leds = bytearray(ledCount * 3)
+		# (time, colors of the LEDs) of every frame shown.
+		self.shownFrames = []
+		self.packets = 0
+		self.pings = 0
+		self.rejected = 0
+		self.bytesReceived = 0
+		self.masterFd, self.slaveFd = pty.openpty()
+		tty.setraw(self.slaveFd)
+		self.path = os.ttyname(self.slaveFd)
+		self.pending = bytearray()
+		self.running = False
+		self.thread = None
+
+	def start(self):
+		self.running = True
+		self.thread = threading.Thread(target=self.run)
+		self.thread.daemon = True
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.running = False
+		self.thread.join()
+		os.close(self.masterFd)
+		os.close(self.slaveFd)
+
+	def run(self):
+		while self.running:
+			try:
+				if self.readByte(0.05) == STREAM_SYNC:
+					self.readPacket()
+			except PacketTimeout:
+				self.reply(STREAM_NAK)
+
+	def reply(self, value):
+		os.write(self.masterFd, bytes(bytearray([value])))
+
+	# Returns the next byte from the plug-in, None after timeout seconds without any.
+	def readByte(self, timeout):
+		if not self.pending:
+			if not select.select([self.masterFd], [], [], timeout)[0]:
+				return None
+			try:
+				received = os.read(self.masterFd, 4096)
+			except OSError:
+				# The plug-in closed the port.
+				time.sleep(timeout)
+				return None
+			if self.baudRate:
+				time.sleep(len(received) * 10.0 / self.baudRate)
+			self.bytesReceived += len(received)
+			self.pending.extend(received)
+		value = self.pending[0]
+		del self.pending[0]
+		return value
+
+	def readPacketByte(self):
+		value = self.readByte(STREAM_TIMEOUT)
+		if value is None:
+			raise PacketTimeout()
+		self.checksumLow = (self.checksumLow + value) % 255
+		self.checksumHigh = (self.checksumHigh + self.checksumLow) % 255
+		return value
+
+	def setLed(self, ledPos, red, green, blue):
+		if ledPos < self.ledCount:
+			self.leds[ledPos * 3:ledPos * 3 + 3] = bytearray((red, green, blue))
+
+	def readPacket(self):
+		self.checksumLow = 0
+		self.checksumHigh = 0
+		packetType = self.readPacketByte()
+		payloadLength = self.readPacketByte() | (self.readPacketByte() << 8)
+		ledPos = 0
+		payloadPos = 0
+		while payloadPos < payloadLength:
+			if packetType == PACKET_FULL:
+				self.setLed(ledPos, self.readPacketByte(), self.readPacketByte(), self.readPacketByte())
+				ledPos += 1
+				payloadPos += 3
+			elif packetType == PACKET_DELTA:
+				ledPos = self.readPacketByte() | (self.readPacketByte() << 8)
+				self.setLed(ledPos, self.readPacketByte(), self.readPacketByte(), self.readPacketByte())
+				payloadPos += 5
+			elif packetType == PACKET_RLE:
+				runLength = self.readPacketByte()
+				color = (self.readPacketByte(), self.readPacketByte(), self.readPacketByte())
+				for runPos in range(0, runLength):
+					self.setLed(ledPos, *color)
+					ledPos += 1
+				payloadPos += 4
+			else:
+				self.readPacketByte()
+				payloadPos += 1
+
+		checksum = (self.checksumHigh << 8) | self.checksumLow
+		packetChecksum = self.readPacketByte() | (self.readPacketByte() << 8)
+		packetNumber = self.packets
+		self.packets += 1
+		if packetChecksum != checksum or packetNumber in self.rejectPackets:
+			self.rejected += 1
+			self.reply(STREAM_NAK)
+			return
+		if packetType == PACKET_PING:
+			self.pings += 1
+		else:
+			if self.baudRate:
+				time.sleep(self.ledCount * SHOW_MICROS_PER_LED / 1000000.0)
+			self.shownFrames.append((time.time(), bytes(self.leds)))
+		self.reply(STREAM_ACK)
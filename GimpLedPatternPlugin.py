@@ -1,8 +1,28 @@
 #!/usr/bin/env python
 
 import os
-from gimpfu import *
+import sys
+try:
+	from gimpfu import *
+	GIMP_AVAILABLE = True
+except ImportError:
+	# Running outside of GIMP, only the command line generation is available.
+	GIMP_AVAILABLE = False
+	INDEXED = 2
 import time
+import math
+import binascii
+import hashlib
+import struct
+import itertools
+import operator
+import zlib
+import json
+import mmap
+import csv
+import copy
+import re
+import select
 
 
 ''' 
@@ -22,6 +42,38 @@ ROW_PROCESSING_ODD = 1
 # Reverse pixel order for even rows.
 ROW_PROCESSING_EVEN = 2 	
 
+'''
+LED Wiring Options
+'''
+# LEDs follow the rows of the matrix.
+LED_WIRING_ROWS = 0
+# LEDs follow the columns of the matrix.
+LED_WIRING_COLUMNS = 1
+
+# Clockwise rotations of a matrix supported by the layouts. 
+# The first LED is in the top left corner of the rotated matrix.
+LED_ROTATIONS = (0, 90, 180, 270)
+
+# Byte order of the colors of an LED in the pixel buffer of the strip, the same 
+# as the NEO_* color order given to Adafruit_NeoPixel. Used by ENCODING_NATIVE.
+LED_COLOR_ORDERS = ("GRB", "RGB", "RBG", "GBR", "BRG", "BGR")
+
+# Pixel index of LEDs that are not driven by any pixel (always off).
+NO_PIXEL = -1
+# Highest LED index of a layout, delta entries carry the LED index in 2 bytes.
+MAX_LED_INDEX = 0xFFFF
+
+# Names of the row ordering and wiring choices in layout files and the command line.
+ROW_ORDER_NAMES = {
+	"standard": ROW_PROCESSING_STANDARD,
+	"flip-odd": ROW_PROCESSING_ODD,
+	"flip-even": ROW_PROCESSING_EVEN
+}
+LED_WIRING_NAMES = {
+	"rows": LED_WIRING_ROWS,
+	"columns": LED_WIRING_COLUMNS
+}
+
 '''
 Layer/Image Prefixes 
 '''
@@ -34,21 +86,215 @@ Layer/Image Prefixes
 # pattern/animation frame.
 PREFIX_LAYER_GROUP_TILE = "TLF_"
 
+'''
+Frame Timing Options
+'''
+# Duration of a frame in its layer (or file) name, the same as the 
+# GIMP animation playback: "Frame 1 (250ms)". Frames without it 
+# are shown for the Frame Delay.
+FRAME_DURATION_TAG = re.compile(r"\(\s*(\d+)\s*ms\s*\)", re.IGNORECASE)
+# Combine/replace tags of GIMP animation layers, removed from the frame names.
+FRAME_MODE_TAG = re.compile(r"\(\s*(combine|replace)\s*\)", re.IGNORECASE)
+
 '''
 Code Generation Choices
 '''
 CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO = 0
-CHOICE_RESERVED = 1
-	
+# Streams the frames to a board running the receiver sketch instead of generating code.
+CHOICE_SERIAL_STREAM = 1
+
+'''
+Frame Encoding Options
+'''
+# Every frame is stored with the color of each one of its LEDs.
+ENCODING_FULL = 0
+# The first frame is stored in full and every other frame only stores
+# the LEDs that changed from the previous frame. Frames fall back to 
+# full storage when the list of changes would be larger.
+ENCODING_DELTA = 1
+# Frames are stored as runs of LEDs sharing the same color when 
+# that is smaller than storing every LED.
+ENCODING_RLE = 2
+# Colors are stored once in a palette shared by all frames and every LED 
+# stores the index of its color (4 bits for up to 16 colors, 8 bits for 
+# up to 256). Patterns with more colors are stored as full frames.
+ENCODING_PALETTE = 3
+# Every frame is stored as the bytes of the strip's pixel buffer, each LED 
+# in the color order of the strip (GRB for NEO_GRB), so the player copies 
+# a whole frame into the strip with a single memcpy_P.
+ENCODING_NATIVE = 4
+# The flash budget planner measures the pattern with every encoding 
+# (Full, Delta, RLE, Palette) and picks the smallest one that fits.
+ENCODING_AUTO = 5
+
+# Types of frames stored in the generated code. 
+# Must match the FrameType enum of the generated base pattern class.
+# Color of every LED in the frame.
+FRAME_TYPE_FULL = 0
+# LED index, color pairs for the LEDs that changed from the previous frame.
+FRAME_TYPE_DELTA = 1
+# Runs of LEDs with the same color stored as (run length << 24) | color.
+FRAME_TYPE_RLE = 2
+
+# One uint8_t palette index per LED.
+FRAME_TYPE_PALETTE_8 = 3
+# Two 4-bit palette indices per uint8_t, first LED in the high nibble.
+FRAME_TYPE_PALETTE_4 = 4
+# Color bytes of every LED in the color order of the strip.
+FRAME_TYPE_NATIVE = 5
+
+# Longest run that fits in the top byte of an RLE entry.
+RLE_MAX_RUN_LENGTH = 255
+# Largest palettes for 4-bit and 8-bit indices.
+PALETTE_4_MAX_COLORS = 16
+PALETTE_8_MAX_COLORS = 256
+
+'''
+Color Format Options
+'''
+# How the colors of frames stored in full are written. Only used when 
+# every frame of the pattern is a full frame (Full Frames encoding).
+# Every LED is a uint32_t 0xRRGGBB, one byte is unused.
+COLOR_FORMAT_RGB32 = 0
+# Every LED is 3 uint8_t (red, green, blue).
+COLOR_FORMAT_RGB24 = 1
+# Every LED is a uint16_t with 5 bits of red, 6 of green and 5 of blue.
+COLOR_FORMAT_RGB565 = 2
+# RGB565 with ordered dithering, which hides the banding of gradients.
+COLOR_FORMAT_RGB565_DITHER = 3
+
+'''
+Player Options
+'''
+# playPattern() plays the whole pattern, using delay() between frames.
+PLAYER_BLOCKING = 0
+# playPattern() is called on every loop(), it shows the next frame once 
+# millis() says it is due and returns right away.
+PLAYER_NON_BLOCKING = 1
+
+'''
+Color Correction Options
+'''
+# Gamma applied to the colors when generating, 1.0 leaves them as they are. 
+# LED brightness is linear so about 2.2-2.8 makes fades look even.
+GAMMA_NONE = 1.0
+# Brightness in percent applied to the colors when generating, 
+# 100 leaves them as they are.
+BRIGHTNESS_FULL = 100
+
+'''
+Tween Options
+'''
+# Largest difference of a color channel (0-255) allowed between a frame and
+# the in-between frame the player computes in its place.
+TWEEN_TOLERANCE = 2
+# Most in-between frames computed from two stored frames (uint8_t table).
+TWEEN_MAX_STEPS = 255
+
+'''
+Serial Stream Options
+'''
+# Serial port the frames are streamed to by default.
+STREAM_DEFAULT_PORT = "/dev/ttyUSB0"
+# Baud rates the frames can be streamed at. All but 230400 are exact on 16 MHz boards.
+STREAM_BAUD_RATES = (115200, 230400, 500000, 1000000)
+# Every packet starts with this byte, followed by the packet type, the payload
+# length (2 bytes, little-endian), the payload and the Fletcher-16 checksum
+# (2 bytes, little-endian) of the type, length and payload.
+STREAM_SYNC = 0xA5
+# Packet types. Full: 3 bytes (red, green, blue) per LED.
+# Delta: LED index (2 bytes, little-endian) and color of the changed LEDs.
+# RLE: run length (1 byte) and color of the runs of LEDs with the same color.
+# Ping: empty, only answered. Checks the receiver is running.
+PACKET_PING = 0
+PACKET_FULL = 1
+PACKET_DELTA = 2
+PACKET_RLE = 3
+# Reply of the receiver once the frame of a packet is shown, or when the packet is rejected.
+STREAM_ACK = 0x06
+STREAM_NAK = 0x15
+# Seconds to wait for the receiver to reply to a packet.
+STREAM_REPLY_TIMEOUT = 1.0
+# Seconds to wait for the receiver to answer when the port opens,
+# most boards reset and run their bootloader first.
+STREAM_CONNECT_TIMEOUT = 5.0
+# Times a rejected or unanswered frame is sent again before giving up.
+STREAM_RETRIES = 3
+
+'''
+Board Profiles
+'''
+# Memory of the boards the flash budget planner checks the patterns against. 
+# flash: program flash a pattern can be placed in (AVR pgm_read_* only reach the first 64 KB).
+# code: flash kept for the sketch, the Adafruit NeoPixel library and the pattern class.
+# ram: RAM of the board. ramReserved: RAM kept for the sketch and the stack.
+# pointer: bytes of a pointer in the frame tables. maxArray: largest array the compiler allows.
+BOARD_PROFILES = {
+	"uno": {"name": "Arduino Uno/Nano", "flash": 32256, "code": 4096, "ram": 2048, "ramReserved": 512, 
+		"pointer": 2, "maxArray": 32767},
+	"leonardo": {"name": "Arduino Leonardo", "flash": 28672, "code": 6144, "ram": 2560, "ramReserved": 640, 
+		"pointer": 2, "maxArray": 32767},
+	"mega": {"name": "Arduino Mega 2560", "flash": 65536, "code": 4096, "ram": 8192, "ramReserved": 1024, 
+		"pointer": 2, "maxArray": 32767},
+	"esp8266": {"name": "ESP8266", "flash": 1044464, "code": 294912, "ram": 81920, "ramReserved": 32768, 
+		"pointer": 4, "maxArray": None},
+	"esp32": {"name": "ESP32", "flash": 1310720, "code": 294912, "ram": 327680, "ramReserved": 65536, 
+		"pointer": 4, "maxArray": None}
+}
+# Boards in the order of the plug-in dialog, None doesn't check the pattern against any board.
+BOARD_PROFILE_CHOICES = (None, "uno", "leonardo", "mega", "esp8266", "esp32")
+
+'''
+Frame Cache Options
+'''
+# Default location of the cache of extracted and encoded frames.
+FRAME_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "GimpLedPattern")
+# Default size limit of the frame cache in bytes.
+FRAME_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Part of every cache key. Change it when the extraction or 
+# encoding output changes so old entries are no longer used.
+FRAME_CACHE_VERSION = "1"
+
+'''
+Profiling Report Options
+'''
+# No report is written.
+PROFILE_REPORT_NONE = 0
+# Timings and counters of the generation written as JSON next to the generated code.
+PROFILE_REPORT_JSON = 1
+# Same as JSON but as CSV rows of (section, name, value, calls).
+PROFILE_REPORT_CSV = 2
+
+'''
+Preview Options
+'''
+# No preview is written.
+PREVIEW_NONE = 0
+# Animated GIF of the generated pattern played back, needs the Pillow package.
+PREVIEW_GIF = 1
+# PNG contact sheet with every frame of the generated pattern played back.
+PREVIEW_PNG = 2
+# Side in pixels of the square drawn for each LED, the last pixel is left for the grid.
+PREVIEW_LED_SIZE = 8
+# Most pixels drawn for all the frames of a preview. LEDs are drawn smaller,
+# down to 1 pixel, then only every few frames are drawn to stay under it.
+PREVIEW_MAX_PIXELS = 16 * 1024 * 1024
+# 0xRRGGBB color of the grid between the LEDs and of the pixels without an LED.
+PREVIEW_GRID_COLOR = 0x303030
+
 '''
  Intermediate generation section
 '''
+# The pattern is handed to the code generators as a dict of the KEY_PATTERN_* 
+# keys below. Its frames can also be saved to disk, see Pattern Files.
 # ID of the Entire Pattern.
 KEY_PATTERN_ID = "patternId"
-# List of frames in the pattern. 
+# Frames in the pattern, a list or an LedFrameStream. 
+# Generators may iterate over the frames more than once.
 KEY_PATTERN_FRAMES = "patternFrames"
 # Delay in milliseconds of the LED pattern. 
-# This will be the duration a given frame is displayed for.
+# This will be the duration a given frame is displayed for, 
+# unless the frame has a duration of its own.
 KEY_PATTERN_DELAY = "delay"
 # Width of the entire pattern, this is the canvas/image height in GIMP
 KEY_PATTERN_WIDTH = "width"
@@ -58,28 +304,31 @@ KEY_PATTERN_HEIGHT = "height"
 LEY_PATTERN_LED_PIN = "ledPin"
 # Total number of LEDs. Total = Width*Height
 KEY_PATTERN_TOTAL_LEDS = "totalLeds"
-# Specify the LED layout of this pattern. Types: LED Strip, LED Single Matrix, LED Tiled Matrix
+# LedLayout the frames were put in LED order with, used to find the pixel of each LED.
 KEY_PATTERN_LAYOUT = "patternLayout"
-# ID of the frame. Used mostly internally. 
-KEY_FRAME_ID = "frameId"
-# Color of each individual LED/Pixel during this frame. 
-# Note: Each pixel in the image maps to an LED.
-# Pixels are laid out as a linear sequence
-# of width*height pixels, extracted from the image in row-major,
-# top-to-bottom, left-to-right order (the same as the reading direction
-# of multi-line English text)
-KEY_FRAME_PIXEL_COLORS = "pixels"
-# Number of pixels wide of the panel. (Layers can have sizes different from the image itself)
-KEY_FRAME_WIDTH = "width"
-# Number of pixels height of the panel. 
-KEY_FRAME_HEIGHT = "height"
-# Total number of pixels/LEDs in the frame
-KEY_FRAME_TOTAL_LEDS = "totalLeds"
-# Color keys, stored in a range between 0-255
-KEY_COLOR_RED = "R"
-KEY_COLOR_GREEN = "G"
-KEY_COLOR_BLUE = "B"
-KEY_COLOR_ALPHA = "A"
+# How frames are stored in the generated code. See ENCODING_* options.
+KEY_PATTERN_ENCODING = "encoding"
+# Colormap of INDEXED images as a list of 0xRRGGBB colors, None for other images.
+# Used to keep the GIMP color order when building a palette.
+KEY_PATTERN_COLORMAP = "colormap"
+# How the generated class plays the pattern. See PLAYER_* options.
+KEY_PATTERN_PLAYER = "player"
+# Color order of the strip, one of LED_COLOR_ORDERS.
+KEY_PATTERN_COLOR_ORDER = "colorOrder"
+# How the colors of full frames are stored. See COLOR_FORMAT_* options.
+KEY_PATTERN_COLOR_FORMAT = "colorFormat"
+# Key in BOARD_PROFILES of the board the pattern must fit in, None to not check it.
+KEY_PATTERN_BOARD = "board"
+# Gamma and brightness (percent) applied to the colors of the pattern.
+KEY_PATTERN_GAMMA = "gamma"
+KEY_PATTERN_BRIGHTNESS = "brightness"
+# Tolerance of the frames replaced by in-between frames, None to store every frame.
+KEY_PATTERN_TWEEN_TOLERANCE = "tweenTolerance"
+# Serial port, baud rate and number of times the pattern is played when streaming.
+KEY_PATTERN_STREAM_PORT = "streamPort"
+KEY_PATTERN_STREAM_BAUD = "streamBaud"
+KEY_PATTERN_STREAM_LOOPS = "streamLoops"
+# Note: Frames in KEY_PATTERN_FRAMES are LedFrame objects (see below).
 
 KEY_LAYER_WITDH = "width"
 KEY_LAYER_HEIGHT = "height"
@@ -92,6 +341,48 @@ LAYOUT_STRIP = "led_strip"
 LAYOUT_SINGLE_MATRIX = "led_single_matrix"
 LAYOUT_TILED_MATRIX = "led_tiled_matrix"
 
+# Number of bytes used by each pixel in an LedFrame buffer (R, G, B, A).
+PIXEL_BYTES = 4
+
+'''
+Single frame of the pattern. 
+The pixels are kept packed in a flat bytearray instead of one object per LED
+so long animations stay small in memory.
+'''
+class LedFrame(object):
+	
+	__slots__ = ("frameId", "width", "height", "pixels", "duration", "tweens")
+	
+	def __init__(self, frameId, width, height, pixels, duration = None, tweens = 0):
+		# ID of the frame. Used mostly internally. 
+		self.frameId = frameId
+		# Number of pixels wide of the panel. (Layers can have sizes different from the image itself)
+		self.width = width
+		# Number of pixels height of the panel. 
+		self.height = height
+		# Color of each individual LED/Pixel during this frame stored as
+		# R, G, B, A bytes (0-255) per pixel. 
+		# Note: Each pixel in the image maps to an LED.
+		# Pixels are laid out as a linear sequence
+		# of width*height pixels, extracted from the image in row-major,
+		# top-to-bottom, left-to-right order (the same as the reading direction
+		# of multi-line English text)
+		self.pixels = pixels
+		# Milliseconds the frame is shown for, None to use the pattern delay.
+		self.duration = duration
+		# Number of in-between frames played after this frame,
+		# interpolated from its colors to the colors of the next frame.
+		self.tweens = tweens
+	
+	# Total number of pixels/LEDs in the frame
+	def getTotalLeds(self):
+		return len(self.pixels) // PIXEL_BYTES
+	
+	# Returns the (R, G, B, A) tuple of the LED at the given position.
+	def getPixel(self, ledPos):
+		pixelStart = ledPos * PIXEL_BYTES
+		return tuple(self.pixels[pixelStart:pixelStart + PIXEL_BYTES])
+
 
 '''
 Generates LED code from the pixel information in an image. 
@@ -99,43 +390,195 @@ Generates LED code from the pixel information in an image.
 @param newimg - Image to process.
 @param frameDelay - Delay in milliseconds of a frame.
 @param rowOrderType - How to handle the given row. Mainly used to handle unique setup of LED strips. Standard, Flip Odd, Flip Even
-@param ledLayout - Layout of the LED (Strip, Single Matrix, Tiled Matrix)
+@param ledWiring - Whether the LEDs follow the rows or the columns of the matrix.
+@param ledRotation - Index in LED_ROTATIONS of the clockwise rotation of the matrix.
+@param ledMapFile - CSV/JSON file mapping pixels to LEDs, used instead of the options above when set.
+@param frameEncoding - How the frames are stored in the generated code (Full, Delta, RLE, Palette)
+@param colorFormat - How the colors of full frames are stored (32-bit, 24-bit, RGB565). See COLOR_FORMAT_* options.
+@param colorOrder - Index in LED_COLOR_ORDERS of the color order of the strip.
+@param gamma - Gamma correction applied to the colors when generating, 1.0 for none.
+@param brightness - Brightness in percent applied to the colors when generating.
+@param boardProfile - Index in BOARD_PROFILE_CHOICES of the board the pattern must fit in.
+@param player - How the generated class plays the pattern (Blocking, Non-Blocking). See PLAYER_* options.
+@param tween - Whether to replace the frames of linear fades by in-between frames computed by the player.
+@param tweenTolerance - Largest color difference (0-255) of a frame replaced by an in-between frame.
+@param streamPort - Serial port the frames are streamed to when ledType is CHOICE_SERIAL_STREAM.
+@param streamBaud - Index in STREAM_BAUD_RATES of the baud rate of the stream.
+@param streamLoops - Number of times the pattern is streamed.
+@param preview - Preview of the generated pattern played back, written next to the code. See PREVIEW_* options.
+@param savePattern - Whether to save the extracted frames to a pattern file next to the code, see PatternFile.
+@param useCache - Whether to reuse the frames encoded by previous generations.
+@param profileReport - Format of the profiling report written next to the code. See PROFILE_REPORT_* options.
+@param profileDump - Whether to run the generation under cProfile and dump its stats next to the code.
+@param dir - Directory the code is written to, the current directory when None.
 '''
-def generate_led_pattern(ledType, newimg, 
-               frameDelay, rowOrderType, ledPin, dir):
-    
+# GIMP passes every option in the order of the dialog. The options have the 
+# defaults of the dialog so scripts can pass only the ones they change by keyword.
+def generate_led_pattern(ledType, newimg,
+               frameDelay, rowOrderType, ledWiring = LED_WIRING_ROWS, ledRotation = 0, ledMapFile = "", ledPin = 6, 
+               frameEncoding = ENCODING_FULL, colorFormat = COLOR_FORMAT_RGB32, colorOrder = 0, gamma = GAMMA_NONE, 
+               brightness = BRIGHTNESS_FULL, boardProfile = 0, player = PLAYER_BLOCKING, tween = False, 
+               tweenTolerance = TWEEN_TOLERANCE, streamPort = STREAM_DEFAULT_PORT, streamBaud = 0, streamLoops = 1, 
+               preview = PREVIEW_NONE, savePattern = False, useCache = False, profileReport = PROFILE_REPORT_NONE, 
+               profileDump = False, dir = None):
+
+	if dir is None:
+		dir = os.getcwd()
+	ledLayout = createLedLayout(rowOrderType, ledWiring, LED_ROTATIONS[ledRotation], ledMapFile)
+	if not tween:
+		tweenTolerance = None
+	frameCache = None
+	if useCache:
+		frameCache = FrameCache(FRAME_CACHE_DIR)
+	generateLedPatternFromSource(GimpImageSource(newimg), ledType,
+		frameDelay, ledLayout, ledPin, frameEncoding, dir, GimpProgress(), frameCache = frameCache,
+		profileReport = profileReport, profileDump = profileDump, player = player, 
+		colorOrder = LED_COLOR_ORDERS[colorOrder], colorFormat = colorFormat, 
+		board = BOARD_PROFILE_CHOICES[boardProfile], gamma = gamma, brightness = int(brightness),
+		tweenTolerance = tweenTolerance if tweenTolerance is None else int(tweenTolerance),
+		streamPort = streamPort, streamBaud = STREAM_BAUD_RATES[streamBaud], streamLoops = int(streamLoops),
+		preview = preview, savePattern = savePattern)
+	return
+
+'''
+Generates LED code from the frames of an image source. 
+Shared by the GIMP plug-in and the command line generation. 
+@param imageSource - LedImageSource with the frames of the pattern.
+@param workers - Worker processes reading and encoding the frames, 0 for one per CPU core.
+@param ledLayout - LedLayout mapping the pixels of each frame to the LEDs.
+@param progress - Progress reporter (GimpProgress, ConsoleProgress).
+@param frameCache - FrameCache with the frames of previous generations, None to disable it.
+@param tweenTolerance - Tolerance of the frames replaced by in-between frames, None to store every frame.
+@param streamBaud - Baud rate of the stream, one of STREAM_BAUD_RATES.
+@param verify - Whether to play the generated code back and check it shows the frames of the source.
+@param savePattern - Whether to extract the frames once into a pattern file, which the generation then reads them from.
+See generate_led_pattern for the rest of the parameters.
+'''
+# Frames are extracted and encoded in a pool of worker processes when
+# workers is more than 1. Only sources outside of GIMP use the workers.
+# The options other than profileDump are passed on to runGeneration by 
+# keyword, its signature lists them with their defaults.
+def generateLedPatternFromSource(imageSource, ledType,
+               frameDelay, ledLayout, ledPin, frameEncoding, dir, progress, profileDump = False, **options):
+	generationArgs = (imageSource, ledType, frameDelay, ledLayout, ledPin, frameEncoding, dir, progress)
+	if not profileDump:
+		runGeneration(*generationArgs, **options)
+		return
+
+	# Stats can be browsed with: python -m pstats Pattern_<NAME>_Profile.prof
+	import cProfile
+	profiler = cProfile.Profile()
+	try:
+		profiler.runcall(runGeneration, *generationArgs, **options)
+	finally:
+		profiler.dump_stats(getProfilePath(dir, nameToConst(imageSource.getName()), ".prof"))
+	return
+
+# Runs a generation, see generateLedPatternFromSource.
+def runGeneration(imageSource, ledType,
+               frameDelay, ledLayout, ledPin, frameEncoding, dir, progress, workers = 1, frameCache = None,
+               profileReport = PROFILE_REPORT_NONE, player = PLAYER_BLOCKING, colorOrder = "GRB", 
+               colorFormat = COLOR_FORMAT_RGB32, board = None, gamma = GAMMA_NONE, brightness = BRIGHTNESS_FULL,
+               tweenTolerance = None, streamPort = STREAM_DEFAULT_PORT, streamBaud = STREAM_BAUD_RATES[0], streamLoops = 1,
+               preview = PREVIEW_NONE, verify = False, savePattern = False):
+
 	# TODO Consider allowing user to specify pattern name instead of using the file name.
-	filename, file_extension = os.path.splitext(newimg.name)
-	
+	filename = imageSource.getName()
+
 	constPattern = nameToConst(filename)
-		
-	# List of frames in the pattern. 
-	patternFrames = []
-	
-	ledFrames = extractAllLayerInformation(newimg, rowOrderType)
+
+	profile = None
+	if profileReport != PROFILE_REPORT_NONE:
+		profile = GenerationProfile()
+
+	# Frames are extracted while the code is generated, one at a time.
+	ledFrames = LedFrameStream(imageSource, ledLayout, workers, frameCache)
 	
 	# Build LEd Pattern
 	outLedPattern = {
 		KEY_PATTERN_ID: constPattern,
 		KEY_PATTERN_DELAY: frameDelay,
 		KEY_PATTERN_FRAMES: ledFrames,
-		KEY_PATTERN_WIDTH: newimg.width,
-		KEY_PATTERN_HEIGHT: newimg.height,
+		KEY_PATTERN_WIDTH: imageSource.getWidth(),
+		KEY_PATTERN_HEIGHT: imageSource.getHeight(),
 		LEY_PATTERN_LED_PIN: ledPin, 
-		KEY_PATTERN_TOTAL_LEDS: (newimg.width*newimg.height)
+		KEY_PATTERN_TOTAL_LEDS: ledLayout.getLedCount(imageSource.getWidth(), imageSource.getHeight()),
+		KEY_PATTERN_LAYOUT: ledLayout,
+		KEY_PATTERN_ENCODING: frameEncoding,
+		KEY_PATTERN_COLORMAP: imageSource.getColormap(),
+		KEY_PATTERN_PLAYER: player,
+		KEY_PATTERN_COLOR_ORDER: colorOrder,
+		KEY_PATTERN_COLOR_FORMAT: colorFormat,
+		KEY_PATTERN_BOARD: board,
+		KEY_PATTERN_GAMMA: gamma,
+		KEY_PATTERN_BRIGHTNESS: brightness,
+		KEY_PATTERN_TWEEN_TOLERANCE: tweenTolerance,
+		KEY_PATTERN_STREAM_PORT: streamPort,
+		KEY_PATTERN_STREAM_BAUD: streamBaud,
+		KEY_PATTERN_STREAM_LOOPS: streamLoops
 	}
 	
-	pdb.gimp_progress_pulse()
-	pdb.gimp_progress_set_text("Generating code...")
-	if ledType == CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO:
-		# Generate Code for Arduino and Adafruit Neo Pixel.
-		ledCodeGenerator = AdafruitNeoPixelStripCodeGenerator(outLedPattern, filename, dir)
-		ledCodeGenerator.generate()
-		pass
-	pdb.gimp_progress_update(1.0)
-	pdb.gimp_progress_set_text("Generation Done!")
-	pdb.gimp_progress_end()
-	
+	progress.pulse()
+	progress.setText("Streaming frames..." if ledType == CHOICE_SERIAL_STREAM else "Generating code...")
+	ledCodeGenerator = None
+	outputSummary = []
+	patternPath = None
+	startProfile(profile)
+	try:
+		if savePattern and not isinstance(imageSource, PatternFileImageSource):
+			# Extract the frames once, every pass over the frames then reads them from the pattern file.
+			patternPath = getPatternFilePath(dir, constPattern)
+			frameProgress = FrameProgress(progress, ledFrames.getFrameCount(), "Saving frames...")
+			savedFrames = writePatternFile(patternPath, imageSource, workers, frameCache, frameProgress)
+			outputSummary.append("{0} frames saved to {1}.".format(savedFrames, os.path.basename(patternPath)))
+			ledFrames = LedFrameStream(PatternFileImageSource(patternPath), ledLayout, workers, frameCache)
+			outLedPattern[KEY_PATTERN_FRAMES] = ledFrames
+		if ledType == CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO:
+			# Generate Code for Arduino and Adafruit Neo Pixel.
+			frameProgress = FrameProgress(progress, ledFrames.getFrameCount(), "Generating code...")
+			ledCodeGenerator = AdafruitNeoPixelStripCodeGenerator(outLedPattern, filename, dir, workers,
+				frameCache, frameProgress)
+			ledCodeGenerator.generate()
+			if verify or preview != PREVIEW_NONE:
+				# Play the generated code back, the way the board would.
+				emulator = LedPatternEmulator(ledCodeGenerator.mOutFileName)
+				if verify:
+					frameProgress.restart("Checking generated code...")
+					checkedFrames = emulator.verifyFrames(ledFrames, ledCodeGenerator, frameProgress)
+					outputSummary.append("Generated code checked against {0} frames.".format(checkedFrames))
+				if preview != PREVIEW_NONE:
+					outputSummary.append(writePatternPreview(emulator, ledLayout, imageSource.getWidth(), 
+						imageSource.getHeight(), dir, preview, progress))
+			pass
+		elif ledType == CHOICE_SERIAL_STREAM:
+			# Stream the frames to the receiver sketch on the board for a live preview.
+			frameProgress = FrameProgress(progress, ledFrames.getFrameCount(), "Streaming frames...")
+			ledCodeGenerator = AdafruitNeoPixelSerialStreamer(outLedPattern, filename, dir, frameProgress)
+			ledCodeGenerator.generate()
+	finally:
+		stopProfile()
+	progress.update(1.0)
+	doneText = "Generation Done!"
+	if ledType == CHOICE_SERIAL_STREAM:
+		doneText = "Stream Done!"
+	if ledCodeGenerator is not None:
+		for summaryLine in ledCodeGenerator.getGenerationSummary() + outputSummary:
+			doneText += " " + summaryLine
+	if frameCache is not None:
+		frameCache.evict()
+		frameCache.saveStats()
+		doneText += " " + frameCache.getSummary()
+	if profile is not None:
+		if ledCodeGenerator is not None:
+			for outputPath in ledCodeGenerator.getOutputFiles():
+				profile.addOutputFile(outputPath)
+		if patternPath is not None:
+			profile.addOutputFile(patternPath)
+		profile.writeReport(dir, constPattern, profileReport)
+		doneText += " " + profile.getSummary()
+	progress.setText(doneText)
+	progress.end()
+
 	return
 
 	
@@ -143,6 +586,28 @@ def nameToConst(name):
 	outName = name.upper().replace(" ", "_").replace("#","").replace("/","_")
 	return outName
 
+# Splits the GIMP animation tags off a layer (or frame file) name. 
+# Returns the name without its tags and the duration of the frame 
+# in milliseconds, None when the name doesn't set one.
+def parseFrameName(name):
+	duration = None
+	durationMatch = FRAME_DURATION_TAG.search(name)
+	if durationMatch is not None:
+		duration = int(durationMatch.group(1))
+	frameName = FRAME_MODE_TAG.sub("", FRAME_DURATION_TAG.sub("", name)).strip()
+	return frameName, duration
+
+# Returns frameId, or frameId_2, frameId_3, ... when it is in usedIds 
+# (frames named the same once their tags are removed), and adds it to usedIds.
+def getUniqueFrameId(frameId, usedIds):
+	uniqueId = frameId
+	suffix = 2
+	while uniqueId in usedIds:
+		uniqueId = "{0}_{1}".format(frameId, suffix)
+		suffix += 1
+	usedIds.add(uniqueId)
+	return uniqueId
+
 # Groups are layers composed of layser, so this will flatten 
 # all the groups into a single list of layers.
 # Note: Not to be confused with the actual GIMP command called flatten
@@ -164,66 +629,230 @@ def flatternGroups(parent):
 	return outLayers
 
 
-# Given a layer it will flatten all sublayers into a single 
-# frame. The result will be a list of intermediate representation of the 
-# pixels in the layer. 
-def flattenFrame(frame, outPixels, parentOpacity = 1.0):
+# Builds the RGBA frame of a TLF_ tiled group. 
+# Every visible layer of the group is drawn into a single buffer the size 
+# of the group at its own offset, with its opacity and the opacity of its 
+# parents. Layers are drawn bottom to top, each one blended over the layers 
+# below it by its alpha, so opaque pixels of the top most layer win where 
+# layers overlap and transparent ones let the layers below show. The LEDs are then read from the buffer tile by tile in 
+# chain order: every visible layer (or layer group) directly inside the 
+# tiled group is a tile, the top most layer being the first tile.
+def compositeTiledFrame(tiledGroup):
+	groupWidth = tiledGroup.width
+	groupHeight = tiledGroup.height
+	groupX, groupY = tiledGroup.offsets
+	
+	# Pixels not covered by any layer are left off (transparent black).
+	groupPixels = bytearray(groupWidth * groupHeight * PIXEL_BYTES)
+	drawLayers(tiledGroup, groupPixels, tiledGroup, tiledGroup.opacity)
+	
+	tiles = [layer for layer in tiledGroup.layers if pdb.gimp_drawable_get_visible(layer)]
+	startTime = time.time()
+	outPixels = bytearray(sum(tile.width * tile.height for tile in tiles) * PIXEL_BYTES)
+	outPos = 0
+	for tile in tiles:
+		tileX, tileY = tile.offsets
+		tileBytes = tile.width * tile.height * PIXEL_BYTES
+		tilePixels = bytearray(tileBytes)
+		# Copy the area of the tile out of the group buffer.
+		blitPixels(groupPixels, groupWidth, groupHeight, 
+			tilePixels, tile.width, tile.height, groupX - tileX, groupY - tileY)
+		outPixels[outPos:outPos + tileBytes] = tilePixels
+		outPos += tileBytes
+	addStageTime("extract.composite", startTime)
+	return outPixels
+
+# Draws the visible layers inside parent over the pixel buffer of the tiled group, 
+# bottom layer first. Opacity is the combined opacity of parent and its own parents (0-100).
+def drawLayers(parent, groupPixels, tiledGroup, opacity):
+	groupX, groupY = tiledGroup.offsets
+	for layer in reversed(parent.layers):
+		# Groups mark all internal layers invisible when the group 
+		# is invisible so there is no need to explore further.
+		if not pdb.gimp_drawable_get_visible(layer):
+			continue
+		if pdb.gimp_item_is_group(layer):
+			drawLayers(layer, groupPixels, tiledGroup, opacity * layer.opacity / 100.0)
+			continue
+		layerX, layerY = layer.offsets
+		layerPixels = readLayerPixelBuffer(layer, opacity)
+		startTime = time.time()
+		blitPixels(layerPixels, layer.width, layer.height,
+			groupPixels, tiledGroup.width, tiledGroup.height, layerX - groupX, layerY - groupY, blend = True)
+		addStageTime("extract.composite", startTime)
+
+# Copies an RGBA buffer into another one with its top left corner at (x, y) 
+# of the target. Pixels that fall outside of the target are skipped. 
+# Whole rows are copied with a single slice assignment each.
+# With blend the source is drawn over the target instead, see blendRow.
+def blitPixels(sourcePixels, sourceWidth, sourceHeight, targetPixels, targetWidth, targetHeight, x, y, blend = False):
+	startX = max(0, -x)
+	endX = min(sourceWidth, targetWidth - x)
+	startY = max(0, -y)
+	endY = min(sourceHeight, targetHeight - y)
+	if startX >= endX or startY >= endY:
+		return
 	
-	# Ignore layers whose visibility flag is off. 
-	# Groups will mark all internal layers to invisible when 
-	# the group is invisible so don't need to explore further. 
-	if not pdb.gimp_drawable_get_visible(frame):
+	rowBytes = (endX - startX) * PIXEL_BYTES
+	if startX == 0 and endX == sourceWidth and x == 0 and sourceWidth == targetWidth and not blend:
+		# Same width, the rows are contiguous in both buffers.
+		sourceStart = startY * sourceWidth * PIXEL_BYTES
+		targetStart = (startY + y) * targetWidth * PIXEL_BYTES
+		copyBytes = (endY - startY) * rowBytes
+		targetPixels[targetStart:targetStart + copyBytes] = sourcePixels[sourceStart:sourceStart + copyBytes]
 		return
-		
-	if not pdb.gimp_item_is_group(frame):
-		# Order type not supported for flattening a layer. 
-		layerPixels = extractLayerPixelInformation(frame, ROW_PROCESSING_STANDARD, parentOpacity)
-		outPixels.extend(layerPixels)
+	
+	for sourceY in range(startY, endY):
+		sourceStart = (sourceY * sourceWidth + startX) * PIXEL_BYTES
+		targetStart = ((sourceY + y) * targetWidth + startX + x) * PIXEL_BYTES
+		if blend:
+			blendRow(sourcePixels[sourceStart:sourceStart + rowBytes], targetPixels, targetStart)
+		else:
+			targetPixels[targetStart:targetStart + rowBytes] = sourcePixels[sourceStart:sourceStart + rowBytes]
+
+# Products color * alpha and color * (255 - alpha) for every alpha, 
+# indexed [alpha][color]; blendRow looks up a whole channel through them.
+BLEND_SOURCE_PRODUCTS = [tuple(color * alpha for color in range(256)) for alpha in range(256)]
+BLEND_TARGET_PRODUCTS = [tuple(color * (255 - alpha) for color in range(256)) for alpha in range(256)]
+# Rounded division by 255 of a sum of both products.
+BLEND_DIVIDED = bytes(bytearray((weighted + 127) // 255 for weighted in range(255 * 255 + 1)))
+
+# Draws a row of RGBA pixels over the target starting at targetStart 
+# ("over" alpha blending, colors are not premultiplied). 
+# Opaque rows are copied and fully transparent rows skipped in one go, 
+# other rows are blended a whole channel at a time.
+def blendRow(sourceRow, targetPixels, targetStart):
+	rowBytes = len(sourceRow)
+	targetEnd = targetStart + rowBytes
+	alphas = sourceRow[3::PIXEL_BYTES]
+	pixelCount = len(alphas)
+	if alphas.count(b"\xff") == pixelCount:
+		targetPixels[targetStart:targetEnd] = sourceRow
 		return
-	else: 
-		# Flatten all layers
-		layers = frame.layers
-		for innerLayer in layers:
-			flattenFrame(innerLayer, outPixels, frame.opacity) 
+	if alphas.count(b"\x00") == pixelCount:
 		return
-					
-	pass
-
-def extractLayerPixelInformation(layer, rowOrderType=ROW_PROCESSING_STANDARD, parentOpacity = 100.0):
-	outPixels = []
-	# Just get all the pixels in it. 
-	for y in range(0, layer.height):
-		rowPixels = [] 
-		for x in range(0, layer.width):
-			num_channels, pixel = pdb.gimp_drawable_get_pixel(layer, x, y)
-			
-			# Note: Opacity is a value between 0-100.
-			ledAlpha = int(255 * layer.opacity/100.0 * parentOpacity/100.0 )
-			# If it has 4 channels then we have alpha in the end. 
-			if num_channels == 4:
-				ledAlpha = int(pixel[3] * layer.opacity/100.0 * parentOpacity/100.0)
-			
-			pixelColor = {
-				KEY_COLOR_RED: pixel[0], 
-				KEY_COLOR_GREEN: pixel[1], 
-				KEY_COLOR_BLUE: pixel[2], 
-				KEY_COLOR_ALPHA: ledAlpha
-				}
-			
-			# Track LED
-			rowPixels.append(pixelColor)
 	
-		# TODO Add row processing back here. 
-		# Perform any processing needed on the pixel row.
-		# Process pixel colors here after the row is processed because the ordering works on a row level. 
-		rowPixels = processPixelRow(rowPixels, rowOrderType, y)
-		outPixels.extend(rowPixels)
+	targetAlphas = targetPixels[targetStart + 3:targetEnd:PIXEL_BYTES]
+	if targetAlphas.count(b"\x00") == pixelCount:
+		# Nothing shows through, the source is drawn as is.
+		targetPixels[targetStart:targetEnd] = sourceRow
+		return
+	if targetAlphas.count(b"\xff") == pixelCount:
+		# Over an opaque row the result stays opaque and each channel is 
+		# (source * alpha + target * (255 - alpha)) / 255, all from tables.
+		sourceProducts = list(map(BLEND_SOURCE_PRODUCTS.__getitem__, alphas))
+		targetProducts = list(map(BLEND_TARGET_PRODUCTS.__getitem__, alphas))
+		for channel in range(0, 3):
+			weightedColors = map(operator.add, 
+				map(operator.getitem, sourceProducts, sourceRow[channel::PIXEL_BYTES]),
+				map(operator.getitem, targetProducts, targetPixels[targetStart + channel:targetEnd:PIXEL_BYTES]))
+			targetPixels[targetStart + channel:targetEnd:PIXEL_BYTES] = bytearray(map(BLEND_DIVIDED.__getitem__, weightedColors))
+		return
 	
+	# Weights of the source and of the target showing through it, both scaled 
+	# by 255 * 255. Their sum is the new alpha scaled by 255, it is only 0 where 
+	# both are transparent, which are divided by 1 and stay transparent black.
+	sourceWeights = list(map(operator.mul, alphas, [255] * pixelCount))
+	targetWeights = list(map(operator.getitem, map(BLEND_TARGET_PRODUCTS.__getitem__, alphas), targetAlphas))
+	outWeights = list(map(operator.add, sourceWeights, targetWeights))
+	divisors = list(map(max, outWeights, [1] * pixelCount))
+	halves = list(map(operator.rshift, divisors, [1] * pixelCount))
+	for channel in range(0, 3):
+		weightedColors = map(operator.add, 
+			map(operator.mul, sourceRow[channel::PIXEL_BYTES], sourceWeights),
+			map(operator.mul, targetPixels[targetStart + channel:targetEnd:PIXEL_BYTES], targetWeights))
+		targetPixels[targetStart + channel:targetEnd:PIXEL_BYTES] = bytearray(
+			map(operator.floordiv, map(operator.add, weightedColors, halves), divisors))
+	targetPixels[targetStart + 3:targetEnd:PIXEL_BYTES] = bytearray(
+		map(operator.floordiv, map(operator.add, outWeights, [127] * pixelCount), [255] * pixelCount))
+
+# Returns the RGBA bytearray of the layer in LED order. 
+# Without an LedLayout the pixels are kept in row-major order.
+def extractLayerPixelInformation(layer, ledLayout = None, parentOpacity = 100.0):
+	# Read all the pixels in one go, alpha already scaled by the opacities.
+	outPixels = readLayerPixelBuffer(layer, parentOpacity)
+	if ledLayout is not None:
+		startTime = time.time()
+		outPixels = ledLayout.apply(outPixels, layer.width, layer.height)
+		addStageTime("extract.layout", startTime)
 	return outPixels
 
-def extractAllLayerInformation(parent, rowOrderType):
+# Reads every pixel of a layer with a single pixel region read instead 
+# of one pdb.gimp_drawable_get_pixel call per pixel. 
+# The result is a flat RGBA bytearray (4 bytes per pixel, row-major order)
+# with the layer and parent opacity already applied to the alpha channel.
+def readLayerPixelBuffer(layer, parentOpacity = 100.0):
+	layerWidth = layer.width
+	layerHeight = layer.height
+	startTime = time.time()
+	pixelRegion = layer.get_pixel_rgn(0, 0, layerWidth, layerHeight, False, False)
+	rawPixels = bytearray(pixelRegion[0:layerWidth, 0:layerHeight])
+	addStageTime("extract.readPixels", startTime)
+	countProfile("pixelRegionReads")
+	countProfile("pixelBytesRead", len(rawPixels))
+
+	startTime = time.time()
+	pixelBuffer = toRgbaBuffer(rawPixels, layer.bpp, layerWidth*layerHeight, getLayerColormap(layer))
+	applyOpacity(pixelBuffer, layer.opacity, parentOpacity)
+	addStageTime("extract.convertPixels", startTime)
+	return pixelBuffer
+
+# Scales the alpha channel of an RGBA buffer in place by the opacities.
+# Note: Opacity is a value between 0-100.
+# Pixels without an alpha channel are treated as fully opaque (255).
+def applyOpacity(pixelBuffer, opacity, parentOpacity = 100.0):
+	alphaTable = bytes(bytearray(int(alpha * opacity/100.0 * parentOpacity/100.0) for alpha in range(256)))
+	pixelBuffer[3::4] = pixelBuffer[3::4].translate(alphaTable)
+
+# Returns the colormap of an INDEXED image as a list of 0xRRGGBB colors
+# or None for any other type of image.
+def getImageColormap(image):
+	if image.base_type != INDEXED:
+		return None
+	numBytes, colormap = pdb.gimp_image_get_colormap(image)
+	return list(unpackRgbColors(bytearray(colormap)))
+
+# Returns the colormap of an indexed layer as a flat RGB bytearray
+# or None if the layer is not indexed. 
+def getLayerColormap(layer):
+	if not layer.is_indexed:
+		return None
+	numBytes, colormap = pdb.gimp_image_get_colormap(layer.image)
+	return bytearray(colormap)
+
+# Converts raw drawable bytes (Gray, Gray+A, RGB, RGBA, Indexed, Indexed+A) 
+# into a flat RGBA bytearray. Channels are copied with strided slices 
+# so the whole buffer is converted at once. 
+def toRgbaBuffer(rawPixels, bpp, pixelCount, colormap = None):
+	hasAlpha = bpp == 2 or bpp == 4
+	if bpp == 4 and colormap is None:
+		return rawPixels
+	
+	pixelBuffer = bytearray(b'\xff') * (pixelCount * 4)
+	if colormap is not None:
+		indices = rawPixels[0::bpp]
+		for channel in range(0, 3):
+			channelTable = bytearray(256)
+			channelValues = colormap[channel::3]
+			channelTable[0:len(channelValues)] = channelValues
+			pixelBuffer[channel::4] = indices.translate(bytes(channelTable))
+	elif bpp >= 3:
+		for channel in range(0, 3):
+			pixelBuffer[channel::4] = rawPixels[channel::bpp]
+	else:
+		gray = rawPixels[0::bpp]
+		for channel in range(0, 3):
+			pixelBuffer[channel::4] = gray
+	
+	if hasAlpha:
+		pixelBuffer[3::4] = rawPixels[bpp - 1::bpp]
+	return pixelBuffer
+
+# Yields the LedFrame of every visible layer, one at a time. 
+# Layers inside groups are frames of their own, except for 
+# TLF_ tiled groups which are a single frame.
+def iterLayerFrames(parent, ledLayout):
 	
-	outLayers = []	
 	layers = parent.layers
 	
 	for layer in layers:
@@ -232,44 +861,42 @@ def extractAllLayerInformation(parent, rowOrderType):
 			continue
 		
 		# convert the layer name to a const name 
-		constLayer = nameToConst(layer.name)
+		layerName, layerDuration = parseFrameName(layer.name)
+		constLayer = nameToConst(layerName)
 		
 		layerWidth = layer.width
 		layerHeight = layer.height
 		
-		pixelColors = []
+		pixelColors = bytearray()
 				
 		if  pdb.gimp_item_is_group(layer):
-			# If it is a special tiled group then flatten it. 
+			# If it is a special tiled group then composite its tiles into a single frame. 
 			if isLayerTiled(constLayer):
-				flattenFrame(layer, pixelColors)
-				ledFrame = {
-					KEY_FRAME_ID: constLayer,
-					KEY_FRAME_PIXEL_COLORS: pixelColors,
-					KEY_FRAME_WIDTH: layerWidth,
-					KEY_FRAME_HEIGHT: layerHeight,
-					KEY_FRAME_TOTAL_LEDS: len(pixelColors)#(layerWidth*layerHeight)
-				}
-				outLayers.append(ledFrame)
+				pixelColors = compositeTiledFrame(layer)
+				yield LedFrame(constLayer, layerWidth, layerHeight, pixelColors, layerDuration)
 				pass
 			else: 
 				# Extract all the layers from a group. 
-				outLayers.extend(extractAllLayerInformation(layer, rowOrderType))
+				for ledFrame in iterLayerFrames(layer, ledLayout):
+					yield ledFrame
 				pass
 		else:
 			# Extract pixel information for regular layers
-			pixelColors.extend(extractLayerPixelInformation(layer, rowOrderType))
-			ledFrame = {
-				KEY_FRAME_ID: constLayer,
-				KEY_FRAME_PIXEL_COLORS: pixelColors,
-				KEY_FRAME_WIDTH: layerWidth,
-				KEY_FRAME_HEIGHT: layerHeight,
-				KEY_FRAME_TOTAL_LEDS: len(pixelColors)#(layerWidth*layerHeight)
-			}
-			outLayers.append(ledFrame)
-		
-	return outLayers
-	pass
+			pixelColors = extractLayerPixelInformation(layer, ledLayout)
+			yield LedFrame(constLayer, layerWidth, layerHeight, pixelColors, layerDuration)
+
+# Number of frames iterLayerFrames yields for the layers of parent, 
+# only the visibility and type of the layers are read.
+def countLayerFrames(parent):
+	frameCount = 0
+	for layer in parent.layers:
+		if not pdb.gimp_drawable_get_visible(layer):
+			continue
+		if pdb.gimp_item_is_group(layer) and not isLayerTiled(nameToConst(layer.name)):
+			frameCount += countLayerFrames(layer)
+		else:
+			frameCount += 1
+	return frameCount
 
 # Checks if a layer is tiled. 
 # A tiled layer will have all its 
@@ -285,197 +912,2766 @@ def isLayerTiled(layerId):
 	return isTiled
 
 	
-# Processing to support form common LED layouts.
-# Standard - Default, row-major. No changes needed.
-# Flip Odd - Reverses the pixels in the odd rows.
-# Flip Even - Reverses the pixels in the even rows.
-def processPixelRow(pixelList, rowOrder, rowPosition):
-	outPixelList = pixelList
-	if rowOrder == ROW_PROCESSING_STANDARD:
-		# Do nothing
-		outPixelList = pixelList
-	elif rowOrder == ROW_PROCESSING_EVEN and rowPosition % 2 == 0:
-		pixelList.reverse()
-		outPixelList = pixelList
-	elif rowOrder == ROW_PROCESSING_ODD and rowPosition % 2 == 1:
-		pixelList.reverse()
-		outPixelList = pixelList
-		
-	return outPixelList	
-	
+# Unpacks packed 0xRRGGBB bytes (3 per LED) into a tuple 
+# with the 0xRRGGBB integer color of each LED.
+def unpackRgbColors(rgbColors):
+	ledCount = len(rgbColors) // 3
+	packedColors = bytearray(ledCount * 4)
+	for channel in range(0, 3):
+		packedColors[channel + 1::4] = rgbColors[channel::3]
+	return struct.unpack(">{0}I".format(ledCount), bytes(packedColors))
 
 
-'''
------------------ END of JSON Intermediate generation section -----
-'''	
+# Returns a function gathering the bytes at the given positions of a buffer into a bytearray.
+def createByteGather(positions):
+	if len(positions) == 0:
+		return lambda values: bytearray()
+	gather = operator.itemgetter(*positions)
+	if len(positions) == 1:
+		return lambda values: bytearray((gather(values),))
+	return lambda values: bytearray(gather(values))
 
 '''
-Adafruit Code Generator
+Maps the pixels of a frame to the LEDs they drive. 
+Layouts build a table with the pixel index of every LED once per frame size 
+and reuse it for every frame, so reordering a frame is a single gather.
 '''
-class AdafruitNeoPixelStripCodeGenerator: 
+class LedLayout:
 	
-	# File to which to write the generated code to. 
-	mOutFile = None
-	mLedPattern = None
-	mOutDir = None
+	mLedPixels = None
+	mGathers = None
 	
-	LIMIT_LINE_LENTH = 10
-	LIMIT_LINE_BREAK = 9
+	def __init__(self):
+		self.mLedPixels = {}
+		self.mGathers = {}
 	
-	def __init__(self, ledPattern, outFileName, outDir):
-		#outFilename = os.path.join(outDir, '{0}_Pattern.h'.format(outFileName))
-		outFilename = os.path.join(outDir, '{0}.h'.format(self.getGeneratedLedPatternClassName(ledPattern[KEY_PATTERN_ID])))
-		self.mOutDir = outDir
-		self.mOutFile = open(outFilename, "w")
-		self.mLedPattern = ledPattern
-		
-		
-		pass
-		
-	def generate(self):
-		# Write Header 
-		patternId = self.mLedPattern[KEY_PATTERN_ID]
-		self.generatePluginHeaderInfo(self.mOutFile)
-		self.writeHeaders(patternId, self.mOutFile)
-		
-		# Include delay
-		patternDelay = self.mLedPattern[KEY_PATTERN_DELAY]
-		self.mOutFile.write("\n#define {0} {1}\n".format(self.getDelayDefineId(patternId), int(patternDelay)))
-		
-		# Include total LEDs
-		patternLEDsTotal = self.mLedPattern[KEY_PATTERN_TOTAL_LEDS]
-		self.mOutFile.write("\n#define {0} {1}\n\n".format(self.getTotalLedsDefineId(patternId), int(patternLEDsTotal)))
-		
-		# For each LED Frame Generate constant
-		ledFrames = self.mLedPattern[KEY_PATTERN_FRAMES]
-		
-		# Wrap const declarations in namespace to prevent duplicate conflicts
-		self.writeNamespaceStart(patternId, self.mOutFile)
-		
-		# TODO Handle LED Layout Type
-		frameOffsets = []
-		currOffset = 0
-		for frame in ledFrames:
-			# Write Frame const start
-			frameId = frame[KEY_FRAME_ID]
-			self.writeFrameConst(frameId, self.mOutFile)
-			
-			frameOffsets.append(currOffset)
-			
-			pixelColors = frame[KEY_FRAME_PIXEL_COLORS]
-			pixelIndex = 0
-			lastPixel = len(pixelColors) - 1
-			for color in pixelColors:
-				# LEDs don't have alpha so we just reduce the color by the alpha ratio.
-				colorRatio = (color[KEY_COLOR_ALPHA]/255.0)
-				
-				R = "%02x" %self.dimColorByRatio(color[KEY_COLOR_RED], colorRatio)
-				G = "%02x" %self.dimColorByRatio(color[KEY_COLOR_GREEN], colorRatio)
-				B = "%02x" %self.dimColorByRatio(color[KEY_COLOR_BLUE], colorRatio)
-				
-				# Move this into code generator which will consume the LED Pattern JSON
-				if pixelIndex < lastPixel:
-					self.mOutFile.write('0x{0}{1}{2}, '.format(R,G,B))
-				else: 
-					self.mOutFile.write('0x{0}{1}{2}\n'.format(R,G,B))
-				pass
-				
-				# Add a new line after 10 patterns to keep the width of the code slim
-				if pixelIndex % self.LIMIT_LINE_LENTH == self.LIMIT_LINE_BREAK:
-					self.mOutFile.write("\n	")
-				
-				pixelIndex = pixelIndex + 1
-			# Move offset forward by the amount of pixels/LEDs in this layer.
-			# TODO Properly calculate offset, possibly using layer offset. 
-			currOffset = frame[KEY_FRAME_WIDTH] * frame[KEY_FRAME_HEIGHT] + currOffset
-			
-			# Write Frame const end 
-			self.mOutFile.write("	};\n")
-			
-			pass
-			
-		# Generate LED Pattern constant.
-		self.writePatternConst(patternId, self.mOutFile)
-		for frame in ledFrames:
-			self.mOutFile.write("	{0},\n".format(frame[KEY_FRAME_ID]))
-		pass
-		self.mOutFile.write("	};\n")
-		
-		# Generate LED Pattern Size 
-		self.writePatternFrameSizeConst(patternId, self.mOutFile)
-		for frame in ledFrames:
-			self.mOutFile.write("	{0},\n".format(frame[KEY_FRAME_TOTAL_LEDS]))
-		pass
-		self.mOutFile.write("	};\n")
-				
-		# End namespace declarations
-		self.writeNamespaceEnd(patternId, self.mOutFile)
-		
-		# Write the function that will be exposed 
-		# to the main Arduino sketch to run the led pattern.
-		#self.writePlayFunction(patternId, self.mOutFile)
-		self.writePatternClass(patternId, self.mOutFile)
-		
-		# Write Footer
-		self.writeFooters(patternId, self.mOutFile)
+	# Gathers are rebuilt from the tables in worker processes.
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		state["mGathers"] = {}
+		return state
+	
+	# Text identifying the layout, used in the frame cache keys.
+	def getKey(self):
+		raise NotImplementedError()
+	
+	# Returns the row-major pixel index of every LED, in LED order, 
+	# for a frame of the given size. NO_PIXEL for LEDs without a pixel.
+	def buildLedPixels(self, width, height):
+		raise NotImplementedError()
+	
+	# Returns the cached table of pixel indices of a frame size,
+	# None when the LEDs are already in row-major order.
+	def getLedPixels(self, width, height):
+		frameSize = (width, height)
+		if frameSize not in self.mLedPixels:
+			ledPixels = self.buildLedPixels(width, height)
+			if ledPixels == list(range(0, width * height)):
+				ledPixels = None
+			self.mLedPixels[frameSize] = ledPixels
+		return self.mLedPixels[frameSize]
+	
+	# Number of LEDs driven by a frame of the given size.
+	def getLedCount(self, width, height):
+		ledPixels = self.getLedPixels(width, height)
+		if ledPixels is None:
+			return width * height
+		return len(ledPixels)
+	
+	# Returns the RGBA pixels of a frame in LED order.
+	def apply(self, pixelBuffer, width, height):
+		ledPixels = self.getLedPixels(width, height)
+		if ledPixels is None:
+			return pixelBuffer
+		if len(ledPixels) == 0:
+			return bytearray()
 		
-		self.mOutFile.write("\n")
+		pixelCount = width * height
+		gather = self.mGathers.get((width, height))
+		if gather is None:
+			# LEDs without a pixel read the extra (off) pixel added after the last one.
+			gather = operator.itemgetter(*[pixelCount if pixelIndex == NO_PIXEL else pixelIndex 
+				for pixelIndex in ledPixels])
+			self.mGathers[(width, height)] = gather
+		# Every RGBA pixel is moved as a single 32 bit word. Buffers and 
+		# views are unpacked in place, pattern file frames are not copied first.
+		pixelWords = struct.unpack("<{0}I".format(pixelCount), pixelBuffer) + (0,)
+		ledWords = gather(pixelWords)
+		if len(ledPixels) == 1:
+			ledWords = (ledWords,)
+		return bytearray(struct.pack("<{0}I".format(len(ledPixels)), *ledWords))
+
+'''
+Strip or single matrix. The matrix is rotated clockwise, then the LEDs follow 
+its rows (or columns), with every odd or even row (or column) reversed for 
+serpentine wiring.
+'''
+class MatrixLayout(LedLayout):
+	
+	mRowOrderType = None
+	mWiring = None
+	mRotation = None
+	
+	def __init__(self, rowOrderType = ROW_PROCESSING_STANDARD, wiring = LED_WIRING_ROWS, rotation = 0):
+		LedLayout.__init__(self)
+		if rotation not in LED_ROTATIONS:
+			raise ValueError("Unsupported rotation {0}, use one of {1}.".format(rotation, LED_ROTATIONS))
+		self.mRowOrderType = rowOrderType
+		self.mWiring = wiring
+		self.mRotation = rotation
+	
+	def getKey(self):
+		return "matrix {0} {1} {2}".format(self.mRowOrderType, self.mWiring, self.mRotation)
+	
+	def buildLedPixels(self, width, height):
+		rotation = self.mRotation
+		gridWidth, gridHeight = width, height
+		if rotation in (90, 270):
+			gridWidth, gridHeight = height, width
 		
-		self.mOutFile.close()
+		# Pixel index of every position of the rotated matrix in row-major order.
+		gridPixels = []
+		for gridY in range(0, gridHeight):
+			for gridX in range(0, gridWidth):
+				if rotation == 0:
+					x, y = gridX, gridY
+				elif rotation == 90:
+					x, y = gridY, height - 1 - gridX
+				elif rotation == 180:
+					x, y = width - 1 - gridX, height - 1 - gridY
+				else:
+					x, y = width - 1 - gridY, gridX
+				gridPixels.append(y * width + x)
 		
-		# Write Base Pattern class 
-		self.writeBaseLedPatternClass()
+		if self.mWiring == LED_WIRING_COLUMNS:
+			lines = [gridPixels[column::gridWidth] for column in range(0, gridWidth)]
+		else:
+			lines = [gridPixels[row * gridWidth:(row + 1) * gridWidth] for row in range(0, gridHeight)]
 		
-		# Generate ReadMe file with simple instructions on how to include in existing script.
-		# TODO Pass led pin and led count here. 
-		self.generateReadMe(patternId, 7, patternLEDsTotal)
-		pass
+		ledPixels = []
+		for linePos, line in enumerate(lines):
+			if ((self.mRowOrderType == ROW_PROCESSING_ODD and linePos % 2 == 1) 
+				or (self.mRowOrderType == ROW_PROCESSING_EVEN and linePos % 2 == 0)):
+				line = line[::-1]
+			ledPixels.extend(line)
+		return ledPixels
 
-	# Dims a color by a given ratio. Because we are creating LED 
-	# patterns and those don't have opacity, we'll just update the 
-	# color by the opacity ratio	
-	def dimColorByRatio(self, color, ratio):
-		outColor = int(color * ratio)
-		return outColor
+'''
+Panels chained one after the other. Each tile covers a rectangle of the frame 
+(x, y, width, height in pixels) and has its own MatrixLayout, so panels can be 
+mounted in any orientation. Tiles are listed in chain order.
+'''
+class TiledLayout(LedLayout):
 	
-	# Generates the ID that will be used in the Total LEDs define statement
-	def getTotalLedsDefineId(self, patternId):
-		return "{0}_TOTAL_LEDS".format(patternId)
-			
-	# Generates the ID that will be used in the Delay define statement
-	def getDelayDefineId(self, patternId):
-		return "{0}_DELAY".format(patternId)
+	mTiles = None
 	
-	# Generates the ID of the constant to use for the pattern frame sizes. 
-	def getPatternSizeConstId(self, patternId):
-		return "{0}_SIZES".format(patternId)
+	def __init__(self, tiles):
+		LedLayout.__init__(self)
+		self.mTiles = tiles
 	
-	# Generates the ID that will be used for the offsets constant. 
-	def getFrameOffsetConstId(self, patternId):
-		return "{0}_OFFSETS".format(patternId)
-		
-	def toCamelCase(self, text):
-		text = text.title()
-		return text[0].lower() + text[1:]
-		
-	# Helper to write the start of a frame to the Arduino file.
-	def writeFrameConst(self, frameName, outFile):
-		outFile.write("\n	const uint32_t {0}[] PROGMEM = {{ \n	".format(frameName))
+	def getKey(self):
+		return "tiled " + " ".join("{0} {1} {2} {3} {4}".format(x, y, tileWidth, tileHeight, tileLayout.getKey()) 
+			for x, y, tileWidth, tileHeight, tileLayout in self.mTiles)
+	
+	def buildLedPixels(self, width, height):
+		ledPixels = []
+		for x, y, tileWidth, tileHeight, tileLayout in self.mTiles:
+			tilePixels = tileLayout.getLedPixels(tileWidth, tileHeight)
+			if tilePixels is None:
+				tilePixels = range(0, tileWidth * tileHeight)
+			for tilePixel in tilePixels:
+				pixelX = x + tilePixel % tileWidth
+				pixelY = y + tilePixel // tileWidth
+				# Parts of a tile outside of the frame are off.
+				if 0 <= pixelX < width and 0 <= pixelY < height:
+					ledPixels.append(pixelY * width + pixelX)
+				else:
+					ledPixels.append(NO_PIXEL)
+		return ledPixels
 
-	# Helper to write the start of a pattern to the Arduino file.
-	# A Pattern is composed of Frames.
-	def writePatternConst(self, patternName, outFile):
-		outFile.write("\n	const uint32_t *const {0}[] PROGMEM = {{ \n".format(patternName))
-		
-	# Helper to write the start of the pattern's frame size array
-	# A Pattern Size is composed of each Frame's size listed in the same order as the frame constants.
-	def writePatternFrameSizeConst(self, patternName, outFile):
-		outFile.write("\n	const uint32_t {0}[] PROGMEM = {{ \n".format(self.getPatternSizeConstId(patternName)))
+'''
+Custom wiring read from a map: a grid the size of the frame with the 
+LED index driven by each pixel, NO_PIXEL where a pixel has no LED. 
+'''
+class MappedLayout(LedLayout):
 	
-	# Helper to write the start of frame's offset array. 
-	# The frame offset array includes the offset to be applied to the frame's LED positions.
-	def writePatternFrameOffsetConst(self, patternName, outFile):
-		outFile.write("\n	const uint32_t {0}[] PROGMEM = {{ \n".format(self.getFrameOffsetConstId(patternName)))
+	mLedMap = None
+	mKey = None
+	mName = None
+	
+	# Name is shown in errors about the map, the path of its file.
+	def __init__(self, ledMap, key, name = "LED map"):
+		LedLayout.__init__(self)
+		self.mLedMap = ledMap
+		self.mKey = key
+		self.mName = name
+	
+	def getKey(self):
+		return self.mKey
+	
+	def buildLedPixels(self, width, height):
+		ledMap = self.mLedMap
+		if len(ledMap) != height or any(len(mapRow) != width for mapRow in ledMap):
+			raise ValueError("{0} does not match the {1}x{2} frame size.".format(self.mName, width, height))
+		for y, mapRow in enumerate(ledMap):
+			for x, ledIndex in enumerate(mapRow):
+				if ledIndex < NO_PIXEL or ledIndex > MAX_LED_INDEX:
+					raise ValueError("{0}: LED {1} at row {2}, column {3} is not between 0 and {4}.".format(
+						self.mName, ledIndex, y + 1, x + 1, MAX_LED_INDEX))
+		
+		ledCount = max([ledIndex for mapRow in ledMap for ledIndex in mapRow] + [NO_PIXEL]) + 1
+		# LEDs not listed in the map are off.
+		ledPixels = [NO_PIXEL] * ledCount
+		for y, mapRow in enumerate(ledMap):
+			for x, ledIndex in enumerate(mapRow):
+				if ledIndex == NO_PIXEL:
+					continue
+				if ledPixels[ledIndex] != NO_PIXEL:
+					raise ValueError("{0}: LED {1} is mapped to more than one pixel.".format(self.mName, ledIndex))
+				ledPixels[ledIndex] = y * width + x
+		return ledPixels
+
+# Returns the layout for the layout options. 
+# A map file, when given, replaces the other options.
+def createLedLayout(rowOrderType, wiring = LED_WIRING_ROWS, rotation = 0, ledMapPath = None):
+	if ledMapPath:
+		return readLedLayoutFile(ledMapPath)
+	return MatrixLayout(rowOrderType, wiring, rotation)
+
+# Reads a layout file. 
+# CSV: One line per row of pixels with the LED index of each pixel, 
+# empty or -1 for pixels without an LED. 
+# JSON: {"map": [[LED index, ...], ...]} with the same grid, or tiled panels 
+# {"tileWidth": 8, "tileHeight": 8, "tiles": [{"x": 0, "y": 0, "rotation": 90, 
+# "wiring": "columns", "rowOrder": "flip-odd"}, ...]} listed in chain order.
+def readLedLayoutFile(path):
+	layoutFile = open(path, "r")
+	layoutText = layoutFile.read()
+	layoutFile.close()
+	key = "file " + hashlib.sha1(layoutText.encode("utf-8")).hexdigest()
+	
+	if os.path.splitext(path)[1].lower() == ".csv":
+		try:
+			ledMap = [[int(cell) if cell.strip() else NO_PIXEL for cell in mapRow] 
+				for mapRow in csv.reader(layoutText.splitlines()) if len(mapRow) > 0]
+		except ValueError as error:
+			raise ValueError("{0}: {1}".format(path, error))
+		return MappedLayout(ledMap, key, path)
+	
+	try:
+		layout = json.loads(layoutText)
+		if isinstance(layout, list):
+			layout = {"map": layout}
+		if "map" in layout:
+			ledMap = [[NO_PIXEL if ledIndex is None else int(ledIndex) for ledIndex in mapRow] for mapRow in layout["map"]]
+			return MappedLayout(ledMap, key, path)
+	except (ValueError, TypeError) as error:
+		raise ValueError("{0}: {1}".format(path, error))
+	
+	if "tiles" not in layout:
+		raise ValueError("{0} needs a \"map\" or \"tiles\".".format(path))
+	tiles = []
+	for tileNumber, tile in enumerate(layout["tiles"], 1):
+		tileName = "{0}: tile {1}".format(path, tileNumber)
+		for field, defaultField in (("x", None), ("y", None), ("width", "tileWidth"), ("height", "tileHeight")):
+			if field not in tile and defaultField not in layout:
+				raise ValueError("{0} needs \"{1}\"{2}.".format(tileName, field, 
+					"" if defaultField is None else " or the layout \"{0}\"".format(defaultField)))
+		rowOrder = tile.get("rowOrder", "standard")
+		if rowOrder not in ROW_ORDER_NAMES:
+			raise ValueError("{0} has unknown rowOrder \"{1}\", use one of {2}.".format(tileName, rowOrder, sorted(ROW_ORDER_NAMES)))
+		wiring = tile.get("wiring", "rows")
+		if wiring not in LED_WIRING_NAMES:
+			raise ValueError("{0} has unknown wiring \"{1}\", use one of {2}.".format(tileName, wiring, sorted(LED_WIRING_NAMES)))
+		rotation = int(tile.get("rotation", 0))
+		if rotation not in LED_ROTATIONS:
+			raise ValueError("{0} has unsupported rotation {1}, use one of {2}.".format(tileName, rotation, LED_ROTATIONS))
+		tileLayout = MatrixLayout(ROW_ORDER_NAMES[rowOrder], LED_WIRING_NAMES[wiring], rotation)
+		tiles.append((int(tile["x"]), int(tile["y"]), 
+			int(tile.get("width", layout.get("tileWidth"))), int(tile.get("height", layout.get("tileHeight"))), tileLayout))
+	return TiledLayout(tiles)
+
+'''
+----------------- END of JSON Intermediate generation section -----
+'''	
+
+'''
+Worker Processes
+'''
+# Returns the number of worker processes to use, 0 means one per CPU core.
+def getWorkerCount(workers):
+	if workers > 0:
+		return workers
+	import multiprocessing
+	return multiprocessing.cpu_count()
+
+# Splits an iterable into lists of up to windowSize items.
+def iterWindows(items, windowSize):
+	window = []
+	for item in items:
+		window.append(item)
+		if len(window) == windowSize:
+			yield window
+			window = []
+	if len(window) > 0:
+		yield window
+
+'''
+Runs tasks in a pool of worker processes when workers is more than 1, 
+in the current process otherwise. The initializer is called with initArgs 
+in every process doing the work. Processes are only started on the first map.
+'''
+class WorkerPool:
+	
+	# Items handed out per worker at once when streaming frames through the pool.
+	WINDOW_ITEMS_PER_WORKER = 4
+	
+	mWorkers = None
+	mInitializer = None
+	mInitArgs = None
+	mPool = None
+	mStarted = False
+	
+	def __init__(self, workers, initializer = None, initArgs = ()):
+		self.mWorkers = getWorkerCount(workers)
+		self.mInitializer = initializer
+		self.mInitArgs = initArgs
+	
+	# Returns [task(item) for item in items]. Results keep the order of the 
+	# items so the generated code doesn't depend on the number of workers.
+	def map(self, task, items):
+		if not self.mStarted:
+			self.mStarted = True
+			if self.mWorkers > 1:
+				import multiprocessing
+				self.mPool = multiprocessing.Pool(self.mWorkers, self.mInitializer, self.mInitArgs)
+			elif self.mInitializer is not None:
+				self.mInitializer(*self.mInitArgs)
+		if self.mPool is None:
+			return [task(item) for item in items]
+		return self.mPool.map(task, items)
+	
+	# Number of items to stream through the pool at once, 
+	# enough to keep every worker busy.
+	def getWindowSize(self):
+		return self.mWorkers * self.WINDOW_ITEMS_PER_WORKER
+	
+	def close(self):
+		if self.mPool is not None:
+			self.mPool.close()
+			self.mPool.join()
+			self.mPool = None
+
+'''
+On-disk cache of extracted and encoded frames. 
+Entries are files named after the hash of everything used to build them 
+(content addressed), so changed frames simply get a new key. 
+Least recently used entries are removed once the cache is over its size limit. 
+Hits and misses are counted for the current generation and added to the 
+totals kept in the stats file of the cache.
+'''
+class FrameCache:
+	
+	ENTRY_EXTENSION = ".frame"
+	STATS_FILE_NAME = "stats.json"
+	
+	mCacheDir = None
+	mMaxBytes = None
+	mHits = None
+	mMisses = None
+	mEvictions = None
+	
+	def __init__(self, cacheDir, maxBytes = FRAME_CACHE_MAX_BYTES):
+		self.mCacheDir = cacheDir
+		self.mMaxBytes = maxBytes
+		self.mHits = 0
+		self.mMisses = 0
+		self.mEvictions = 0
+	
+	# Returns the key of an entry from the values used to build it. 
+	# Byte buffers are hashed as is, anything else by its text.
+	def getKey(self, *parts):
+		keyHash = hashlib.sha1(FRAME_CACHE_VERSION.encode("ascii"))
+		for part in parts:
+			if not isinstance(part, (bytes, bytearray)):
+				part = repr(part).encode("utf-8")
+			# Length first so different splits of the same bytes don't collide.
+			keyHash.update(struct.pack(">I", len(part)))
+			keyHash.update(bytes(part))
+		return keyHash.hexdigest()
+	
+	def getEntryPath(self, key):
+		return os.path.join(self.mCacheDir, key + self.ENTRY_EXTENSION)
+	
+	# Returns the bytes stored for the key, None if they are not in the cache.
+	def get(self, key):
+		entryPath = self.getEntryPath(key)
+		try:
+			entryFile = open(entryPath, "rb")
+			entryData = entryFile.read()
+			entryFile.close()
+			# Mark the entry as recently used.
+			os.utime(entryPath, None)
+		except (IOError, OSError):
+			self.mMisses += 1
+			return None
+		self.mHits += 1
+		return entryData
+	
+	# Stores the bytes of an entry. The cache is only an optimization 
+	# so failing to write it never fails the generation.
+	def put(self, key, entryData):
+		entryPath = self.getEntryPath(key)
+		tempPath = "{0}.{1}.tmp".format(entryPath, os.getpid())
+		try:
+			if not os.path.isdir(self.mCacheDir):
+				os.makedirs(self.mCacheDir)
+			entryFile = open(tempPath, "wb")
+			entryFile.write(entryData)
+			entryFile.close()
+			# Renaming makes the entry appear complete or not at all.
+			os.rename(tempPath, entryPath)
+		except (IOError, OSError):
+			if os.path.exists(tempPath):
+				os.remove(tempPath)
+	
+	# Removes the least recently used entries until the cache fits its size limit.
+	def evict(self):
+		if not os.path.isdir(self.mCacheDir):
+			return
+		entries = []
+		totalBytes = 0
+		for fileName in os.listdir(self.mCacheDir):
+			if not fileName.endswith(self.ENTRY_EXTENSION):
+				continue
+			entryPath = os.path.join(self.mCacheDir, fileName)
+			try:
+				entryStat = os.stat(entryPath)
+			except OSError:
+				continue
+			entries.append((entryStat.st_mtime, entryStat.st_size, entryPath))
+			totalBytes += entryStat.st_size
+		
+		entries.sort()
+		for entryTime, entrySize, entryPath in entries:
+			if totalBytes <= self.mMaxBytes:
+				break
+			try:
+				os.remove(entryPath)
+			except OSError:
+				continue
+			totalBytes -= entrySize
+			self.mEvictions += 1
+	
+	# Adds the counts of this generation to the totals in the stats file. 
+	# Returns the updated totals.
+	def saveStats(self):
+		statsPath = os.path.join(self.mCacheDir, self.STATS_FILE_NAME)
+		stats = {"hits": 0, "misses": 0, "evictions": 0}
+		try:
+			statsFile = open(statsPath, "r")
+			stats.update(json.load(statsFile))
+			statsFile.close()
+		except (IOError, OSError, ValueError):
+			pass
+		stats["hits"] += self.mHits
+		stats["misses"] += self.mMisses
+		stats["evictions"] += self.mEvictions
+		stats["lastHits"] = self.mHits
+		stats["lastMisses"] = self.mMisses
+		try:
+			if not os.path.isdir(self.mCacheDir):
+				os.makedirs(self.mCacheDir)
+			statsFile = open(statsPath, "w")
+			json.dump(stats, statsFile, indent=4, sort_keys=True)
+			statsFile.close()
+		except (IOError, OSError):
+			pass
+		return stats
+	
+	# Line summarizing the use of the cache in this generation.
+	def getSummary(self):
+		return "Frame cache: {0} hits, {1} misses, {2} evicted.".format(self.mHits, self.mMisses, self.mEvictions)
+
+'''
+Image Sources
+'''
+# Image sources provide the frames of a pattern to the generation pipeline.
+# GimpImageSource reads the layers of a GIMP image through the pdb, the 
+# file based sources allow generating patterns without GIMP.
+
+# Extensions of the frame files picked up from a directory of frames.
+FRAME_FILE_EXTENSIONS = (".png",)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Number of channels for each PNG color type.
+PNG_COLOR_TYPE_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+'''
+Base class for the sources of the frames of a pattern.
+'''
+class LedImageSource:
+	
+	# Name of the pattern, used to name the generated code.
+	def getName(self):
+		raise NotImplementedError()
+	
+	# Width of the pattern in pixels/LEDs.
+	def getWidth(self):
+		raise NotImplementedError()
+	
+	# Height of the pattern in pixels/LEDs.
+	def getHeight(self):
+		raise NotImplementedError()
+	
+	# Colormap of indexed images as a list of 0xRRGGBB colors, None otherwise.
+	def getColormap(self):
+		return None
+	
+	# Number of frames iterFrames yields, None when it isn't known up front.
+	def getFrameCount(self):
+		return None
+	
+	# Yields the LedFrames of the pattern in frame order, reading them 
+	# one at a time. Sources that support it read the frames using worker 
+	# processes and reuse the frames found in the frameCache.
+	def iterFrames(self, ledLayout, workers = 1, frameCache = None):
+		raise NotImplementedError()
+
+	# Whether the pixels of a frame are in LED order whatever the layout 
+	# it was read with, like the frames of TLF_ tiled groups.
+	def isLedOrder(self, ledFrame):
+		return False
+
+'''
+Frames of an image source, read one at a time while iterating. 
+Every pass over the frames reads them again so only the current frame 
+(or window of frames with worker processes) is kept in memory.
+'''
+class LedFrameStream:
+	
+	mImageSource = None
+	mLedLayout = None
+	mWorkers = None
+	mFrameCache = None
+	
+	def __init__(self, imageSource, ledLayout, workers = 1, frameCache = None):
+		self.mImageSource = imageSource
+		self.mLedLayout = ledLayout
+		self.mWorkers = workers
+		self.mFrameCache = frameCache
+	
+	def __iter__(self):
+		return self.mImageSource.iterFrames(self.mLedLayout, self.mWorkers, self.mFrameCache)
+	
+	def getFrameCount(self):
+		return self.mImageSource.getFrameCount()
+
+'''
+Frames from the visible layers of an image open in GIMP.
+'''
+class GimpImageSource(LedImageSource):
+	
+	mImage = None
+	
+	def __init__(self, image):
+		self.mImage = image
+	
+	def getName(self):
+		filename, file_extension = os.path.splitext(self.mImage.name)
+		return filename
+	
+	def getWidth(self):
+		return self.mImage.width
+	
+	def getHeight(self):
+		return self.mImage.height
+	
+	def getColormap(self):
+		return getImageColormap(self.mImage)
+	
+	def getFrameCount(self):
+		return countLayerFrames(self.mImage)
+	
+	# The PDB can only be used from the plug-in process so workers are ignored. 
+	# Layers are not cached, reading the layer is needed to know if it changed 
+	# and it is most of the work. Their encoded frames are cached by the generator.
+	def iterFrames(self, ledLayout, workers = 1, frameCache = None):
+		usedIds = set()
+		for ledFrame in iterLayerFrames(self.mImage, ledLayout):
+			ledFrame.frameId = getUniqueFrameId(ledFrame.frameId, usedIds)
+			yield ledFrame
+	
+	def isLedOrder(self, ledFrame):
+		return isLayerTiled(ledFrame.frameId)
+
+'''
+Single frame read from an image file. 
+'''
+class FileFrame:
+	
+	def __init__(self, path, frameId, pageIndex = 0, opacity = 100.0, visible = True, duration = None):
+		self.path = path
+		self.frameId = frameId
+		# Page of a multi-page image file (GIF, TIFF, ...)
+		self.pageIndex = pageIndex
+		# Opacity between 0-100, the same as a GIMP layer opacity.
+		self.opacity = opacity
+		self.visible = visible
+		# Milliseconds the frame is shown for, None to use the pattern delay.
+		self.duration = duration
+
+'''
+Frames read from image files. 
+Base for the directory, manifest and multi-page image sources.
+'''
+class FileImageSource(LedImageSource):
+	
+	mName = None
+	mFileFrames = None
+	mWidth = None
+	mHeight = None
+	
+	def __init__(self, name, fileFrames, width = None, height = None):
+		self.mName = name
+		self.mFileFrames = fileFrames
+		self.mWidth = width
+		self.mHeight = height
+		if len(fileFrames) == 0:
+			raise ValueError("No frames found for pattern '{0}'.".format(name))
+		usedIds = set()
+		for fileFrame in fileFrames:
+			fileFrame.frameId = getUniqueFrameId(fileFrame.frameId, usedIds)
+	
+	def getName(self):
+		return self.mName
+	
+	# Pattern size defaults to the size of the first frame.
+	def getWidth(self):
+		if self.mWidth is None:
+			self.mWidth, self.mHeight = self.getFirstFrameSize()
+		return self.mWidth
+	
+	def getHeight(self):
+		if self.mHeight is None:
+			self.mWidth, self.mHeight = self.getFirstFrameSize()
+		return self.mHeight
+	
+	def getFrameCount(self):
+		return len([fileFrame for fileFrame in self.mFileFrames if fileFrame.visible])
+	
+	def getFirstFrameSize(self):
+		fileFrame = self.mFileFrames[0]
+		width, height, pixelBuffer = readImagePage(fileFrame.path, fileFrame.pageIndex)
+		return width, height
+	
+	def iterFrames(self, ledLayout, workers = 1, frameCache = None):
+		workerPool = WorkerPool(workers)
+		# Hash of each file, multi-page files are only hashed once.
+		fileHashes = {}
+		try:
+			# Skip hidden frames, the same as hidden layers. 
+			frameTasks = ((fileFrame, ledLayout) for fileFrame in self.mFileFrames if fileFrame.visible)
+			for windowTasks in iterWindows(frameTasks, workerPool.getWindowSize()):
+				for ledFrame in self.readFrames(windowTasks, workerPool, frameCache, fileHashes):
+					yield ledFrame
+		finally:
+			workerPool.close()
+	
+	# Reads the frames of a list of (fileFrame, ledLayout) tasks.
+	def readFrames(self, frameTasks, workerPool, frameCache, fileHashes):
+		if frameCache is None:
+			return workerPool.map(readFileFrameTask, frameTasks)
+		
+		# Frames are cached by the content of their file and the options used to read them.
+		frameKeys = []
+		for fileFrame, ledLayout in frameTasks:
+			if fileFrame.path not in fileHashes:
+				fileHashes[fileFrame.path] = getFileHash(fileFrame.path)
+			frameKeys.append(frameCache.getKey("file", fileHashes[fileFrame.path], 
+				fileFrame.pageIndex, fileFrame.opacity, ledLayout.getKey()))
+		
+		outFrames = [None] * len(frameTasks)
+		missedPositions = []
+		for framePos in range(0, len(frameTasks)):
+			cachedFrame = frameCache.get(frameKeys[framePos])
+			if cachedFrame is None:
+				missedPositions.append(framePos)
+				continue
+			width, height = struct.unpack(">II", cachedFrame[0:8])
+			fileFrame = frameTasks[framePos][0]
+			outFrames[framePos] = LedFrame(fileFrame.frameId, width, height, bytearray(cachedFrame[8:]), fileFrame.duration)
+		
+		readFrames = workerPool.map(readFileFrameTask, [frameTasks[framePos] for framePos in missedPositions])
+		for framePos, ledFrame in zip(missedPositions, readFrames):
+			frameCache.put(frameKeys[framePos], struct.pack(">II", ledFrame.width, ledFrame.height) + bytes(ledFrame.pixels))
+			outFrames[framePos] = ledFrame
+		return outFrames
+
+# Reads the LedFrame of a single frame file with the opacity and LED layout applied.
+def readFileFrame(fileFrame, ledLayout):
+	startTime = time.time()
+	width, height, pixelBuffer = readImagePage(fileFrame.path, fileFrame.pageIndex)
+	addStageTime("extract.readPixels", startTime)
+	countProfile("pixelBytesRead", len(pixelBuffer))
+	startTime = time.time()
+	applyOpacity(pixelBuffer, fileFrame.opacity)
+	addStageTime("extract.convertPixels", startTime)
+	startTime = time.time()
+	pixelBuffer = ledLayout.apply(pixelBuffer, width, height)
+	addStageTime("extract.layout", startTime)
+	return LedFrame(fileFrame.frameId, width, height, pixelBuffer, fileFrame.duration)
+
+# Worker task reading a (fileFrame, ledLayout) pair.
+def readFileFrameTask(frameTask):
+	return readFileFrame(*frameTask)
+
+'''
+Frames from every PNG file in a directory, ordered by file name.
+The pattern is named after the directory.
+'''
+class FrameDirectoryImageSource(FileImageSource):
+	
+	def __init__(self, directory):
+		fileNames = sorted(fileName for fileName in os.listdir(directory) 
+			if os.path.splitext(fileName)[1].lower() in FRAME_FILE_EXTENSIONS)
+		fileFrames = [FileFrame(os.path.join(directory, fileName), fileNameToFrameId(fileName), 
+			duration = fileNameToFrameDuration(fileName)) for fileName in fileNames]
+		name = os.path.basename(os.path.normpath(os.path.abspath(directory)))
+		FileImageSource.__init__(self, name, fileFrames)
+
+'''
+Frames listed in a JSON manifest file: 
+{
+  "name": "Pattern name (optional, defaults to the manifest file name)",
+  "width": 8, "height": 8, (optional, defaults to the size of the first frame)
+  "frames": [
+    "frame1.png",
+    {"file": "frame2.png", "name": "Frame 2", "opacity": 50, "visible": true, "page": 0, "duration": 250}
+  ]
+}
+Frame files are relative to the manifest file.
+'''
+class ManifestImageSource(FileImageSource):
+	
+	def __init__(self, manifestPath):
+		manifestFile = open(manifestPath, "r")
+		manifest = json.load(manifestFile)
+		manifestFile.close()
+		
+		manifestDir = os.path.dirname(os.path.abspath(manifestPath))
+		fileFrames = []
+		for frameEntry in manifest.get("frames", []):
+			if not isinstance(frameEntry, dict):
+				frameEntry = {"file": frameEntry}
+			framePath = os.path.join(manifestDir, frameEntry["file"])
+			if "name" in frameEntry:
+				frameName, frameDuration = parseFrameName(frameEntry["name"])
+				frameId = nameToConst(frameName)
+			else:
+				frameId = fileNameToFrameId(frameEntry["file"])
+				frameDuration = fileNameToFrameDuration(frameEntry["file"])
+			if "duration" in frameEntry:
+				frameDuration = int(frameEntry["duration"])
+				if frameDuration < 0:
+					raise ValueError("{0}: frame {1} has a negative duration ({2}ms).".format(
+						manifestPath, frameEntry["file"], frameDuration))
+			fileFrames.append(FileFrame(framePath, frameId, 
+				frameEntry.get("page", 0), 
+				float(frameEntry.get("opacity", 100.0)), 
+				frameEntry.get("visible", True), 
+				frameDuration))
+		
+		name = manifest.get("name", os.path.splitext(os.path.basename(manifestPath))[0])
+		FileImageSource.__init__(self, name, fileFrames, manifest.get("width"), manifest.get("height"))
+
+'''
+Frames from every page of a single image file (animated GIF, multi-page TIFF, ...)
+or a single frame for a plain PNG file. 
+The pattern is named after the file.
+'''
+class MultiPageImageSource(FileImageSource):
+	
+	def __init__(self, imagePath):
+		name = os.path.splitext(os.path.basename(imagePath))[0]
+		pageCount = getImagePageCount(imagePath)
+		fileFrames = [FileFrame(imagePath, "{0}_FRAME_{1}".format(nameToConst(name), pageIndex), pageIndex) 
+			for pageIndex in range(0, pageCount)]
+		FileImageSource.__init__(self, name, fileFrames)
+
+'''
+Pattern Files
+'''
+# The frames of a pattern can be saved once they are extracted, so the 
+# extraction (the slow part in GIMP) runs once and the generators, the 
+# emulator and other tools read the frames from the file as often as they 
+# need to. Pattern files are memory-mapped and read without loading them, 
+# so patterns larger than the memory can be used.
+#
+# Layout of a pattern file (numbers are big-endian):
+# - Header (PATTERN_FILE_HEADER_BYTES): magic, version, width and height 
+#   of the pattern, number of frames and the offsets of the frame index and 
+#   of the metadata, see PATTERN_FILE_HEADER_FORMAT.
+# - Frames: the RGBA pixels of every frame (PIXEL_BYTES per pixel), one 
+#   after the other. Pixels are kept in row-major order so any LED layout 
+#   can be applied when they are read, unless the frame is flagged as 
+#   already in LED order (TLF_ tiled groups).
+# - Frame index: an entry per frame with the offset and size of its pixels, 
+#   its width, height, duration (-1 for the pattern delay) and flags, see 
+#   PATTERN_FRAME_INDEX_FORMAT.
+# - Metadata: JSON with the name of the pattern, the colormap of indexed 
+#   images and the ID of every frame.
+# The index and metadata are written after the frames, so frames are written 
+# as they are extracted without knowing how many there are.
+
+# Extension of the pattern files.
+PATTERN_FILE_EXTENSION = ".ledpattern"
+PATTERN_FILE_MAGIC = b"GLEDPATT"
+# Changes whenever the layout of the file changes, older files can't be read.
+PATTERN_FILE_VERSION = 1
+# Magic, version, width, height, frame count, offset of the frame index, offset and size of the metadata.
+PATTERN_FILE_HEADER_FORMAT = ">8sHIIIQQI"
+# Bytes reserved for the header, the pixels of the first frame start after it.
+PATTERN_FILE_HEADER_BYTES = 64
+# Offset and size of the pixels, width, height, duration and flags.
+PATTERN_FRAME_INDEX_FORMAT = ">QIIIiI"
+# Flag of the frames whose pixels are already in LED order.
+PATTERN_FRAME_LED_ORDER = 1
+
+# Returns a read-only view of size bytes of a memory map, without copying them.
+def getMapView(memoryMap, offset, size):
+	try:
+		return memoryview(memoryMap)[offset:offset + size]
+	except TypeError:
+		# Python 2 maps only support the old buffer interface.
+		return buffer(memoryMap, offset, size)
+
+# Returns the path of the pattern file of a pattern next to its generated code.
+def getPatternFilePath(outDir, patternId):
+	return os.path.join(outDir, "Pattern_{0}{1}".format(patternId, PATTERN_FILE_EXTENSION))
+
+'''
+Pattern file open for reading, memory-mapped. 
+The pixels of a frame are read in place with getFramePixels, the views it 
+returns must be dropped before the file is closed.
+'''
+class PatternFile:
+	
+	mPath = None
+	mFile = None
+	mMap = None
+	mName = None
+	mWidth = None
+	mHeight = None
+	mColormap = None
+	mFrameIds = None
+	# (pixels offset, pixels size, width, height, duration, flags) of every frame.
+	mFrameIndex = None
+	
+	def __init__(self, path):
+		self.mPath = path
+		self.mFile = open(path, "rb")
+		try:
+			self.mMap = mmap.mmap(self.mFile.fileno(), 0, access = mmap.ACCESS_READ)
+		except ValueError:
+			# Empty files can't be mapped.
+			self.mFile.close()
+			raise ValueError("{0} is not a pattern file.".format(os.path.basename(path)))
+		try:
+			self.readHeader()
+		except ValueError:
+			self.close()
+			raise
+		except (struct.error, KeyError, TypeError):
+			# Index entries or metadata that don't read as such.
+			self.close()
+			raise ValueError("{0} is not a pattern file.".format(os.path.basename(path)))
+	
+	def readHeader(self):
+		fileName = os.path.basename(self.mPath)
+		if len(self.mMap) < PATTERN_FILE_HEADER_BYTES or self.mMap[0:len(PATTERN_FILE_MAGIC)] != PATTERN_FILE_MAGIC:
+			raise ValueError("{0} is not a pattern file.".format(fileName))
+		(magic, version, self.mWidth, self.mHeight, frameCount, indexOffset, metadataOffset, 
+			metadataBytes) = struct.unpack_from(PATTERN_FILE_HEADER_FORMAT, self.mMap, 0)
+		if version != PATTERN_FILE_VERSION:
+			raise ValueError("{0} is a version {1} pattern file, only version {2} can be read.".format(
+				fileName, version, PATTERN_FILE_VERSION))
+		if metadataOffset + metadataBytes > len(self.mMap):
+			raise ValueError("{0} is incomplete.".format(fileName))
+		
+		indexEntryBytes = struct.calcsize(PATTERN_FRAME_INDEX_FORMAT)
+		if indexOffset + frameCount * indexEntryBytes > len(self.mMap):
+			raise ValueError("{0} is incomplete.".format(fileName))
+		self.mFrameIndex = [struct.unpack_from(PATTERN_FRAME_INDEX_FORMAT, self.mMap, indexOffset + framePos * indexEntryBytes) 
+			for framePos in range(0, frameCount)]
+		for pixelsOffset, pixelsBytes, width, height, duration, flags in self.mFrameIndex:
+			if pixelsOffset + pixelsBytes > len(self.mMap):
+				raise ValueError("{0} is incomplete.".format(fileName))
+		try:
+			metadata = json.loads(self.mMap[metadataOffset:metadataOffset + metadataBytes].decode("utf-8"))
+		except ValueError:
+			raise ValueError("{0} is not a pattern file.".format(fileName))
+		self.mName = metadata["name"]
+		self.mColormap = metadata.get("colormap")
+		self.mFrameIds = metadata["frameIds"]
+		if len(self.mFrameIds) != frameCount:
+			raise ValueError("{0} is not a pattern file.".format(fileName))
+	
+	def close(self):
+		if self.mMap is not None:
+			self.mMap.close()
+			self.mMap = None
+		self.mFile.close()
+	
+	def getName(self):
+		return self.mName
+	
+	def getWidth(self):
+		return self.mWidth
+	
+	def getHeight(self):
+		return self.mHeight
+	
+	def getColormap(self):
+		return self.mColormap
+	
+	def getFrameCount(self):
+		return len(self.mFrameIndex)
+	
+	# Milliseconds the frame at framePos is shown for, None for the pattern delay.
+	def getFrameDuration(self, framePos):
+		duration = self.mFrameIndex[framePos][4]
+		if duration < 0:
+			return None
+		return duration
+	
+	# Returns a read-only view of the RGBA pixels of the frame at framePos, in the map.
+	def getFramePixels(self, framePos):
+		pixelsOffset, pixelsBytes = self.mFrameIndex[framePos][0:2]
+		return getMapView(self.mMap, pixelsOffset, pixelsBytes)
+	
+	# Returns the LedFrame at framePos with its pixels in LED order. 
+	# Layouts gather the LEDs straight out of the map. Pixels already in LED 
+	# order are copied once instead, so the frame can outlive the file.
+	def readFrame(self, framePos, ledLayout):
+		pixelsOffset, pixelsBytes, width, height, duration, flags = self.mFrameIndex[framePos]
+		framePixels = self.getFramePixels(framePos)
+		startTime = time.time()
+		if flags & PATTERN_FRAME_LED_ORDER or ledLayout.getLedPixels(width, height) is None:
+			pixels = bytearray(framePixels)
+			addStageTime("extract.readPixels", startTime)
+		else:
+			pixels = ledLayout.apply(framePixels, width, height)
+			addStageTime("extract.layout", startTime)
+		return LedFrame(self.mFrameIds[framePos], width, height, pixels, None if duration < 0 else duration)
+
+# Extracts the frames of an image source once and saves them to a pattern file. 
+# The file is written under a temporary name and renamed once complete. 
+# Returns the number of frames saved.
+def writePatternFile(path, imageSource, workers = 1, frameCache = None, frameProgress = None):
+	tempPath = "{0}.{1}.tmp".format(path, os.getpid())
+	patternFile = open(tempPath, "wb")
+	complete = False
+	try:
+		patternFile.write(bytearray(PATTERN_FILE_HEADER_BYTES))
+		# The pixels are saved in row-major order, layouts are applied when they are read.
+		rowMajorLayout = createLedLayout(ROW_PROCESSING_STANDARD)
+		frameOffset = PATTERN_FILE_HEADER_BYTES
+		frameIndex = bytearray()
+		frameIds = []
+		for frame in iterProfiledFrames(imageSource.iterFrames(rowMajorLayout, workers, frameCache), "extract"):
+			startTime = time.time()
+			flags = 0
+			if imageSource.isLedOrder(frame):
+				flags |= PATTERN_FRAME_LED_ORDER
+			patternFile.write(frame.pixels)
+			frameIndex.extend(struct.pack(PATTERN_FRAME_INDEX_FORMAT, frameOffset, len(frame.pixels), 
+				frame.width, frame.height, -1 if frame.duration is None else frame.duration, flags))
+			frameIds.append(frame.frameId)
+			frameOffset += len(frame.pixels)
+			addStageTime("write", startTime)
+			if frameProgress is not None:
+				frameProgress.frameDone()
+		
+		startTime = time.time()
+		metadata = json.dumps({"name": imageSource.getName(), "colormap": imageSource.getColormap(), 
+			"frameIds": frameIds}, sort_keys=True).encode("utf-8")
+		patternFile.write(frameIndex)
+		patternFile.write(metadata)
+		patternFile.seek(0)
+		patternFile.write(struct.pack(PATTERN_FILE_HEADER_FORMAT, PATTERN_FILE_MAGIC, PATTERN_FILE_VERSION, 
+			imageSource.getWidth(), imageSource.getHeight(), len(frameIds), frameOffset, 
+			frameOffset + len(frameIndex), len(metadata)))
+		patternFile.close()
+		# Renaming makes the file appear complete or not at all.
+		if os.path.exists(path):
+			os.remove(path)
+		os.rename(tempPath, path)
+		complete = True
+		addStageTime("write", startTime)
+	finally:
+		if not complete:
+			patternFile.close()
+			os.remove(tempPath)
+	return len(frameIds)
+
+'''
+Frames saved in a pattern file. 
+Every pass over the frames maps the file again and reads the frames from it, 
+so reading them again is cheap and only the current frame is copied into 
+memory. Workers and the frame cache are not needed.
+'''
+class PatternFileImageSource(LedImageSource):
+	
+	mPath = None
+	mName = None
+	mWidth = None
+	mHeight = None
+	mColormap = None
+	mFrameCount = None
+	
+	def __init__(self, path):
+		self.mPath = path
+		patternFile = PatternFile(path)
+		self.mName = patternFile.getName()
+		self.mWidth = patternFile.getWidth()
+		self.mHeight = patternFile.getHeight()
+		self.mColormap = patternFile.getColormap()
+		self.mFrameCount = patternFile.getFrameCount()
+		patternFile.close()
+	
+	def getName(self):
+		return self.mName
+	
+	def getWidth(self):
+		return self.mWidth
+	
+	def getHeight(self):
+		return self.mHeight
+	
+	def getColormap(self):
+		return self.mColormap
+	
+	def getFrameCount(self):
+		return self.mFrameCount
+	
+	def iterFrames(self, ledLayout, workers = 1, frameCache = None):
+		patternFile = PatternFile(self.mPath)
+		try:
+			for framePos in range(0, patternFile.getFrameCount()):
+				yield patternFile.readFrame(framePos, ledLayout)
+		finally:
+			patternFile.close()
+
+# Returns the image source for a path: 
+# a directory of frame files, a JSON manifest, a pattern file or a (multi-page) image file.
+def createImageSource(path):
+	if os.path.isdir(path):
+		return FrameDirectoryImageSource(path)
+	if os.path.splitext(path)[1].lower() == ".json":
+		return ManifestImageSource(path)
+	if os.path.splitext(path)[1].lower() == PATTERN_FILE_EXTENSION:
+		return PatternFileImageSource(path)
+	return MultiPageImageSource(path)
+
+# Returns the SHA-1 digest of the content of a file.
+def getFileHash(path):
+	inFile = open(path, "rb")
+	fileHash = hashlib.sha1(inFile.read()).digest()
+	inFile.close()
+	return fileHash
+
+# Frame IDs must be valid C++ names, so file names starting with 
+# a number (001.png) are prefixed.
+def fileNameToFrameId(fileName):
+	frameName, frameDuration = parseFrameName(os.path.splitext(os.path.basename(fileName))[0])
+	frameId = nameToConst(frameName).replace("-", "_").replace(".", "_")
+	if frameId[:1].isdigit():
+		frameId = "FRAME_" + frameId
+	return frameId
+
+# Duration in milliseconds set by the (250ms) tag of a frame file name, None without it.
+def fileNameToFrameDuration(fileName):
+	frameName, frameDuration = parseFrameName(os.path.splitext(os.path.basename(fileName))[0])
+	return frameDuration
+
+# Path and open image of the last image file read. 
+# The frames of a multi-page image all come from the same file, 
+# its pages are read one at a time from the open image.
+lastImageFile = [None, None]
+
+# Returns the open image of a file: a Pillow image or, without 
+# the Pillow package, the (width, height, RGBA bytearray) of a PNG file. 
+def openImageFile(path):
+	if lastImageFile[0] == path:
+		return lastImageFile[1]
+	
+	imageFile = open(path, "rb")
+	signature = imageFile.read(len(PNG_SIGNATURE))
+	imageFile.close()
+	try:
+		from PIL import Image
+	except ImportError:
+		Image = None
+	
+	if Image is not None:
+		image = Image.open(path)
+	elif signature == PNG_SIGNATURE:
+		image = readPngFile(path)
+	else:
+		raise ValueError("Can't read '{0}': only PNG files are supported without the Pillow package.".format(path))
+	
+	lastImageFile[0] = path
+	lastImageFile[1] = image
+	return image
+
+# Number of pages (frames) in an image file.
+def getImagePageCount(path):
+	image = openImageFile(path)
+	if isinstance(image, tuple):
+		return 1
+	return getattr(image, "n_frames", 1)
+
+# Reads a single page of an image file as (width, height, RGBA bytearray). 
+# PNG files are read without any extra package, other formats 
+# (and multi-page files) need the Pillow package. 
+def readImagePage(path, pageIndex = 0):
+	image = openImageFile(path)
+	if isinstance(image, tuple):
+		width, height, pixelBuffer = image
+		# Copy the pixels, the open image is shared by every read of the file.
+		return width, height, bytearray(pixelBuffer)
+	image.seek(pageIndex)
+	rgbaPage = image.convert("RGBA")
+	return rgbaPage.size[0], rgbaPage.size[1], bytearray(rgbaPage.tobytes())
+
+# Minimal PNG reader (8 and 16 bit, non-interlaced) returning 
+# (width, height, RGBA bytearray).
+def readPngFile(path):
+	pngFile = open(path, "rb")
+	pngData = pngFile.read()
+	pngFile.close()
+	if pngData[:len(PNG_SIGNATURE)] != PNG_SIGNATURE:
+		raise ValueError("'{0}' is not a PNG file.".format(path))
+	
+	header = None
+	palette = None
+	transparency = None
+	imageData = []
+	chunkStart = len(PNG_SIGNATURE)
+	while chunkStart < len(pngData):
+		chunkLength, chunkType = struct.unpack(">I4s", pngData[chunkStart:chunkStart + 8])
+		chunkData = pngData[chunkStart + 8:chunkStart + 8 + chunkLength]
+		chunkStart += chunkLength + 12
+		if chunkType == b"IHDR":
+			header = struct.unpack(">IIBBBBB", chunkData)
+		elif chunkType == b"PLTE":
+			palette = bytearray(chunkData)
+		elif chunkType == b"tRNS":
+			transparency = bytearray(chunkData)
+		elif chunkType == b"IDAT":
+			imageData.append(chunkData)
+		elif chunkType == b"IEND":
+			break
+	
+	width, height, bitDepth, colorType, compression, filterMethod, interlace = header
+	if bitDepth not in (8, 16) or interlace != 0 or colorType not in PNG_COLOR_TYPE_CHANNELS:
+		raise ValueError("'{0}': only 8/16 bit non-interlaced PNG files are supported.".format(path))
+	
+	channels = PNG_COLOR_TYPE_CHANNELS[colorType]
+	pixelBytes = channels * bitDepth // 8
+	rowLength = width * pixelBytes
+	filteredRows = bytearray(zlib.decompress(b"".join(imageData)))
+	rawPixels = bytearray()
+	previousRow = bytearray(rowLength)
+	for y in range(0, height):
+		rowStart = y * (rowLength + 1)
+		row = unfilterPngRow(filteredRows[rowStart], filteredRows[rowStart + 1:rowStart + 1 + rowLength], 
+			previousRow, pixelBytes)
+		rawPixels += row
+		previousRow = row
+	
+	if bitDepth == 16:
+		# Keep the most significant byte of each sample.
+		rawPixels = rawPixels[0::2]
+	
+	pixelBuffer = toRgbaBuffer(rawPixels, channels, width * height, palette)
+	if colorType == 3 and transparency is not None:
+		alphaTable = bytearray(b"\xff") * 256
+		alphaTable[0:len(transparency)] = transparency
+		pixelBuffer[3::4] = rawPixels.translate(bytes(alphaTable))
+	return width, height, pixelBuffer
+
+# Reverses the PNG filter of a single row.
+def unfilterPngRow(filterType, row, previousRow, pixelBytes):
+	if filterType == 0:
+		return row
+	if filterType == 2:
+		return bytearray((current + above) & 0xFF for current, above in zip(row, previousRow))
+	
+	for i in range(0, len(row)):
+		left = row[i - pixelBytes] if i >= pixelBytes else 0
+		if filterType == 1:
+			row[i] = (row[i] + left) & 0xFF
+		elif filterType == 3:
+			row[i] = (row[i] + ((left + previousRow[i]) >> 1)) & 0xFF
+		elif filterType == 4:
+			above = previousRow[i]
+			aboveLeft = previousRow[i - pixelBytes] if i >= pixelBytes else 0
+			estimate = left + above - aboveLeft
+			leftDistance = abs(estimate - left)
+			aboveDistance = abs(estimate - above)
+			aboveLeftDistance = abs(estimate - aboveLeft)
+			if leftDistance <= aboveDistance and leftDistance <= aboveLeftDistance:
+				predictor = left
+			elif aboveDistance <= aboveLeftDistance:
+				predictor = above
+			else:
+				predictor = aboveLeft
+			row[i] = (row[i] + predictor) & 0xFF
+	return row
+
+# Writes an 8 bit RGB PNG file from its rows of packed RGB bytes, 
+# compressed as they come so the whole image is never held twice.
+def writePngFile(path, width, height, rows):
+	compressor = zlib.compressobj()
+	imageData = []
+	for row in rows:
+		# Rows are stored without a filter (type 0).
+		imageData.append(compressor.compress(b"\x00" + bytes(row)))
+	imageData.append(compressor.flush())
+	
+	pngFile = open(path, "wb")
+	pngFile.write(PNG_SIGNATURE)
+	for chunkType, chunkData in ((b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)), 
+			(b"IDAT", b"".join(imageData)), (b"IEND", b"")):
+		pngFile.write(struct.pack(">I4s", len(chunkData), chunkType) + chunkData)
+		pngFile.write(struct.pack(">I", zlib.crc32(chunkType + chunkData) & 0xFFFFFFFF))
+	pngFile.close()
+
+'''
+Progress Reporters
+'''
+# Reports progress in the GIMP progress bar.
+class GimpProgress:
+	
+	def pulse(self):
+		pdb.gimp_progress_pulse()
+	
+	def setText(self, text):
+		pdb.gimp_progress_set_text(text)
+	
+	def update(self, fraction):
+		pdb.gimp_progress_update(fraction)
+	
+	def end(self):
+		pdb.gimp_progress_end()
+
+# Reports progress on the console when generating from the command line.
+class ConsoleProgress:
+	
+	mName = None
+	
+	def __init__(self, name):
+		self.mName = name
+	
+	def pulse(self):
+		pass
+	
+	def setText(self, text):
+		sys.stdout.write("{0}: {1}\n".format(self.mName, text))
+	
+	def update(self, fraction):
+		pass
+	
+	def end(self):
+		pass
+
+# Drives a progress reporter with the fraction of the frames done 
+# and, at most once every TEXT_INTERVAL seconds, the time left.
+class FrameProgress:
+	
+	mProgress = None
+	mTotalFrames = None
+	mText = None
+	mFramesDone = 0
+	mStartTime = None
+	mTextTime = None
+	
+	# Seconds between two updates of the progress text.
+	TEXT_INTERVAL = 1.0
+	
+	def __init__(self, progress, totalFrames, text):
+		self.mProgress = progress
+		self.mTotalFrames = totalFrames
+		self.mText = text
+		self.mFramesDone = 0
+		self.mStartTime = time.time()
+		self.mTextTime = self.mStartTime
+	
+	# Starts counting the frames again for another pass over them.
+	def restart(self, text):
+		self.mText = text
+		self.mFramesDone = 0
+		self.mStartTime = time.time()
+		self.mTextTime = self.mStartTime
+		self.mProgress.setText(text)
+	
+	def frameDone(self):
+		self.mFramesDone += 1
+		if not self.mTotalFrames:
+			# Unknown number of frames.
+			self.mProgress.pulse()
+			return
+		
+		self.mProgress.update(min(1.0, self.mFramesDone / float(self.mTotalFrames)))
+		currentTime = time.time()
+		if currentTime - self.mTextTime < self.TEXT_INTERVAL or self.mFramesDone >= self.mTotalFrames:
+			return
+		self.mTextTime = currentTime
+		secondsLeft = (currentTime - self.mStartTime) / self.mFramesDone * (self.mTotalFrames - self.mFramesDone)
+		self.mProgress.setText("{0} Frame {1} of {2}, about {3}s left.".format(
+			self.mText, self.mFramesDone, self.mTotalFrames, int(secondsLeft + 0.5)))
+
+'''
+End: Image Sources
+'''
+
+'''
+Profiling
+'''
+# The generation is instrumented per stage. Top level stages (extract, 
+# palette, encode, write) don't overlap, the "extract.*" stages are 
+# part of "extract" and are only measured when the frames are read in 
+# this process (not by worker processes).
+
+# Profile of the generation running in this process, None when not profiling.
+activeProfile = [None]
+
+# Makes profile the active profile. Inside GIMP the pdb is 
+# replaced by a PdbCallCounter until stopProfile is called.
+def startProfile(profile):
+	global pdb
+	activeProfile[0] = profile
+	if profile is None:
+		return
+	profile.start()
+	if GIMP_AVAILABLE:
+		pdb = PdbCallCounter(pdb, profile)
+
+# Stops the active profile, if any, and restores the pdb.
+def stopProfile():
+	global pdb
+	profile = activeProfile[0]
+	activeProfile[0] = None
+	if profile is None:
+		return
+	profile.stop()
+	if GIMP_AVAILABLE and isinstance(pdb, PdbCallCounter):
+		pdb = pdb.mPdb
+
+# Adds the time since startTime to a stage of the active profile.
+def addStageTime(stageName, startTime):
+	profile = activeProfile[0]
+	if profile is not None:
+		profile.addStageTime(stageName, time.time() - startTime)
+
+# Adds amount to a counter of the active profile.
+def countProfile(counterName, amount = 1):
+	profile = activeProfile[0]
+	if profile is not None:
+		profile.count(counterName, amount)
+
+# Yields the frames of an iterable, adding the time taken 
+# to produce each frame to a stage of the active profile.
+def iterProfiledFrames(frames, stageName):
+	frameIterator = iter(frames)
+	while True:
+		startTime = time.time()
+		try:
+			frame = next(frameIterator)
+		except StopIteration:
+			return
+		finally:
+			addStageTime(stageName, startTime)
+		yield frame
+
+# Path of a profiling output of a pattern, next to its generated header.
+def getProfilePath(outDir, patternId, extension):
+	return os.path.join(outDir, "Pattern_{0}_Profile{1}".format(patternId, extension))
+
+'''
+Counts the calls made to the procedures of the pdb.
+'''
+class PdbCallCounter:
+	
+	mPdb = None
+	mProfile = None
+	
+	def __init__(self, pdb, profile):
+		self.mPdb = pdb
+		self.mProfile = profile
+	
+	def __getattr__(self, procedureName):
+		procedure = getattr(self.mPdb, procedureName)
+		profile = self.mProfile
+		def countedProcedure(*args):
+			profile.countPdbCall(procedureName)
+			return procedure(*args)
+		return countedProcedure
+
+'''
+Timings and counters collected while generating a pattern.
+'''
+class GenerationProfile:
+	
+	mStartTime = None
+	mTotalSeconds = 0.0
+	# Stage name -> [seconds, calls].
+	mStages = None
+	# Names of the stages in the order they first ran.
+	mStageNames = None
+	mCounters = None
+	mPdbCalls = None
+	# Generated file name -> size in bytes.
+	mOutputBytes = None
+	
+	def __init__(self):
+		self.mStages = {}
+		self.mStageNames = []
+		self.mCounters = {}
+		self.mPdbCalls = {}
+		self.mOutputBytes = {}
+	
+	def start(self):
+		self.mStartTime = time.time()
+	
+	def stop(self):
+		self.mTotalSeconds += time.time() - self.mStartTime
+	
+	def addStageTime(self, stageName, seconds):
+		stage = self.mStages.get(stageName)
+		if stage is None:
+			stage = [0.0, 0]
+			self.mStages[stageName] = stage
+			self.mStageNames.append(stageName)
+		stage[0] += seconds
+		stage[1] += 1
+	
+	def count(self, counterName, amount = 1):
+		self.mCounters[counterName] = self.mCounters.get(counterName, 0) + amount
+	
+	def countPdbCall(self, procedureName):
+		self.mPdbCalls[procedureName] = self.mPdbCalls.get(procedureName, 0) + 1
+	
+	def addOutputFile(self, path):
+		fileBytes = os.path.getsize(path)
+		self.mOutputBytes[os.path.basename(path)] = fileBytes
+		self.count("bytesWritten", fileBytes)
+	
+	def getReport(self, patternId):
+		return {
+			"pattern": patternId,
+			"totalSeconds": round(self.mTotalSeconds, 6),
+			"stages": [{"name": stageName, "seconds": round(self.mStages[stageName][0], 6), 
+				"calls": self.mStages[stageName][1]} for stageName in self.mStageNames],
+			"counters": dict(self.mCounters),
+			"pdbCalls": dict(self.mPdbCalls),
+			"outputBytes": dict(self.mOutputBytes)
+		}
+	
+	# Writes the report next to the generated code. Returns its path.
+	def writeReport(self, outDir, patternId, reportType):
+		report = self.getReport(patternId)
+		if reportType == PROFILE_REPORT_CSV:
+			reportPath = getProfilePath(outDir, patternId, ".csv")
+			reportFile = open(reportPath, "w")
+			reportWriter = csv.writer(reportFile, lineterminator="\n")
+			reportWriter.writerow(("section", "name", "value", "calls"))
+			reportWriter.writerow(("total", "seconds", report["totalSeconds"], ""))
+			for stage in report["stages"]:
+				reportWriter.writerow(("stage", stage["name"], stage["seconds"], stage["calls"]))
+			for section in ("counters", "pdbCalls", "outputBytes"):
+				for name in sorted(report[section]):
+					reportWriter.writerow((section, name, report[section][name], ""))
+		else:
+			reportPath = getProfilePath(outDir, patternId, ".json")
+			reportFile = open(reportPath, "w")
+			reportFile.write(json.dumps(report, indent=2, sort_keys=True) + "\n")
+		reportFile.close()
+		return reportPath
+	
+	# One line summary with the time of the top level stages.
+	def getSummary(self):
+		stageTimes = ["{0} {1:.2f}s".format(stageName, self.mStages[stageName][0]) 
+			for stageName in self.mStageNames if "." not in stageName]
+		return "Profile: {0:.2f}s ({1}).".format(self.mTotalSeconds, ", ".join(stageTimes))
+
+'''
+Collects the text written to it. 
+Used in place of the output file to render frame arrays in worker processes.
+'''
+class TextBuffer:
+	
+	mParts = None
+	
+	def __init__(self):
+		self.mParts = []
+	
+	def write(self, text):
+		self.mParts.append(text)
+	
+	def getText(self):
+		return "".join(self.mParts)
+
+# Code generator used by encodeFrameTask in the current process.
+taskCodeGenerator = [None]
+
+# Sets the code generator that encodes the frames of the current process.
+def setTaskCodeGenerator(codeGenerator):
+	taskCodeGenerator[0] = codeGenerator
+
+# Worker task encoding a (frame, previous frame) pair.
+def encodeFrameTask(framePair):
+	return taskCodeGenerator[0].encodeFrameArray(*framePair)
+
+'''
+Flash footprint of a pattern stored with a frame encoding, 
+measured by the flash budget planner.
+'''
+class EncodingFootprint:
+	
+	def __init__(self, frameEncoding):
+		self.frameEncoding = frameEncoding
+		# Bytes of each frame array, 0 for frames sharing the data of an earlier frame.
+		self.frameBytes = []
+		self.frameHashes = set()
+		# Bytes of the pointer, size and type tables and the palette.
+		self.tableBytes = 0
+		self.largestArray = 0
+		# False when the pattern can't use the encoding (too many colors for a palette).
+		self.available = True
+	
+	def addFrame(self, frameBytes, frameHash):
+		if frameHash in self.frameHashes:
+			self.frameBytes.append(0)
+			return
+		self.frameHashes.add(frameHash)
+		self.frameBytes.append(frameBytes)
+		self.largestArray = max(self.largestArray, frameBytes)
+	
+	# Adds a frame that isn't stored, an in-between frame computed by the player.
+	def addTweenFrame(self):
+		self.frameBytes.append(0)
+	
+	def getTotalBytes(self):
+		return sum(self.frameBytes) + self.tableBytes
+
+'''
+Adafruit Code Generator
+'''
+class AdafruitNeoPixelStripCodeGenerator: 
+	
+	# File to which to write the generated code to. 
+	mOutFile = None
+	mLedPattern = None
+	mOutDir = None
+	# Cache of alpha -> dimmed color lookup tables.
+	mDimTables = None
+	# How the frames are stored. See ENCODING_* options.
+	mFrameEncoding = ENCODING_FULL
+	# How the generated class plays the pattern. See PLAYER_* options.
+	mPlayer = PLAYER_BLOCKING
+	# Color order of the strip, used by native frames.
+	mColorOrder = "GRB"
+	# How the colors of full frames are stored. See COLOR_FORMAT_* options.
+	mColorFormat = COLOR_FORMAT_RGB32
+	# Cache of color -> rounded color lookup tables of the RGB565 formats.
+	mQuantizeTables = None
+	# LedLayout of the frames, dithering uses the position of each LED in the image.
+	mLedLayout = None
+	# Cache of the LED orders of the dithering, see getDitherOrder.
+	mDitherOrders = None
+	# Key in BOARD_PROFILES of the board the pattern must fit in, None to not check it.
+	mBoard = None
+	# Gamma and brightness (percent) applied to the colors along with their alpha.
+	mGamma = GAMMA_NONE
+	mBrightness = BRIGHTNESS_FULL
+	# Path of the generated header, opened once the pattern is planned.
+	mOutFileName = None
+	# Number of frames that reused the data of an identical frame.
+	mDuplicateFrames = 0
+	# Bytes of PROGMEM saved by sharing the duplicate frames.
+	mFlashBytesSaved = 0
+	# Number of frames merged into an identical frame right before them.
+	mMergedFrames = 0
+	# Milliseconds each frame is shown for, None when every frame uses the pattern delay.
+	mFrameDurations = None
+	# Tolerance of the frames replaced by in-between frames, None to store every frame.
+	mTweenTolerance = None
+	# Number of frames replaced by in-between frames.
+	mTweenedFrames = 0
+	# In-between frames played after each frame, None when there are none.
+	mFrameTweens = None
+	# Palette pattern colors as a list of 0xRRGGBB, along with the color -> index map.
+	mPalette = None
+	mPaletteIndices = None
+	# Extra information about the generation shown once it is done.
+	mGenerationNotes = None
+	mWorkers = None
+	mFrameCache = None
+	mWorkerPool = None
+	# FrameProgress told about every frame written, None to not report them.
+	mFrameProgress = None
+	# Paths of the files generated so far.
+	mOutputFiles = None
+	
+	# Each LED color is stored as a uint32_t.
+	BYTES_PER_LED = 4
+	# Encodings measured by the flash budget planner, the first one that is 
+	# the smallest is picked. Native frames are only measured when selected 
+	# as they change the color order and brightness of the strip.
+	PLAN_ENCODINGS = (ENCODING_FULL, ENCODING_DELTA, ENCODING_RLE, ENCODING_PALETTE)
+	ENCODING_NAMES = {ENCODING_FULL: "Full", ENCODING_DELTA: "Delta", ENCODING_RLE: "RLE", 
+		ENCODING_PALETTE: "Palette", ENCODING_NATIVE: "Native"}
+	# Bytes per LED of the full frames of each color format.
+	COLOR_FORMAT_BYTES = {COLOR_FORMAT_RGB32: 4, COLOR_FORMAT_RGB24: 3, COLOR_FORMAT_RGB565: 2, COLOR_FORMAT_RGB565_DITHER: 2}
+	# Bits kept of the red, green and blue of RGB565 colors.
+	RGB565_BITS = (5, 6, 5)
+	# 4x4 Bayer matrix of the ordered dithering thresholds.
+	DITHER_MATRIX = ((0, 8, 2, 10), (12, 4, 14, 6), (3, 11, 1, 9), (15, 7, 13, 5))
+	
+	LIMIT_LINE_LENTH = 10
+	LIMIT_LINE_BREAK = 9
+	
+	def __init__(self, ledPattern, outFileName, outDir, workers = 1, frameCache = None, frameProgress = None):
+		#outFilename = os.path.join(outDir, '{0}_Pattern.h'.format(outFileName))
+		outFilename = os.path.join(outDir, '{0}.h'.format(self.getGeneratedLedPatternClassName(ledPattern[KEY_PATTERN_ID])))
+		self.mOutDir = outDir
+		self.mOutFileName = outFilename
+		self.mOutputFiles = []
+		self.mLedPattern = ledPattern
+		self.mDimTables = {}
+		self.mFrameEncoding = ledPattern.get(KEY_PATTERN_ENCODING, ENCODING_FULL)
+		self.mPlayer = ledPattern.get(KEY_PATTERN_PLAYER, PLAYER_BLOCKING)
+		self.mColorOrder = ledPattern.get(KEY_PATTERN_COLOR_ORDER, "GRB")
+		self.mColorFormat = ledPattern.get(KEY_PATTERN_COLOR_FORMAT, COLOR_FORMAT_RGB32)
+		self.mQuantizeTables = {}
+		self.mLedLayout = ledPattern.get(KEY_PATTERN_LAYOUT)
+		self.mDitherOrders = {}
+		self.mBoard = ledPattern.get(KEY_PATTERN_BOARD)
+		self.mGamma = float(ledPattern.get(KEY_PATTERN_GAMMA, GAMMA_NONE))
+		self.mBrightness = ledPattern.get(KEY_PATTERN_BRIGHTNESS, BRIGHTNESS_FULL)
+		self.mTweenTolerance = ledPattern.get(KEY_PATTERN_TWEEN_TOLERANCE)
+		self.mDuplicateFrames = 0
+		self.mFlashBytesSaved = 0
+		self.mMergedFrames = 0
+		self.mTweenedFrames = 0
+		self.mGenerationNotes = []
+		self.mWorkers = workers
+		self.mFrameCache = frameCache
+		self.mFrameProgress = frameProgress
+		
+		
+		pass
+	
+	# Worker processes only need the encoding settings, not the output file or frames.
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		state["mOutFile"] = None
+		state["mLedPattern"] = None
+		state["mFrameCache"] = None
+		state["mWorkerPool"] = None
+		state["mFrameProgress"] = None
+		state["mDitherOrders"] = {}
+		return state
+		
+	def generate(self):
+		# Check the pattern fits before writing anything.
+		if self.mBoard is not None or self.mFrameEncoding == ENCODING_AUTO:
+			self.planFlashBudget()
+			if self.mFrameProgress is not None:
+				self.mFrameProgress.restart("Generating code...")
+		
+		startTime = time.time()
+		self.mOutFile = open(self.mOutFileName, "w")
+		self.mOutputFiles.append(self.mOutFileName)
+		# Write Header 
+		patternId = self.mLedPattern[KEY_PATTERN_ID]
+		self.generatePluginHeaderInfo(self.mOutFile)
+		self.writeHeaders(patternId, self.mOutFile)
+		
+		# Include delay
+		patternDelay = self.mLedPattern[KEY_PATTERN_DELAY]
+		self.mOutFile.write("\n#define {0} {1}\n".format(self.getDelayDefineId(patternId), int(patternDelay)))
+		
+		# Include total LEDs
+		patternLEDsTotal = self.mLedPattern[KEY_PATTERN_TOTAL_LEDS]
+		self.mOutFile.write("\n#define {0} {1}\n\n".format(self.getTotalLedsDefineId(patternId), int(patternLEDsTotal)))
+		
+		# For each LED Frame Generate constant
+		ledFrames = self.mLedPattern[KEY_PATTERN_FRAMES]
+		addStageTime("write", startTime)
+		
+		# Wrap const declarations in namespace to prevent duplicate conflicts
+		self.writeNamespaceStart(patternId, self.mOutFile)
+		
+		# Palettes are shared by all frames so must be built before writing any frame,
+		# this takes an extra pass over the frames unless the planner already built it.
+		if self.mFrameEncoding == ENCODING_PALETTE:
+			if self.mPalette is None:
+				self.buildPalette(iterProfiledFrames(ledFrames, "extract"))
+			if self.mPalette is not None:
+				self.writePaletteConst(patternId, self.mOutFile)
+		if self.hasColorCorrection():
+			self.mGenerationNotes.append("Colors corrected with gamma {0:g} and {1}% brightness.".format(
+				self.mGamma, self.mBrightness))
+		if self.mTweenTolerance is not None and not self.canTween():
+			self.mGenerationNotes.append("In-between frames only apply to Full Frames, every frame stored.")
+		if self.mColorFormat != COLOR_FORMAT_RGB32 and not self.hasOnlyFullFrames():
+			self.mGenerationNotes.append("Color format only applies to Full Frames, colors stored as 32-bit.")
+		
+		# TODO Handle LED Layout Type
+		frameOffsets = []
+		currOffset = 0
+		# Frames with identical content are only written once, 
+		# the pattern array points every copy at the first one.
+		uniqueFrameIds = {}
+		frameDataIds = []
+		frameTypes = []
+		frameSizes = []
+		frameDurations = []
+		frameTweens = []
+		# Frames are streamed from extraction to the output file a window 
+		# at a time, only the IDs, sizes and types of the frames are kept. 
+		# Frames are encoded independently (delta frames get the previous 
+		# frame along) so a window can be spread over worker processes.
+		self.mWorkerPool = WorkerPool(self.mWorkers, setTaskCodeGenerator, (self,))
+		try:
+			previousFrame = None
+			for windowFrames in iterWindows(self.iterPatternFrames(), self.mWorkerPool.getWindowSize()):
+				framePairs = []
+				for frame in windowFrames:
+					framePairs.append((frame, previousFrame if self.mFrameEncoding == ENCODING_DELTA else None))
+					previousFrame = frame
+				startTime = time.time()
+				encodedFrames = self.encodeFrames(framePairs)
+				addStageTime("encode", startTime)
+				
+				for frame, encodedFrame in zip(windowFrames, encodedFrames):
+					startTime = time.time()
+					countProfile("frames")
+					countProfile("pixels", frame.width * frame.height)
+					countProfile("leds", frame.getTotalLeds())
+					if self.mFrameProgress is not None:
+						self.mFrameProgress.frameDone()
+					frameOffsets.append(currOffset)
+					# Move offset forward by the amount of pixels/LEDs in this layer.
+					# TODO Properly calculate offset, possibly using layer offset. 
+					currOffset = frame.width * frame.height + currOffset
+					
+					frameType, frameSize, frameBytes, frameHash, frameText = encodedFrame
+					frameTypes.append(frameType)
+					frameSizes.append(frameSize)
+					frameDurations.append(self.getFrameDuration(frame))
+					frameTweens.append(frame.tweens)
+					
+					sharedFrameId = uniqueFrameIds.get(frameHash)
+					if sharedFrameId is not None:
+						frameDataIds.append(sharedFrameId)
+						self.mDuplicateFrames += 1
+						self.mFlashBytesSaved += frameBytes
+						addStageTime("write", startTime)
+						continue
+					
+					# Write Frame const start
+					frameId = frame.frameId
+					uniqueFrameIds[frameHash] = frameId
+					frameDataIds.append(frameId)
+					self.writeFrameConst(frameId, self.mOutFile, self.getFrameDataType())
+					self.mOutFile.write(frameText)
+					
+					# Write Frame const end 
+					self.mOutFile.write("	};\n")
+					countProfile("uniqueFrames")
+					addStageTime("write", startTime)
+					
+					pass
+		finally:
+			self.mWorkerPool.close()
+			
+		startTime = time.time()
+		# Generate LED Pattern constant.
+		self.writePatternConst(patternId, self.mOutFile, self.getFrameDataType())
+		for frameDataId in frameDataIds:
+			self.mOutFile.write("	{0},\n".format(frameDataId))
+		pass
+		self.mOutFile.write("	};\n")
+		
+		# Generate LED Pattern Size 
+		self.writePatternFrameSizeConst(patternId, self.mOutFile)
+		for frameSize in frameSizes:
+			self.mOutFile.write("	{0},\n".format(frameSize))
+		pass
+		self.mOutFile.write("	};\n")
+		
+		# Generate the type of each frame for encoded patterns.
+		if self.hasFrameTypes():
+			self.writePatternFrameTypeConst(patternId, self.mOutFile)
+			for frameType in frameTypes:
+				self.mOutFile.write("	{0},\n".format(frameType))
+			self.mOutFile.write("	};\n")
+		
+		# Generate the duration of each frame when they don't all use the pattern delay.
+		if self.hasFrameDurations(frameDurations):
+			self.mFrameDurations = frameDurations
+			self.writePatternFrameDurationConst(patternId, self.mOutFile)
+			for frameDuration in frameDurations:
+				self.mOutFile.write("	{0},\n".format(frameDuration))
+			self.mOutFile.write("	};\n")
+				
+		# Generate the number of in-between frames played after each frame.
+		if any(frameTweens):
+			self.mFrameTweens = frameTweens
+			self.writePatternFrameTweenConst(patternId, self.mOutFile)
+			for tweens in frameTweens:
+				self.mOutFile.write("	{0},\n".format(tweens))
+			self.mOutFile.write("	};\n")
+
+		# End namespace declarations
+		self.writeNamespaceEnd(patternId, self.mOutFile)
+		
+		# Write the function that will be exposed 
+		# to the main Arduino sketch to run the led pattern.
+		#self.writePlayFunction(patternId, self.mOutFile)
+		self.writePatternClass(patternId, self.mOutFile)
+		
+		# Write Footer
+		self.writeFooters(patternId, self.mOutFile)
+		
+		self.mOutFile.write("\n")
+		
+		self.mOutFile.close()
+		
+		# Write Base Pattern class 
+		self.writeBaseLedPatternClass()
+		
+		# Generate ReadMe file with simple instructions on how to include in existing script.
+		# TODO Pass led pin and led count here. 
+		self.generateReadMe(patternId, 7, patternLEDsTotal)
+		addStageTime("write", startTime)
+		pass
+	
+	# Paths of the files generated so far.
+	def getOutputFiles(self):
+		return list(self.mOutputFiles)
+
+	# Returns the lines summarizing the generation, shown once it is done.
+	def getGenerationSummary(self):
+		summary = list(self.mGenerationNotes)
+		if self.mMergedFrames > 0:
+			summary.append("{0} identical consecutive frames merged into a longer frame.".format(self.mMergedFrames))
+		if self.mTweenedFrames > 0:
+			summary.append("{0} frames of linear fades replaced by in-between frames computed by the player.".format(
+				self.mTweenedFrames))
+		if self.mDuplicateFrames > 0:
+			summary.append("{0} duplicate frames shared, {1} bytes of flash saved.".format(
+				self.mDuplicateFrames, self.mFlashBytesSaved))
+		return summary
+	
+	# Yields the frames of the pattern as they are stored: identical
+	# consecutive frames merged and, when enabled, linear fades
+	# replaced by in-between frames.
+	def iterPatternFrames(self):
+		ledFrames = self.iterMergedFrames()
+		if self.canTween():
+			ledFrames = self.iterTweenedFrames(ledFrames)
+		return ledFrames
+
+	# Yields the frames of the pattern, with every run of pixel-identical 
+	# consecutive frames merged into its first frame shown for the 
+	# duration of the whole run. Merged frames are counted as done.
+	def iterMergedFrames(self):
+		self.mMergedFrames = 0
+		runFrame = None
+		runDuration = 0
+		for frame in iterProfiledFrames(self.mLedPattern[KEY_PATTERN_FRAMES], "extract"):
+			if (runFrame is not None and frame.pixels == runFrame.pixels 
+				and frame.width == runFrame.width and frame.height == runFrame.height):
+				runDuration += self.getFrameDuration(frame)
+				self.mMergedFrames += 1
+				countProfile("mergedFrames")
+				if self.mFrameProgress is not None:
+					self.mFrameProgress.frameDone()
+				continue
+			if runFrame is not None:
+				yield self.getMergedFrame(runFrame, runDuration)
+			runFrame = frame
+			runDuration = self.getFrameDuration(frame)
+		if runFrame is not None:
+			yield self.getMergedFrame(runFrame, runDuration)
+	
+	# Returns the frame shown for the given duration.
+	def getMergedFrame(self, frame, duration):
+		if duration == self.getFrameDuration(frame):
+			return frame
+		return LedFrame(frame.frameId, frame.width, frame.height, frame.pixels, duration)
+	
+	# Yields the frames left once the frames of linear fades are replaced by
+	# in-between frames. A fade runs from a key frame to an end frame
+	# and every frame in between must be within mTweenTolerance of the
+	# color the player interpolates for it, and shown for as long as
+	# the key frame. Frames are checked as they stream in: every color
+	# channel keeps the range of fade slopes (change per step) allowed
+	# by the frames in between, so no frame needs to be kept in memory.
+	def iterTweenedFrames(self, ledFrames):
+		self.mTweenedFrames = 0
+		# The player rounds the interpolated colors, which can add up to half a step.
+		margin = self.mTweenTolerance - 0.5
+		keyFrame, keyColors = None, None
+		endFrame, endColors = None, None
+		steps = 0
+		slopeLows, slopeHighs = None, None
+		for frame in ledFrames:
+			frameColors = self.getPlayerRgb(frame)
+			if keyFrame is None:
+				keyFrame, keyColors = frame, frameColors
+				continue
+			if endFrame is not None:
+				# Check if the end frame can be a frame in between and this frame the end of the fade.
+				fadeSlopes = None
+				if (steps < TWEEN_MAX_STEPS and len(frameColors) == len(keyColors)
+					and self.getFrameDuration(endFrame) == self.getFrameDuration(keyFrame)):
+					fadeSlopes = self.getTweenSlopes(keyColors, endColors, steps, margin, slopeLows, slopeHighs)
+				if fadeSlopes is not None and all(low <= (color - keyColor) / float(steps + 1) <= high
+					for color, keyColor, low, high in zip(frameColors, keyColors, fadeSlopes[0], fadeSlopes[1])):
+					slopeLows, slopeHighs = fadeSlopes
+					endFrame, endColors = frame, frameColors
+					steps += 1
+					self.mTweenedFrames += 1
+					countProfile("tweenedFrames")
+					if self.mFrameProgress is not None:
+						self.mFrameProgress.frameDone()
+					continue
+				# The fade ends at the end frame, which is the key frame of the next one.
+				yield self.getTweenKeyFrame(keyFrame, steps - 1)
+				keyFrame, keyColors = endFrame, endColors
+			if len(frameColors) == len(keyColors):
+				endFrame, endColors = frame, frameColors
+				steps = 1
+				slopeLows, slopeHighs = [float("-inf")] * len(keyColors), [float("inf")] * len(keyColors)
+			else:
+				yield keyFrame
+				keyFrame, keyColors = frame, frameColors
+				endFrame, endColors = None, None
+		if keyFrame is not None:
+			if endFrame is None:
+				yield keyFrame
+			else:
+				yield self.getTweenKeyFrame(keyFrame, steps - 1)
+				yield endFrame
+
+	# Narrows the range of fade slopes of every color channel to the ones
+	# keeping the frame at the given step within the margin of its colors.
+	# Returns the (lows, highs) of the new ranges, None when a range is empty.
+	def getTweenSlopes(self, keyColors, frameColors, step, margin, slopeLows, slopeHighs):
+		step = float(step)
+		lows, highs = [], []
+		for color, keyColor, low, high in zip(frameColors, keyColors, slopeLows, slopeHighs):
+			low = max(low, (color - keyColor - margin) / step)
+			high = min(high, (color - keyColor + margin) / step)
+			if low > high:
+				return None
+			lows.append(low)
+			highs.append(high)
+		return lows, highs
+
+	# Returns the key frame followed by the given number of in-between frames.
+	def getTweenKeyFrame(self, frame, tweens):
+		if tweens == 0:
+			return frame
+		return LedFrame(frame.frameId, frame.width, frame.height, frame.pixels, frame.duration, tweens)
+
+	# Returns True if frames can be replaced by in-between frames,
+	# only full frames can be read by the player as it interpolates.
+	def canTween(self):
+		return self.mTweenTolerance is not None and self.mFrameEncoding == ENCODING_FULL
+
+	# Returns the colors of a frame as packed 0xRRGGBB bytes the way
+	# the player reads them, once stored with the color format.
+	def getPlayerRgb(self, frame):
+		frameRgb = self.getFrameRgb(frame)
+		if self.getColorFormat() not in (COLOR_FORMAT_RGB565, COLOR_FORMAT_RGB565_DITHER):
+			return frameRgb
+		playerRgb = self.quantizeRgb565(frameRgb, frame)
+		for channel, channelBits in enumerate(self.RGB565_BITS):
+			# The player repeats the top bits in the low bits.
+			expandTable = bytes(bytearray(color | (color >> channelBits) for color in range(0, 256)))
+			playerRgb[channel::3] = playerRgb[channel::3].translate(expandTable)
+		return playerRgb
+
+	# Milliseconds a frame is shown for.
+	def getFrameDuration(self, frame):
+		duration = frame.duration
+		if duration is None:
+			duration = int(self.mLedPattern[KEY_PATTERN_DELAY])
+		if duration < 0:
+			raise ValueError("Frame {0} has a negative duration ({1}ms).".format(frame.frameId, duration))
+		return duration
+	
+	# Returns True if the frames need a duration table, 
+	# False when they are all shown for the pattern delay.
+	def hasFrameDurations(self, frameDurations):
+		patternDelay = int(self.mLedPattern[KEY_PATTERN_DELAY])
+		return any(frameDuration != patternDelay for frameDuration in frameDurations)
+	
+	# Type of the entries of the duration table.
+	def getFrameDurationType(self, frameDurations):
+		if max(frameDurations) > 0xFFFF:
+			return "uint32_t"
+		return "uint16_t"
+	
+	# Bytes of PROGMEM used by the in-between frame table.
+	def getFrameTweenBytes(self, frameTweens):
+		if not any(frameTweens):
+			return 0
+		return len(frameTweens)
+	
+	# Bytes of PROGMEM used by the duration table of the frames.
+	def getFrameDurationBytes(self, frameDurations):
+		if not self.hasFrameDurations(frameDurations):
+			return 0
+		if self.getFrameDurationType(frameDurations) == "uint32_t":
+			return len(frameDurations) * 4
+		return len(frameDurations) * 2
+	
+	# Flash budget planner. Measures the frame data and tables of the pattern 
+	# with every encoding in a pass over the frames, before anything is written. 
+	# ENCODING_AUTO picks the smallest encoding that fits the board. 
+	# Writes the bytes of each frame to Pattern_<NAME>_Budget.csv and raises 
+	# a ValueError when the pattern doesn't fit.
+	def planFlashBudget(self):
+		patternId = self.mLedPattern[KEY_PATTERN_ID]
+		board = None
+		if self.mBoard is not None:
+			board = BOARD_PROFILES[self.mBoard]
+		
+		planEncodings = list(self.PLAN_ENCODINGS)
+		if self.mFrameEncoding not in planEncodings and self.mFrameEncoding != ENCODING_AUTO:
+			planEncodings.append(self.mFrameEncoding)
+		# In-between frames only apply to full frames, other encodings store every frame.
+		tweenFull = self.mTweenTolerance is not None and self.mFrameEncoding in (ENCODING_FULL, ENCODING_AUTO)
+		if tweenFull and self.mFrameEncoding == ENCODING_FULL:
+			planEncodings = [ENCODING_FULL]
+		footprints = dict((frameEncoding, EncodingFootprint(frameEncoding)) for frameEncoding in planEncodings)
+		variants = dict((frameEncoding, self.getEncodingVariant(frameEncoding)) 
+			for frameEncoding in planEncodings if frameEncoding != ENCODING_PALETTE)
+		
+		if self.mFrameProgress is not None:
+			self.mFrameProgress.restart("Planning flash budget...")
+		frameIds = []
+		frameDurations = []
+		frameTweens = []
+		patternColors = set()
+		paletteFrames = []
+		previousFrame = None
+		ledFrames = self.iterMergedFrames()
+		if tweenFull:
+			# Full frames are measured as they are stored, with their fades replaced by 
+			# in-between frames. The tweened frames are read from a copy of the frames, 
+			# which stays at most a fade behind.
+			tweenVariant = variants.pop(ENCODING_FULL)
+			# Variants don't keep the pattern, the frame durations need its delay.
+			tweenVariant.mLedPattern = self.mLedPattern
+			ledFrames, tweenInput = itertools.tee(ledFrames)
+			tweenFrames = tweenVariant.iterTweenedFrames(tweenInput)
+			tweenFootprint = footprints[ENCODING_FULL]
+			tweenDurations = []
+			tweenCounts = []
+		for frame in ledFrames:
+			startTime = time.time()
+			frameIds.append(frame.frameId)
+			frameDurations.append(self.getFrameDuration(frame))
+			frameTweens.append(frame.tweens)
+			for frameEncoding, variant in variants.items():
+				frameType, frameData = variant.encodeFrameData(frame, 
+					previousFrame if frameEncoding == ENCODING_DELTA else None)
+				footprints[frameEncoding].addFrame(variant.getFrameDataBytes(frameType, frameData), 
+					variant.getFrameDataHash(frameType, frameData))
+			while tweenFull and len(tweenFootprint.frameBytes) < len(frameIds):
+				tweenFrame = next(tweenFrames)
+				tweenDurations.append(self.getFrameDuration(tweenFrame))
+				tweenCounts.append(tweenFrame.tweens)
+				frameType, frameData = tweenVariant.encodeFrameData(tweenFrame, None)
+				tweenFootprint.addFrame(tweenVariant.getFrameDataBytes(frameType, frameData), 
+					tweenVariant.getFrameDataHash(frameType, frameData))
+				for tween in range(0, tweenFrame.tweens):
+					tweenFootprint.addTweenFrame()
+			# Palette frames only depend on the colors, the palette is known once every frame is read.
+			frameRgb = self.getFrameRgb(frame)
+			if patternColors is not None:
+				patternColors.update(unpackRgbColors(frameRgb))
+				if len(patternColors) > PALETTE_8_MAX_COLORS:
+					patternColors = None
+			paletteFrames.append((len(frameRgb) // 3, hashlib.sha1(bytes(frameRgb)).digest()))
+			previousFrame = frame
+			addStageTime("plan", startTime)
+			if self.mFrameProgress is not None:
+				self.mFrameProgress.frameDone()
+		
+		paletteFootprint = footprints.get(ENCODING_PALETTE)
+		if paletteFootprint is not None and patternColors is None:
+			paletteFootprint.available = False
+		elif paletteFootprint is not None:
+			for frameLeds, frameHash in paletteFrames:
+				frameBytes = frameLeds
+				if len(patternColors) <= PALETTE_4_MAX_COLORS:
+					frameBytes = (frameLeds + 1) // 2
+				paletteFootprint.addFrame(max(1, frameBytes), frameHash)
+			paletteFootprint.tableBytes += len(patternColors) * self.BYTES_PER_LED
+		
+		# Pointer, size, duration and in-between frames of every frame, plus their type for encodings mixing frame types.
+		pointerBytes = 2
+		if board is not None:
+			pointerBytes = board["pointer"]
+		for footprint in footprints.values():
+			storedDurations, storedTweens = frameDurations, frameTweens
+			if tweenFull and footprint is tweenFootprint:
+				storedDurations, storedTweens = tweenDurations, tweenCounts
+			footprint.tableBytes += (len(storedDurations) * (pointerBytes + 4) + self.getFrameDurationBytes(storedDurations)
+				+ self.getFrameTweenBytes(storedTweens))
+			if footprint.frameEncoding in (ENCODING_DELTA, ENCODING_RLE):
+				footprint.tableBytes += len(frameIds)
+		
+		planned = [footprints[frameEncoding] for frameEncoding in planEncodings if footprints[frameEncoding].available]
+		fitting = [footprint for footprint in planned if self.fitsBoard(footprint, board)]
+		smallest = min(planned, key = lambda footprint: footprint.getTotalBytes())
+		encodingName = "any encoding"
+		if self.mFrameEncoding == ENCODING_AUTO:
+			chosen = None
+			if len(fitting) > 0:
+				chosen = min(fitting, key = lambda footprint: footprint.getTotalBytes())
+		else:
+			chosen = footprints[self.mFrameEncoding]
+			if not chosen.available:
+				# Patterns with too many colors for a palette are stored as full frames.
+				chosen = footprints[ENCODING_FULL]
+			encodingName = self.ENCODING_NAMES[chosen.frameEncoding] + " frames"
+			if chosen not in fitting:
+				chosen = None
+		
+		budgetPath = self.writeBudgetReport(patternId, frameIds, [footprints[frameEncoding] for frameEncoding in planEncodings], board)
+		if chosen is None:
+			raise ValueError("Pattern {0} doesn't fit in the flash of the {1} with {2}: {3} bytes available, "
+				"the smallest encoding ({4}) needs {5} bytes. See {6} for the bytes of each frame.".format(
+				patternId, board["name"], encodingName, self.getBoardFlashBytes(board), 
+				self.ENCODING_NAMES[smallest.frameEncoding], smallest.getTotalBytes(), os.path.basename(budgetPath)))
+		
+		totalLeds = self.mLedPattern[KEY_PATTERN_TOTAL_LEDS]
+		if board is not None and totalLeds * 3 > board["ram"] - board["ramReserved"]:
+			raise ValueError("Pattern {0} needs {1} bytes of RAM for its {2} LEDs, the {3} has {4} bytes left for them.".format(
+				patternId, totalLeds * 3, totalLeds, board["name"], board["ram"] - board["ramReserved"]))
+		
+		if self.mFrameEncoding == ENCODING_AUTO:
+			self.mFrameEncoding = chosen.frameEncoding
+		# The palette is already known, no need for another pass to build it.
+		if self.mFrameEncoding == ENCODING_PALETTE and patternColors is not None:
+			self.setPalette(patternColors)
+		planText = ", ".join("{0} {1}".format(self.ENCODING_NAMES[footprint.frameEncoding], footprint.getTotalBytes()) 
+			for footprint in planned)
+		boardText = ""
+		if board is not None:
+			boardText = " of {0} available on the {1}".format(self.getBoardFlashBytes(board), board["name"])
+		self.mGenerationNotes.append("Flash plan: {0} bytes{1}, {2} frames used.".format(
+			planText, boardText, self.ENCODING_NAMES[self.mFrameEncoding]))
+	
+	# Returns a copy of this generator storing the frames with another 
+	# encoding, used by the planner to measure the frames.
+	def getEncodingVariant(self, frameEncoding):
+		variant = copy.copy(self)
+		variant.mFrameEncoding = frameEncoding
+		variant.mPalette = None
+		variant.mPaletteIndices = None
+		return variant
+	
+	# Flash a pattern can use on a board.
+	def getBoardFlashBytes(self, board):
+		return board["flash"] - board["code"]
+	
+	# Returns True if a pattern footprint fits the board, always True without a board.
+	def fitsBoard(self, footprint, board):
+		if board is None:
+			return True
+		if board["maxArray"] is not None and footprint.largestArray > board["maxArray"]:
+			return False
+		return footprint.getTotalBytes() <= self.getBoardFlashBytes(board)
+	
+	# Writes the bytes of each frame with every planned encoding as CSV 
+	# next to the generated code. Returns the path of the report.
+	def writeBudgetReport(self, patternId, frameIds, footprints, board):
+		outFilename = os.path.join(self.mOutDir, '{0}_Budget.csv'.format(self.getGeneratedLedPatternClassName(patternId)))
+		self.mOutputFiles.append(outFilename)
+		budgetFile = open(outFilename, "w")
+		budgetWriter = csv.writer(budgetFile, lineterminator="\n")
+		budgetWriter.writerow(["frame"] + [self.ENCODING_NAMES[footprint.frameEncoding] for footprint in footprints])
+		for framePos, frameId in enumerate(frameIds):
+			budgetWriter.writerow([frameId] + [footprint.frameBytes[framePos] if footprint.available else "" 
+				for footprint in footprints])
+		budgetWriter.writerow(["tables"] + [footprint.tableBytes if footprint.available else "" for footprint in footprints])
+		budgetWriter.writerow(["total"] + [footprint.getTotalBytes() if footprint.available else "" for footprint in footprints])
+		if board is not None:
+			budgetWriter.writerow(["available"] + [self.getBoardFlashBytes(board) if footprint.available else "" 
+				for footprint in footprints])
+		budgetFile.close()
+		return outFilename
+	
+	# Returns True if the generated code lists the FrameType of each frame.
+	# Palette patterns use the same type for all frames.
+	def hasFrameTypes(self):
+		return self.mFrameEncoding in (ENCODING_DELTA, ENCODING_RLE)
+	
+	# Returns True if every frame of the pattern is stored in full, 
+	# the only frames written using the color format.
+	def hasOnlyFullFrames(self):
+		return (not self.hasFrameTypes() and self.mPalette is None 
+			and self.mFrameEncoding != ENCODING_NATIVE)
+	
+	# Color format of the full frames of the pattern.
+	def getColorFormat(self):
+		if self.hasOnlyFullFrames():
+			return self.mColorFormat
+		return COLOR_FORMAT_RGB32
+	
+	# Type of the entries in the frame arrays. 
+	def getFrameDataType(self):
+		if self.getColorFormat() == COLOR_FORMAT_RGB24:
+			return "uint8_t"
+		if self.getColorFormat() in (COLOR_FORMAT_RGB565, COLOR_FORMAT_RGB565_DITHER):
+			return "uint16_t"
+		if self.mFrameEncoding == ENCODING_PALETTE and self.mPalette is not None:
+			return "uint8_t"
+		if self.mFrameEncoding == ENCODING_NATIVE:
+			return "uint8_t"
+		return "uint32_t"
+	
+	# Dims a color by a given ratio. Because we are creating LED 
+	# patterns and those don't have opacity, we'll just update the 
+	# color by the opacity ratio	
+	def dimColorByRatio(self, color, ratio):
+		outColor = int(color * ratio)
+		return outColor
+	
+	# Returns True if the colors are gamma corrected or dimmed by the brightness.
+	def hasColorCorrection(self):
+		return self.mGamma != GAMMA_NONE or self.mBrightness != BRIGHTNESS_FULL
+	
+	# Applies the gamma and brightness to a color value (0-255), 
+	# rounding it only once both are applied.
+	def correctColor(self, color):
+		correctedColor = 255.0 * (color / 255.0) ** self.mGamma * self.mBrightness / 100.0
+		return min(255, int(correctedColor + 0.5))
+	
+	# Returns a 256 entry lookup table with every color value 
+	# dimmed by the given alpha (0-255) and color corrected. 
+	# Tables are cached per alpha, so the alpha, gamma and brightness 
+	# of a color channel are all applied with a single translate.
+	def getDimTable(self, alpha):
+		dimTable = self.mDimTables.get(alpha)
+		if dimTable is None:
+			colorRatio = (alpha/255.0)
+			if self.hasColorCorrection():
+				# Dimmed before rounding, dark colors keep their precision.
+				dimTable = bytes(bytearray(self.correctColor(color * colorRatio) for color in range(0, 256)))
+			else:
+				dimTable = bytes(bytearray(self.dimColorByRatio(color, colorRatio) for color in range(0, 256)))
+			self.mDimTables[alpha] = dimTable
+		return dimTable
+	
+	# Returns the colors of a frame as packed 0xRRGGBB bytes (3 per LED)
+	# with every color already dimmed by its alpha. 
+	# Frames where all pixels share the same alpha (the common case) are 
+	# converted with a single table translate per channel.
+	def getFrameRgb(self, frame):
+		pixels = frame.pixels
+		alphas = pixels[3::PIXEL_BYTES]
+		totalLeds = len(alphas)
+		frameRgb = bytearray(totalLeds * 3)
+		if totalLeds == 0:
+			return frameRgb
+		
+		if alphas.count(alphas[0:1]) == totalLeds:
+			dimTable = self.getDimTable(alphas[0])
+			for channel in range(0, 3):
+				frameRgb[channel::3] = pixels[channel::PIXEL_BYTES].translate(dimTable)
+		else:
+			dimTables = [None] * 256
+			for alpha in set(alphas):
+				dimTables[alpha] = bytearray(self.getDimTable(alpha))
+			for channel in range(0, 3):
+				frameRgb[channel::3] = bytearray(dimTables[alpha][color] 
+					for color, alpha in zip(pixels[channel::PIXEL_BYTES], alphas))
+		return frameRgb
+	
+	# Encodes the colors of a frame using the selected frame encoding.
+	# Returns the type of the frame along with the data to store for it. 
+	# Full frames keep the packed 0xRRGGBB bytes, other types a list of 
+	# uint32_t entries. The smallest allowed type is picked per frame.
+	def encodeFrame(self, frameColors, previousColors):
+		frameType = FRAME_TYPE_FULL
+		frameData = frameColors
+		frameEntries = len(frameColors) // 3
+		
+		if (self.mFrameEncoding == ENCODING_DELTA and previousColors is not None 
+			and len(previousColors) == len(frameColors)):
+			deltaEntries = self.getDeltaEntries(frameColors, previousColors)
+			# Only keep the delta if it takes fewer entries than the full frame.
+			if len(deltaEntries) < frameEntries:
+				frameType, frameData, frameEntries = FRAME_TYPE_DELTA, deltaEntries, len(deltaEntries)
+		
+		if self.mFrameEncoding == ENCODING_PALETTE and self.mPalette is not None:
+			return self.getPaletteFrameType(), self.getPaletteIndices(frameColors)
+		
+		if self.mFrameEncoding == ENCODING_NATIVE:
+			return FRAME_TYPE_NATIVE, self.getNativeBytes(frameColors)
+		
+		if self.mFrameEncoding == ENCODING_RLE:
+			# Estimate the size before building the runs.
+			if self.getRleEntryCount(frameColors) < frameEntries:
+				rleEntries = self.getRleEntries(frameColors)
+				frameType, frameData, frameEntries = FRAME_TYPE_RLE, rleEntries, len(rleEntries)
+		
+		return frameType, frameData
+	
+	# Encodes every (frame, previous frame) pair using the worker processes. 
+	# Frames found in the frame cache are not encoded again.
+	def encodeFrames(self, framePairs):
+		if self.mFrameCache is None:
+			return self.mWorkerPool.map(encodeFrameTask, framePairs)
+		
+		frameKeys = [self.getFrameCacheKey(frame, previousFrame) for frame, previousFrame in framePairs]
+		encodedFrames = [None] * len(framePairs)
+		missedPositions = []
+		for framePos in range(0, len(framePairs)):
+			cachedFrame = self.mFrameCache.get(frameKeys[framePos])
+			if cachedFrame is None:
+				missedPositions.append(framePos)
+				continue
+			frameType, frameSize, frameBytes, frameHash, frameText = json.loads(cachedFrame.decode("utf-8"))
+			encodedFrames[framePos] = (frameType, frameSize, frameBytes, binascii.unhexlify(frameHash), frameText)
+		
+		missedFrames = self.mWorkerPool.map(encodeFrameTask, [framePairs[framePos] for framePos in missedPositions])
+		for framePos, encodedFrame in zip(missedPositions, missedFrames):
+			frameType, frameSize, frameBytes, frameHash, frameText = encodedFrame
+			cachedFrame = json.dumps([frameType, frameSize, frameBytes, binascii.hexlify(frameHash).decode("ascii"), frameText])
+			self.mFrameCache.put(frameKeys[framePos], cachedFrame.encode("utf-8"))
+			encodedFrames[framePos] = encodedFrame
+		return encodedFrames
+	
+	# Key of an encoded frame in the frame cache. Covers the pixels of 
+	# the frame (and of the previous frame for delta frames) and 
+	# every generator setting that changes the encoded frame.
+	def getFrameCacheKey(self, frame, previousFrame):
+		previousPixels = b""
+		if previousFrame is not None:
+			previousPixels = previousFrame.pixels
+		# Dithering also depends on where the pixel of each LED is.
+		ditherLayout = None
+		if self.getColorFormat() == COLOR_FORMAT_RGB565_DITHER and self.mLedLayout is not None:
+			ditherLayout = self.mLedLayout.getKey()
+		return self.mFrameCache.getKey("encoded", self.__class__.__name__, self.mFrameEncoding, 
+			self.mPalette, self.mColorOrder, self.getColorFormat(), self.mGamma, self.mBrightness, 
+			self.LIMIT_LINE_LENTH, frame.width, frame.height, frame.pixels, previousPixels, ditherLayout)
+	
+	# Encodes a frame and renders the body of its array. 
+	# Returns (frame type, frame size, bytes of PROGMEM, hash, array text).
+	def encodeFrameArray(self, frame, previousFrame):
+		frameType, frameData = self.encodeFrameData(frame, previousFrame)
+		colorFormat = self.getColorFormat()
+		
+		frameText = TextBuffer()
+		if frameType == FRAME_TYPE_FULL and colorFormat == COLOR_FORMAT_RGB24:
+			self.writeLedBytes(frameData, frameText)
+		elif frameType == FRAME_TYPE_FULL and colorFormat != COLOR_FORMAT_RGB32:
+			self.writeRgb565Colors(frameData, frameText)
+		elif frameType == FRAME_TYPE_FULL:
+			self.writeFrameColors(frameData, frameText)
+		elif frameType == FRAME_TYPE_DELTA:
+			self.writeDeltaEntries(frameData, frameText)
+		elif frameType == FRAME_TYPE_RLE:
+			self.writeRleEntries(frameData, frameText)
+		elif frameType == FRAME_TYPE_NATIVE:
+			self.writeLedBytes(frameData, frameText)
+		else:
+			self.writePaletteIndices(frameType, frameData, frameText)
+		
+		return (frameType, self.getFrameEntryCount(frameType, frameData), 
+			self.getFrameDataBytes(frameType, frameData), 
+			self.getFrameDataHash(frameType, frameData), frameText.getText())
+	
+	# Encodes a frame, returns its (frame type, frame data) as they are written.
+	def encodeFrameData(self, frame, previousFrame):
+		# LEDs don't have alpha so we just reduce the color by the alpha ratio.
+		frameColors = self.getFrameRgb(frame)
+		previousColors = None
+		if previousFrame is not None:
+			previousColors = self.getFrameRgb(previousFrame)
+		frameType, frameData = self.encodeFrame(frameColors, previousColors)
+		if self.getColorFormat() in (COLOR_FORMAT_RGB565, COLOR_FORMAT_RGB565_DITHER):
+			frameData = self.quantizeRgb565(frameData, frame)
+		return frameType, frameData
+	
+	# Returns the length of every run of LEDs that share the same color.
+	def getRunLengths(self, frameColors):
+		return [len(list(run)) for color, run in itertools.groupby(unpackRgbColors(frameColors))]
+	
+	# Number of entries needed to store a frame with run-length encoding. 
+	# Runs longer than RLE_MAX_RUN_LENGTH are split over several entries.
+	def getRleEntryCount(self, frameColors):
+		rleEntries = 0
+		for runLength in self.getRunLengths(frameColors):
+			rleEntries += (runLength + RLE_MAX_RUN_LENGTH - 1) // RLE_MAX_RUN_LENGTH
+		return rleEntries
+	
+	# Returns the run-length encoded entries of a frame, each one 
+	# being (run length << 24) | 0xRRGGBB.
+	def getRleEntries(self, frameColors):
+		rleEntries = []
+		for color, run in itertools.groupby(unpackRgbColors(frameColors)):
+			runLength = len(list(run))
+			while runLength > 0:
+				entryLength = min(runLength, RLE_MAX_RUN_LENGTH)
+				rleEntries.append((entryLength << 24) | color)
+				runLength -= entryLength
+		return rleEntries
+	
+	# Returns the LED index, color pairs of the LEDs whose color 
+	# changed between two frames of the same size. 
+	def getDeltaEntries(self, frameColors, previousColors):
+		deltaEntries = []
+		if frameColors == previousColors:
+			return deltaEntries
+		currentLeds = unpackRgbColors(frameColors)
+		previousLeds = unpackRgbColors(previousColors)
+		for ledPos in range(0, len(currentLeds)):
+			if currentLeds[ledPos] != previousLeds[ledPos]:
+				deltaEntries.append(ledPos)
+				deltaEntries.append(currentLeds[ledPos])
+		return deltaEntries
+	
+	# Builds the color palette shared by all frames.
+	# Colors keep the order of the image colormap for INDEXED images, 
+	# other colors are added after in increasing 0xRRGGBB order. 
+	# The palette is left as None when the pattern has too many colors.
+	def buildPalette(self, ledFrames):
+		self.mPalette = None
+		self.mPaletteIndices = None
+		patternColors = set()
+		for frame in ledFrames:
+			startTime = time.time()
+			patternColors.update(unpackRgbColors(self.getFrameRgb(frame)))
+			addStageTime("palette", startTime)
+			if len(patternColors) > PALETTE_8_MAX_COLORS:
+				self.mGenerationNotes.append("Too many colors for a palette, frames stored in full.")
+				return
+		self.setPalette(patternColors)
+	
+	# Sets the palette of the pattern from the set of its 0xRRGGBB colors.
+	def setPalette(self, patternColors):
+		palette = []
+		colormap = self.mLedPattern.get(KEY_PATTERN_COLORMAP) or []
+		if self.hasColorCorrection():
+			# Colormap colors are opaque, corrected the same as the frames.
+			colorTable = bytearray(self.getDimTable(255))
+			colormap = [(colorTable[color >> 16] << 16) | (colorTable[(color >> 8) & 0xFF] << 8) | colorTable[color & 0xFF] 
+				for color in colormap]
+		for color in colormap:
+			if color in patternColors and color not in palette:
+				palette.append(color)
+		palette.extend(sorted(patternColors.difference(palette)))
+		
+		self.mPalette = palette
+		self.mPaletteIndices = dict((color, colorIndex) for colorIndex, color in enumerate(palette))
+		self.mGenerationNotes.append("Palette of {0} colors ({1}-bit indices).".format(
+			len(palette), 4 if self.getPaletteFrameType() == FRAME_TYPE_PALETTE_4 else 8))
+	
+	# Frame type used by the frames of a palette pattern.
+	def getPaletteFrameType(self):
+		if len(self.mPalette) <= PALETTE_4_MAX_COLORS:
+			return FRAME_TYPE_PALETTE_4
+		return FRAME_TYPE_PALETTE_8
+	
+	# Returns the color bytes of every LED in the color order of the strip.
+	def getNativeBytes(self, frameColors):
+		nativeBytes = bytearray(len(frameColors))
+		for bytePos, channel in enumerate(self.mColorOrder):
+			nativeBytes[bytePos::3] = frameColors["RGB".index(channel)::3]
+		return nativeBytes
+	
+	# Returns the palette index of every LED in the frame (one byte each).
+	def getPaletteIndices(self, frameColors):
+		paletteIndices = self.mPaletteIndices
+		return bytearray(paletteIndices[color] for color in unpackRgbColors(frameColors))
+	
+	# Number of entries in the array of an encoded frame. 
+	# This is the value listed in the pattern's sizes array. 
+	# Palette frames list their number of LEDs.
+	def getFrameEntryCount(self, frameType, frameData):
+		if frameType in (FRAME_TYPE_FULL, FRAME_TYPE_NATIVE):
+			return len(frameData) // 3
+		return len(frameData)
+	
+	# Bytes of PROGMEM used by the array of an encoded frame.
+	def getFrameDataBytes(self, frameType, frameData):
+		if frameType == FRAME_TYPE_PALETTE_8:
+			return max(1, len(frameData))
+		if frameType == FRAME_TYPE_PALETTE_4:
+			return max(1, (len(frameData) + 1) // 2)
+		if frameType == FRAME_TYPE_NATIVE:
+			return max(1, len(frameData))
+		if frameType == FRAME_TYPE_FULL:
+			return max(1, self.getFrameEntryCount(frameType, frameData)) * self.COLOR_FORMAT_BYTES[self.getColorFormat()]
+		# Empty arrays are written with a single placeholder entry.
+		return max(1, self.getFrameEntryCount(frameType, frameData)) * self.BYTES_PER_LED
+	
+	# Hash of the encoded frame, used to find frames with identical data.
+	def getFrameDataHash(self, frameType, frameData):
+		frameHash = hashlib.sha1(struct.pack("B", frameType))
+		if frameType in (FRAME_TYPE_FULL, FRAME_TYPE_PALETTE_8, FRAME_TYPE_PALETTE_4, FRAME_TYPE_NATIVE):
+			frameHash.update(bytes(frameData))
+		else:
+			frameHash.update(struct.pack(">{0}I".format(len(frameData)), *frameData))
+		return frameHash.digest()
+	
+	# Writes the LED index, color pairs of a delta frame.
+	def writeDeltaEntries(self, deltaEntries, outFile):
+		entries = []
+		for entryPos in range(0, len(deltaEntries), 2):
+			entries.append("{0}".format(deltaEntries[entryPos]))
+			entries.append("0x%06x" % deltaEntries[entryPos + 1])
+		self.writeArrayEntries(entries, outFile)
+	
+	# Writes the (run length << 24) | color entries of an RLE frame.
+	def writeRleEntries(self, rleEntries, outFile):
+		self.writeArrayEntries(["0x%08x" % entry for entry in rleEntries], outFile)
+	
+	# Writes the color palette shared by all frames.
+	def writePaletteConst(self, patternId, outFile):
+		outFile.write("\n	const uint32_t {0}[] PROGMEM = {{ \n	".format(self.getPaletteConstId(patternId)))
+		self.writeArrayEntries(["0x%06x" % color for color in self.mPalette], outFile)
+		outFile.write("	};\n")
+	
+	# Writes the palette index of every LED in a frame. 
+	# 4-bit indices are packed two per byte, first LED in the high nibble.
+	def writePaletteIndices(self, frameType, paletteIndices, outFile):
+		if frameType == FRAME_TYPE_PALETTE_8:
+			self.writeArrayEntries(["{0}".format(colorIndex) for colorIndex in paletteIndices], outFile)
+			return
+		highNibbles = paletteIndices[0::2]
+		lowNibbles = paletteIndices[1::2] + bytearray(len(highNibbles) - len(paletteIndices[1::2]))
+		self.writeArrayEntries(["0x%02x" % ((high << 4) | low) for high, low in zip(highNibbles, lowNibbles)], outFile)
+	
+	# Writes the entries of an array, LIMIT_LINE_LENTH per line.
+	def writeArrayEntries(self, entries, outFile):
+		if len(entries) == 0:
+			# Arrays can't be empty, the frame size tells the player there is nothing to read.
+			outFile.write("0\n")
+			return
+		lines = []
+		for lineStart in range(0, len(entries), self.LIMIT_LINE_LENTH):
+			lines.append(", ".join(entries[lineStart:lineStart + self.LIMIT_LINE_LENTH]))
+		arrayBody = ", \n	".join(lines) + "\n"
+		if len(entries) % self.LIMIT_LINE_LENTH == 0:
+			arrayBody += "\n	"
+		outFile.write(arrayBody)
+	
+	# Writes the 0xRRGGBB entries of a frame array using a single write. 
+	# Entries are laid out LIMIT_LINE_LENTH per line.
+	def writeFrameColors(self, frameRgb, outFile):
+		totalLeds = len(frameRgb) // 3
+		if totalLeds == 0:
+			return
+		
+		# Every entry is written as "0xRRGGBB, " (10 characters).
+		hexColors = binascii.hexlify(bytes(frameRgb))
+		entries = bytearray(b"0x000000, ") * totalLeds
+		for digit in range(0, 6):
+			entries[2 + digit::10] = hexColors[digit::6]
+		# Last entry ends the array instead.
+		entries[-2:] = b"\n"
+		
+		lineBytes = self.LIMIT_LINE_LENTH * 10
+		lines = [bytes(entries[lineStart:lineStart + lineBytes]) for lineStart in range(0, len(entries), lineBytes)]
+		# Add a new line after 10 patterns to keep the width of the code slim
+		frameBody = b"\n	".join(lines)
+		if totalLeds % self.LIMIT_LINE_LENTH == 0:
+			frameBody += b"\n	"
+		outFile.write(frameBody.decode("ascii"))
+	
+	# Writes the color bytes of a frame stored with 3 bytes per LED 
+	# (native and 24-bit frames), the bytes of LIMIT_LINE_LENTH LEDs per line.
+	def writeLedBytes(self, ledBytes, outFile):
+		if len(ledBytes) == 0:
+			outFile.write("0\n")
+			return
+		
+		# Every entry is written as "0xNN, " (6 characters).
+		hexBytes = binascii.hexlify(bytes(ledBytes))
+		entries = bytearray(b"0x00, ") * len(ledBytes)
+		entries[2::6] = hexBytes[0::2]
+		entries[3::6] = hexBytes[1::2]
+		entries[-2:] = b"\n"
+		
+		lineBytes = self.LIMIT_LINE_LENTH * 3 * 6
+		lines = [bytes(entries[lineStart:lineStart + lineBytes]) for lineStart in range(0, len(entries), lineBytes)]
+		frameBody = b"\n	".join(lines)
+		if (len(ledBytes) // 3) % self.LIMIT_LINE_LENTH == 0:
+			frameBody += b"\n	"
+		outFile.write(frameBody.decode("ascii"))
+	
+	# Writes the RGB565 value of every LED of a frame already rounded by quantizeRgb565.
+	def writeRgb565Colors(self, frameRgb, outFile):
+		self.writeArrayEntries(["0x%04x" % (((color >> 8) & 0xF800) | ((color >> 5) & 0x07E0) | ((color >> 3) & 0x001F)) 
+			for color in unpackRgbColors(frameRgb)], outFile)
+	
+	# Returns the colors of a frame rounded to the precision of RGB565, 
+	# still as 3 bytes per LED with the kept bits at the top of each byte. 
+	# Dithering offsets the rounding of each LED by a 4x4 Bayer matrix 
+	# cell picked by the position of its pixel in the image.
+	def quantizeRgb565(self, frameRgb, frame):
+		outRgb = bytearray(frameRgb)
+		if self.mColorFormat == COLOR_FORMAT_RGB565_DITHER:
+			sortLeds, restoreLeds, cellRanges = self.getDitherOrder(frame, len(frameRgb) // 3)
+		for channel, channelBits in enumerate(self.RGB565_BITS):
+			step = 1 << (8 - channelBits)
+			if self.mColorFormat != COLOR_FORMAT_RGB565_DITHER:
+				outRgb[channel::3] = frameRgb[channel::3].translate(self.getQuantizeTable(channelBits, step // 2))
+				continue
+			# The LEDs of each cell are a single slice once sorted by cell.
+			cellColors = sortLeds(frameRgb[channel::3])
+			for ditherValue, cellStart, cellEnd in cellRanges:
+				# Thresholds spread evenly over the step, centered like the rounding.
+				threshold = (ditherValue * 2 + 1) * step // 32
+				cellColors[cellStart:cellEnd] = cellColors[cellStart:cellEnd].translate(
+					self.getQuantizeTable(channelBits, threshold))
+			outRgb[channel::3] = restoreLeds(cellColors)
+		return outRgb
+	
+	# Returns (sort, restore, cell ranges) of the dithering of a frame of ledCount LEDs. 
+	# Sort gathers the colors of the LEDs sorted by their Bayer matrix cell, 
+	# restore puts them back in LED order, and the cell ranges are the 
+	# (matrix value, start, end) of the LEDs of every cell once sorted. 
+	# LEDs without a pixel use the first cell. Frames of tiled groups are 
+	# already in LED order, their LEDs are taken as rows of the frame width.
+	def getDitherOrder(self, frame, ledCount):
+		tiled = isLayerTiled(frame.frameId)
+		orderKey = (frame.width, frame.height, ledCount, tiled)
+		ditherOrder = self.mDitherOrders.get(orderKey)
+		if ditherOrder is not None:
+			return ditherOrder
+		
+		ledPixels = None
+		if not tiled and self.mLedLayout is not None:
+			ledPixels = self.mLedLayout.getLedPixels(frame.width, frame.height)
+		if ledPixels is None:
+			ledPixels = range(0, ledCount)
+		frameWidth = max(1, frame.width)
+		ledCells = [0 if pixelIndex == NO_PIXEL else (pixelIndex // frameWidth % 4) * 4 + pixelIndex % frameWidth % 4 
+			for pixelIndex in ledPixels]
+		sortedLeds = sorted(range(0, ledCount), key = ledCells.__getitem__)
+		sortedPositions = [0] * ledCount
+		for sortedPos, ledPos in enumerate(sortedLeds):
+			sortedPositions[ledPos] = sortedPos
+		cellRanges = []
+		cellStart = 0
+		for cell in range(0, 16):
+			cellEnd = cellStart + ledCells.count(cell)
+			if cellEnd > cellStart:
+				cellRanges.append((self.DITHER_MATRIX[cell // 4][cell % 4], cellStart, cellEnd))
+			cellStart = cellEnd
+		ditherOrder = (createByteGather(sortedLeds), createByteGather(sortedPositions), cellRanges)
+		self.mDitherOrders[orderKey] = ditherOrder
+		return ditherOrder
+	
+	# Returns a 256 entry lookup table rounding a color value to the 
+	# given bits, adding the threshold first. Tables are cached.
+	def getQuantizeTable(self, channelBits, threshold):
+		quantizeTable = self.mQuantizeTables.get((channelBits, threshold))
+		if quantizeTable is None:
+			mask = (0xFF << (8 - channelBits)) & 0xFF
+			quantizeTable = bytes(bytearray(min(255, color + threshold) & mask for color in range(0, 256)))
+			self.mQuantizeTables[(channelBits, threshold)] = quantizeTable
+		return quantizeTable
+	
+	# Generates the ID that will be used in the Total LEDs define statement
+	def getTotalLedsDefineId(self, patternId):
+		return "{0}_TOTAL_LEDS".format(patternId)
+			
+	# Generates the ID that will be used in the Delay define statement
+	def getDelayDefineId(self, patternId):
+		return "{0}_DELAY".format(patternId)
+	
+	# Generates the ID of the constant to use for the pattern frame sizes. 
+	def getPatternSizeConstId(self, patternId):
+		return "{0}_SIZES".format(patternId)
+	
+	# Generates the ID of the constant to use for the pattern frame types. 
+	def getPatternTypeConstId(self, patternId):
+		return "{0}_TYPES".format(patternId)
+	
+	# Generates the ID of the constant to use for the pattern frame durations. 
+	def getPatternDurationConstId(self, patternId):
+		return "{0}_DURATIONS".format(patternId)
+	
+	# Generates the ID of the constant to use for the in-between frames of the pattern.
+	def getPatternTweenConstId(self, patternId):
+		return "{0}_TWEENS".format(patternId)
+
+	# Generates the ID of the constant to use for the pattern color palette. 
+	def getPaletteConstId(self, patternId):
+		return "{0}_PALETTE".format(patternId)
+	
+	# Generates the ID that will be used for the offsets constant. 
+	def getFrameOffsetConstId(self, patternId):
+		return "{0}_OFFSETS".format(patternId)
+		
+	def toCamelCase(self, text):
+		text = text.title()
+		return text[0].lower() + text[1:]
+		
+	# Helper to write the start of a frame to the Arduino file.
+	def writeFrameConst(self, frameName, outFile, dataType = "uint32_t"):
+		outFile.write("\n	const {1} {0}[] PROGMEM = {{ \n	".format(frameName, dataType))
+
+	# Helper to write the start of a pattern to the Arduino file.
+	# A Pattern is composed of Frames.
+	def writePatternConst(self, patternName, outFile, dataType = "uint32_t"):
+		outFile.write("\n	const {1} *const {0}[] PROGMEM = {{ \n".format(patternName, dataType))
+		
+	# Helper to write the start of the pattern's frame size array
+	# A Pattern Size is composed of each Frame's size listed in the same order as the frame constants.
+	def writePatternFrameSizeConst(self, patternName, outFile):
+		outFile.write("\n	const uint32_t {0}[] PROGMEM = {{ \n".format(self.getPatternSizeConstId(patternName)))
+	
+	# Helper to write the start of the pattern's frame type array. 
+	# Lists the FrameType of each frame in the same order as the frame constants.
+	def writePatternFrameTypeConst(self, patternName, outFile):
+		outFile.write("\n	const uint8_t {0}[] PROGMEM = {{ \n".format(self.getPatternTypeConstId(patternName)))
+	
+	# Helper to write the start of the pattern's frame duration array. 
+	# Lists the milliseconds each frame is shown for in the same order as the frame constants.
+	def writePatternFrameDurationConst(self, patternName, outFile):
+		outFile.write("\n	const {1} {0}[] PROGMEM = {{ \n".format(self.getPatternDurationConstId(patternName), 
+			self.getFrameDurationType(self.mFrameDurations)))
+	
+	# Helper to write the start of the pattern's in-between frame array.
+	# Lists the number of frames interpolated after each frame in the same order as the frame constants.
+	def writePatternFrameTweenConst(self, patternName, outFile):
+		outFile.write("\n	const uint8_t {0}[] PROGMEM = {{ \n".format(self.getPatternTweenConstId(patternName)))
+	
+	# Helper to write the start of frame's offset array. 
+	# The frame offset array includes the offset to be applied to the frame's LED positions.
+	def writePatternFrameOffsetConst(self, patternName, outFile):
+		outFile.write("\n	const uint32_t {0}[] PROGMEM = {{ \n".format(self.getFrameOffsetConstId(patternName)))
 		
 	
 	# Helper to write any headers needed	
@@ -546,6 +3742,7 @@ void play_{3}(Adafruit_NeoPixel strip)
 	# But for now generating it so the output is self-contained. 
 	def writeBaseLedPatternClass(self):
 		outFilename = os.path.join(self.mOutDir, '{0}.h'.format(self.getBasePatternClassName()))
+		self.mOutputFiles.append(outFilename)
 		baseClassFile = open(outFilename, "w")
 		self.generatePluginHeaderInfo(baseClassFile)
 		baseClassFile.write(
@@ -563,8 +3760,14 @@ class GimpLedPattern
     virtual void stopPattern() = 0;
 
   protected:
+    // Types of frames stored by patterns using an encoding.
+    enum FrameType { FRAME_TYPE_FULL = 0, FRAME_TYPE_DELTA = 1, FRAME_TYPE_RLE = 2, FRAME_TYPE_PALETTE_8 = 3, FRAME_TYPE_PALETTE_4 = 4, FRAME_TYPE_NATIVE = 5 };
+
     Adafruit_NeoPixel& mStrip;
     bool mInterrupt = false;
+    // Data of the frame shown on the strip, frames sharing it are not drawn and shown again.
+    // Cleared when a pass starts since the sketch may have drawn something else in between.
+    const void* mShownFrame = NULL;
 };
 
 #endif
@@ -581,56 +3784,450 @@ class GimpLedPattern
 		
 	# Writes the class for this LED Pattern
 	def writePatternClass(self, patternId, outFile):
+		if self.mPlayer == PLAYER_NON_BLOCKING:
+			self.writeNonBlockingPatternClass(patternId, outFile)
+			return
+		if (self.getColorFormat() != COLOR_FORMAT_RGB32 or self.mFrameTweens is not None or self.mFrameEncoding != ENCODING_FULL
+			and (self.hasFrameTypes() or self.mPalette is not None or self.mFrameEncoding == ENCODING_NATIVE)):
+			self.writeEncodedPatternClass(patternId, outFile)
+			return
 		outFile.write("""
 class {4} : public GimpLedPattern 
 {{
 
-  public:
-    {4}(Adafruit_NeoPixel& strip): {3}(strip){{}}
+  public:
+    {4}(Adafruit_NeoPixel& strip): {3}(strip){{}}
+
+    ~Pattern_{0}(){{}}
+
+    void playPattern() 
+    {{
+      int totalFrames = sizeof({0}) / sizeof(uint32_t*);
+      mShownFrame = NULL;
+      for (int framePos = 0; framePos < totalFrames; framePos ++)
+      {{
+        const uint32_t* frameData = (const uint32_t*)pgm_read_ptr(&({0}[framePos]));
+        if(frameData == mShownFrame)
+        {{
+          // The strip already shows this frame, only hold it.
+          delay({2});
+          continue;
+        }}
+        int frameTotalLeds = pgm_read_dword(&({1}[framePos]));
+		int ledOffset = 0;
+        for (int ledPos = 0; ledPos < frameTotalLeds; ledPos++)
+        {{
+          if(mInterrupt)
+          {{
+            // If we are interrupted stop the pattern. "Clean" LED pattern.
+            mStrip.clear();
+            mStrip.show();
+            mShownFrame = NULL;
+            mInterrupt = false;
+            return;
+          }}
+          uint32_t ledColor = pgm_read_dword(&({0}[framePos][ledPos]));
+          int blue = ledColor & 0x00FF;
+          int green = (ledColor >> 8) & 0x00FF;
+          int red = (ledColor >>  16) & 0x00FF;
+          mStrip.setPixelColor(ledPos + ledOffset, red, green, blue);
+
+        }}
+        mStrip.show();
+        mShownFrame = frameData;
+        delay({2});
+      }}
+    }}
+
+    
+    void stopPattern() 
+    {{
+      mInterrupt = true;
+    }}
+}};
+		""".format(patternId, 
+		self.getPatternSizeConstId(patternId),
+		self.getFrameDelayCode(patternId, "framePos"), 
+		self.getBasePatternClassName(), 
+		self.getGeneratedLedPatternClassName(patternId))
+		)
+	
+	# Writes the class for an LED Pattern stored with an encoding.
+	# Each frame is decoded by renderFrame() according to its FrameType.
+	def writeEncodedPatternClass(self, patternId, outFile):
+		outFile.write("""
+class {4} : public {3} 
+{{
+
+  public:
+    {4}(Adafruit_NeoPixel& strip): {3}(strip){{}}
+
+    ~{4}(){{}}
+
+    void playPattern() 
+    {{
+      int totalFrames = sizeof({0}) / sizeof(uint32_t*);
+      mShownFrame = NULL;
+      for (int framePos = 0; framePos < totalFrames; framePos ++)
+      {{
+        const void* frameData = (const void*)pgm_read_ptr(&({0}[framePos]));
+        if({shownCheck})
+        {{
+          // The strip already shows this frame, only hold it.
+          delay({2});
+          continue;
+        }}
+        if(!renderFrame(framePos))
+        {{
+          // If we are interrupted stop the pattern. "Clean" LED pattern.
+          mStrip.clear();
+          mStrip.show();
+          mShownFrame = NULL;
+          mInterrupt = false;
+          return;
+        }}
+        mStrip.show();
+        mShownFrame = frameData;
+        delay({2});{tweenPlayback}
+      }}
+    }}
+
+    
+    void stopPattern() 
+    {{
+      mInterrupt = true;
+    }}
+
+  private:
+    // Writes the LEDs stored for the given frame into the strip.
+    // Returns false if the pattern was interrupted.
+    bool renderFrame(int framePos)
+    {{
+      const {5}* frameData = (const {5}*)pgm_read_ptr(&({0}[framePos]));
+      uint32_t frameSize = pgm_read_dword(&({1}[framePos]));
+{6}
+      return true;
+    }}{tweenRenderer}
+}};
+		""".format(patternId, 
+		self.getPatternSizeConstId(patternId),
+		self.getFrameDelayCode(patternId, "framePos"), 
+		self.getBasePatternClassName(), 
+		self.getGeneratedLedPatternClassName(patternId),
+		self.getFrameDataType(),
+		self.getFrameDecoders(patternId),
+		**self.getBlockingTweenCode(patternId))
+		)
+	
+	# Writes the class for an LED Pattern played without blocking the sketch. 
+	# playPattern() keeps the position in the pattern and the time the next 
+	# frame is due, renders a frame when millis() reaches it and returns. 
+	def writeNonBlockingPatternClass(self, patternId, outFile):
+		outFile.write("""
+class {4} : public {3} 
+{{
+
+  public:
+    {4}(Adafruit_NeoPixel& strip): {3}(strip){{}}
+
+    ~{4}(){{}}
+
+    // Call on every loop(). Shows the next frame once it is due and 
+    // returns right away, the pattern starts over after the last frame.
+    void playPattern() 
+    {{
+      uint32_t now = millis();
+      if(!mPlaying)
+      {{
+        mPlaying = true;
+        mFramePos = 0;{tweenStart}
+        mShownFrame = NULL;
+        mNextFrameTime = now;
+      }}
+      if((int32_t)(now - mNextFrameTime) < 0)
+      {{
+        return;
+      }}
+      // Frames sharing the data of the frame on the strip are only held.
+      const void* frameData = (const void*)pgm_read_ptr(&({0}[mFramePos]));
+      if({renderCheck})
+      {{
+        renderFrame(mFramePos);
+        mStrip.show();
+        mShownFrame = frameData;
+      }}{tweenRender}
+      // Frames are due a delay after the previous one was due so the timing doesn't drift. 
+      // If the sketch fell more than a frame behind, wait a full delay instead of catching up.
+      uint32_t frameDelay = {2};
+      mNextFrameTime += frameDelay;
+      if((int32_t)(now - mNextFrameTime) >= 0)
+      {{
+        mNextFrameTime = now + frameDelay;
+      }}{tweenAdvance}
+      mFramePos++;
+      if(mFramePos >= sizeof({0}) / sizeof(uint32_t*))
+      {{
+        mFramePos = 0;
+        mShownFrame = NULL;
+      }}
+    }}
+
+    // Turns the LEDs off. The next call to playPattern() starts the pattern over.
+    // Call it from the sketch (not an interrupt), it updates the strip.
+    void stopPattern() 
+    {{
+      mPlaying = false;
+      mStrip.clear();
+      mStrip.show();
+      mShownFrame = NULL;
+    }}
 
-    ~Pattern_{0}(){{}}
+  private:
+    bool mPlaying = false;
+    uint16_t mFramePos = 0;
+    uint32_t mNextFrameTime = 0;{tweenMember}
 
-    void playPattern() 
+    // Writes the LEDs stored for the given frame into the strip.
+    bool renderFrame(int framePos)
     {{
-      int totalFrames = sizeof({0}) / sizeof(uint32_t*);
-      for (int framePos = 0; framePos < totalFrames; framePos ++)
-      {{
-        int frameTotalLeds = pgm_read_dword(&({1}[framePos]));
-		int ledOffset = 0;
-        for (int ledPos = 0; ledPos < frameTotalLeds; ledPos++)
+      const {5}* frameData = (const {5}*)pgm_read_ptr(&({0}[framePos]));
+      uint32_t frameSize = pgm_read_dword(&({1}[framePos]));
+{6}
+      return true;
+    }}{tweenRenderer}
+}};
+		""".format(patternId, 
+		self.getPatternSizeConstId(patternId),
+		self.getFrameDelayCode(patternId, "mFramePos"), 
+		self.getBasePatternClassName(), 
+		self.getGeneratedLedPatternClassName(patternId),
+		self.getFrameDataType(),
+		self.getFrameDecoders(patternId),
+		**self.getNonBlockingTweenCode(patternId))
+		)
+	
+	# Returns the code giving the milliseconds the frame at the given position
+	# is shown for: the pattern delay, or its entry in the duration table.
+	def getFrameDelayCode(self, patternId, framePosName):
+		if self.mFrameDurations is None:
+			return self.getDelayDefineId(patternId)
+		readFunction = "pgm_read_word"
+		if self.getFrameDurationType(self.mFrameDurations) == "uint32_t":
+			readFunction = "pgm_read_dword"
+		return "{0}(&({1}[{2}]))".format(readFunction, self.getPatternDurationConstId(patternId), framePosName)
+
+	# Returns the code the blocking player adds to play the in-between frames,
+	# by name of the place it goes in the pattern class.
+	# Frames followed by in-between frames are drawn even if the strip already shows them.
+	def getBlockingTweenCode(self, patternId):
+		if self.mFrameTweens is None:
+			return {"shownCheck": "frameData == mShownFrame", "tweenPlayback": "", "tweenRenderer": ""}
+		tweenConstId = self.getPatternTweenConstId(patternId)
+		return {
+			"shownCheck": "frameData == mShownFrame && pgm_read_byte(&({0}[framePos])) == 0".format(tweenConstId),
+			"tweenPlayback": """
+        // In-between frames computed from this frame and the next one.
+        uint8_t tweenSteps = pgm_read_byte(&({0}[framePos]));
+        for (uint16_t tween = 1; tween <= tweenSteps; tween++)
         {{
-          if(mInterrupt)
+          if(!renderTween(framePos, tween, tweenSteps + 1))
           {{
             // If we are interrupted stop the pattern. "Clean" LED pattern.
             mStrip.clear();
             mStrip.show();
+            mShownFrame = NULL;
             mInterrupt = false;
             return;
           }}
-          uint32_t ledColor = pgm_read_dword(&({0}[framePos][ledPos]));
-          int blue = ledColor & 0x00FF;
-          int green = (ledColor >> 8) & 0x00FF;
-          int red = (ledColor >>  16) & 0x00FF;
-          mStrip.setPixelColor(ledPos + ledOffset, red, green, blue);
+          mStrip.show();
+          mShownFrame = NULL;
+          delay({1});
+        }}""".format(tweenConstId, self.getFrameDelayCode(patternId, "framePos")),
+			"tweenRenderer": self.getTweenRenderer(patternId)
+		}
 
-        }}
+	# Returns the code the non-blocking player adds to play the in-between frames,
+	# by name of the place it goes in the pattern class. mTween is the in-between
+	# frame shown after the frame at mFramePos, 0 for the frame itself.
+	def getNonBlockingTweenCode(self, patternId):
+		if self.mFrameTweens is None:
+			return {"tweenStart": "", "renderCheck": "frameData != mShownFrame", "tweenRender": "",
+				"tweenAdvance": "", "tweenMember": "", "tweenRenderer": ""}
+		tweenConstId = self.getPatternTweenConstId(patternId)
+		return {
+			"tweenStart": "\n        mTween = 0;",
+			"renderCheck": "mTween == 0 && frameData != mShownFrame",
+			"tweenRender": """
+      if(mTween > 0)
+      {{
+        // In-between frame computed from this frame and the next one.
+        renderTween(mFramePos, mTween, pgm_read_byte(&({0}[mFramePos])) + 1);
         mStrip.show();
-        delay({2});
+        mShownFrame = NULL;
+      }}""".format(tweenConstId),
+			"tweenAdvance": """
+      if(mTween < pgm_read_byte(&({0}[mFramePos])))
+      {{
+        // Show the next in-between frame before moving to the next frame.
+        mTween++;
+        return;
+      }}
+      mTween = 0;""".format(tweenConstId),
+			"tweenMember": "\n    uint8_t mTween = 0;",
+			"tweenRenderer": self.getTweenRenderer(patternId)
+		}
+
+	# Returns the private methods of the pattern class that interpolate the
+	# in-between frames. Channels are rounded to the nearest value, the way
+	# the generator checked the frames they replace.
+	def getTweenRenderer(self, patternId):
+		colorFormat = self.getColorFormat()
+		if colorFormat == COLOR_FORMAT_RGB24:
+			colorRead = """      const uint8_t* ledColor = frameData + ledPos * 3;
+      return ((uint32_t)pgm_read_byte(ledColor) << 16) | ((uint32_t)pgm_read_byte(ledColor + 1) << 8) | pgm_read_byte(ledColor + 2);"""
+		elif colorFormat in (COLOR_FORMAT_RGB565, COLOR_FORMAT_RGB565_DITHER):
+			colorRead = """      uint16_t ledColor = pgm_read_word(&(frameData[ledPos]));
+      uint8_t red = (ledColor >> 8) & 0xF8;
+      uint8_t green = (ledColor >> 3) & 0xFC;
+      uint8_t blue = (ledColor << 3) & 0xF8;
+      return ((uint32_t)(red | (red >> 5)) << 16) | ((uint32_t)(green | (green >> 6)) << 8) | (blue | (blue >> 5));"""
+		else:
+			colorRead = """      return pgm_read_dword(&(frameData[ledPos]));"""
+		return """
+
+    // Writes the in-between frame at the given step of the fade from the frame
+    // at framePos to the next frame into the strip. Returns false if the pattern was interrupted.
+    bool renderTween(int framePos, uint16_t tween, uint16_t steps)
+    {{
+      const {1}* fromData = (const {1}*)pgm_read_ptr(&({0}[framePos]));
+      const {1}* toData = (const {1}*)pgm_read_ptr(&({0}[framePos + 1]));
+      uint32_t frameSize = pgm_read_dword(&({2}[framePos]));
+      for (uint32_t ledPos = 0; ledPos < frameSize; ledPos++)
+      {{
+{3}        uint32_t fromColor = readLedColor(fromData, ledPos);
+        uint32_t toColor = readLedColor(toData, ledPos);
+        mStrip.setPixelColor(ledPos, tweenChannel(fromColor >> 16, toColor >> 16, tween, steps),
+          tweenChannel(fromColor >> 8, toColor >> 8, tween, steps), tweenChannel(fromColor, toColor, tween, steps));
       }}
+      return true;
     }}
 
-    
-    void stopPattern() 
+    // Color channel at the given step of the fade between two channel values.
+    static uint8_t tweenChannel(uint8_t from, uint8_t to, uint16_t tween, uint16_t steps)
     {{
-      mInterrupt = true;
+      if(to >= from)
+      {{
+        return from + ((uint32_t)(to - from) * tween * 2 + steps) / (steps * 2UL);
+      }}
+      return from - ((uint32_t)(from - to) * tween * 2 + steps) / (steps * 2UL);
     }}
-}};
-		""".format(patternId, 
-		self.getPatternSizeConstId(patternId),
-		self.getDelayDefineId(patternId), 
-		self.getBasePatternClassName(), 
-		self.getGeneratedLedPatternClassName(patternId))
-		)
+
+    // Color of the LED at ledPos of a full frame as 0xRRGGBB.
+    static uint32_t readLedColor(const {1}* frameData, uint32_t ledPos)
+    {{
+{4}
+    }}""".format(patternId, self.getFrameDataType(), self.getPatternSizeConstId(patternId),
+			self.getInterruptCheck("        "), colorRead)
+
+	# Returns the code that decodes the frames of the pattern into the strip.
+	# Frame types other than full frames are checked first, full frames last.
+	def getFrameDecoders(self, patternId):
+		if self.mPalette is not None:
+			return self.getPaletteDecoder(patternId)
+		if self.mFrameEncoding == ENCODING_NATIVE:
+			return self.getNativeDecoder()
+		
+		frameDecoders = ""
+		if self.hasFrameTypes():
+			frameDecoders += """      uint8_t frameType = pgm_read_byte(&({0}[framePos]));
+""".format(self.getPatternTypeConstId(patternId))
+		if self.mFrameEncoding == ENCODING_DELTA:
+			frameDecoders += """
+      if(frameType == FRAME_TYPE_DELTA)
+      {
+        // Only the LEDs that changed since the previous frame, stored as LED index, color pairs.
+        for (uint32_t entry = 0; entry < frameSize; entry += 2)
+        {
+""" + self.getInterruptCheck("          ") + """          mStrip.setPixelColor(pgm_read_dword(&(frameData[entry])), pgm_read_dword(&(frameData[entry + 1])));
+        }
+        return true;
+      }
+"""
+		if self.mFrameEncoding == ENCODING_RLE:
+			frameDecoders += """
+      if(frameType == FRAME_TYPE_RLE)
+      {
+        // Runs of LEDs sharing the same color, stored as (run length << 24) | color.
+        // Runs are streamed straight into the strip.
+        uint32_t ledPos = 0;
+        for (uint32_t entry = 0; entry < frameSize; entry++)
+        {
+""" + self.getInterruptCheck("          ") + """          uint32_t ledRun = pgm_read_dword(&(frameData[entry]));
+          uint32_t runColor = ledRun & 0xFFFFFF;
+          for (uint32_t runLength = ledRun >> 24; runLength > 0; runLength--)
+          {
+            mStrip.setPixelColor(ledPos++, runColor);
+          }
+        }
+        return true;
+      }
+"""
+		frameDecoders += """
+      for (uint32_t ledPos = 0; ledPos < frameSize; ledPos++)
+      {
+""" + self.getInterruptCheck("        ") + self.getFullFrameDecoder() + """
+      }"""
+		return frameDecoders
+	
+	# Returns the code that sets the color of the LED at ledPos of a full frame.
+	def getFullFrameDecoder(self):
+		colorFormat = self.getColorFormat()
+		if colorFormat == COLOR_FORMAT_RGB24:
+			return """        // Colors packed as 3 bytes per LED (red, green, blue).
+        const uint8_t* ledColor = frameData + ledPos * 3;
+        mStrip.setPixelColor(ledPos, pgm_read_byte(ledColor), pgm_read_byte(ledColor + 1), pgm_read_byte(ledColor + 2));"""
+		if colorFormat in (COLOR_FORMAT_RGB565, COLOR_FORMAT_RGB565_DITHER):
+			return """        // RGB565 colors, the top bits are repeated in the low bits so full intensity stays 255.
+        uint16_t ledColor = pgm_read_word(&(frameData[ledPos]));
+        uint8_t red = (ledColor >> 8) & 0xF8;
+        uint8_t green = (ledColor >> 3) & 0xFC;
+        uint8_t blue = (ledColor << 3) & 0xF8;
+        mStrip.setPixelColor(ledPos, red | (red >> 5), green | (green >> 6), blue | (blue >> 5));"""
+		return """        mStrip.setPixelColor(ledPos, pgm_read_dword(&(frameData[ledPos])));"""
+	
+	# Returns the check done before every LED by the blocking player so 
+	# stopPattern() can interrupt a frame. The non-blocking player 
+	# only renders between two calls so it doesn't need it.
+	def getInterruptCheck(self, indent):
+		if self.mPlayer == PLAYER_NON_BLOCKING:
+			return ""
+		return indent + "if(mInterrupt)\n" + indent + "{\n" + indent + "  return false;\n" + indent + "}\n"
+	
+	# Returns the code that copies a native frame straight into the pixel buffer of the strip.
+	def getNativeDecoder(self):
+		return """
+      // Frames are stored in the color order of the strip ({0}), copy the whole frame at once.
+      // Note: strip.setBrightness() is not applied to the copied colors.
+      uint32_t frameBytes = frameSize * 3;
+      if(frameBytes > mStrip.numPixels() * 3UL)
+      {{
+        frameBytes = mStrip.numPixels() * 3UL;
+      }}
+      memcpy_P(mStrip.getPixels(), frameData, frameBytes);""".format(self.mColorOrder)
+	
+	# Returns the code that looks up the color of each LED in the palette.
+	def getPaletteDecoder(self, patternId):
+		indexRead = "pgm_read_byte(&(frameData[ledPos]))"
+		if self.getPaletteFrameType() == FRAME_TYPE_PALETTE_4:
+			# Two LEDs per byte, first LED in the high nibble.
+			indexRead = "(pgm_read_byte(&(frameData[ledPos >> 1])) >> ((ledPos & 1) ? 0 : 4)) & 0x0F"
+		return """
+      // Every LED stores the index of its color in the pattern palette.
+      for (uint32_t ledPos = 0; ledPos < frameSize; ledPos++)
+      {{
+{2}        uint8_t colorIndex = {1};
+        mStrip.setPixelColor(ledPos, pgm_read_dword(&({0}[colorIndex])));
+      }}""".format(self.getPaletteConstId(patternId), indexRead, self.getInterruptCheck("        "))
 	
 	# Generate Header Plugin Info
 	def generatePluginHeaderInfo(self, outFile):
@@ -644,9 +4241,19 @@ class {4} : public GimpLedPattern
  
 ''')
 		pass
-	# Generates a ReadMe file for ease of integration into an existing sketch. 
+	# Brightness setup of the sample sketch. Not needed when the brightness is in the colors, 
+	# and native frames are copied past strip.setBrightness() so it would do nothing.
+	def getReadMeBrightness(self):
+		if self.hasColorCorrection():
+			return "  // Brightness is already applied to the colors of the pattern."
+		if self.mFrameEncoding == ENCODING_NATIVE:
+			return "  // strip.setBrightness() has no effect on native frames, use the Brightness option to dim them."
+		return "  // Reduce brigthness 0-255\n  strip.setBrightness(4);"
+	
+	# Generates a ReadMe file for ease of integration into an existing sketch.  
 	def generateReadMe(self, patternId, ledPin, totalLeds):
 		outFilename = os.path.join(self.mOutDir, 'ReadMe_{0}.txt'.format(self.getGeneratedLedPatternClassName(patternId)))
+		self.mOutputFiles.append(outFilename)
 		readMeFile = open(outFilename, "w")
 		# TODO Add generation of Adafruit NeoPixel Strip initialization as well so it properly loads the number of pixels for the pattern.
 		readMeFile.write("""
@@ -664,7 +4271,7 @@ class {4} : public GimpLedPattern
 // If you named it differently used that name here instead of 'strip'
 #define LED_PIN    {3}
 #define LED_COUNT {4}
-Adafruit_NeoPixel strip(LED_COUNT, LED_PIN, NEO_GRB + NEO_KHZ800);
+Adafruit_NeoPixel strip(LED_COUNT, LED_PIN, NEO_{5} + NEO_KHZ800);
 {1} * {2} = new {0}(strip);
 
 // 3 - Paste inside loop() to run the pattern.
@@ -687,7 +4294,7 @@ Adafruit_NeoPixel strip(LED_COUNT, LED_PIN, NEO_GRB + NEO_KHZ800);
 #define LED_COUNT {4}
 
 
-Adafruit_NeoPixel strip(LED_COUNT, LED_PIN, NEO_GRB + NEO_KHZ800);
+Adafruit_NeoPixel strip(LED_COUNT, LED_PIN, NEO_{5} + NEO_KHZ800);
 // 2 - Paste on top of setup() and under Adafruit NeoPixel declaration.
 // Note: This assumes you named your pixel strip 'strip' as in the Adafruit sample
 // from: https://learn.adafruit.com/adafruit-neopixel-uberguide?view=all#arduino-library-installation
@@ -697,8 +4304,7 @@ Adafruit_NeoPixel strip(LED_COUNT, LED_PIN, NEO_GRB + NEO_KHZ800);
 void setup() {{
   // put your setup code here, to run once:
   // Setup Neopixels
-  // Reduce brigthness 0-255
-  strip.setBrightness(4);
+{6}
   strip.begin();
   strip.show(); // Initialize all pixels to 'off'
 }}
@@ -721,8 +4327,31 @@ void loop() {{
 		self.getBasePatternClassName(),
 		self.getGeneratedLedPatternClassName(patternId).lower(),
 		ledPin,  
-		totalLeds
+		totalLeds,
+		self.mColorOrder,
+		self.getReadMeBrightness()
 		))
+		if self.hasColorCorrection():
+			readMeFile.write("""
+// Color Note: The colors are stored with gamma {0:g} and {1}% brightness already applied, 
+// so the board doesn't scale them on every show(). Don't call strip.setBrightness() on top of it.
+""".format(self.mGamma, self.mBrightness))
+		if self.mFrameEncoding == ENCODING_NATIVE:
+			readMeFile.write("""
+// Color Order Note: Frames are stored for NEO_{0} strips and copied straight into the strip, 
+// so the strip must be created with NEO_{0}. strip.setBrightness() has no effect on them.
+""".format(self.mColorOrder))
+		if self.mPlayer == PLAYER_NON_BLOCKING:
+			readMeFile.write("""
+// Player Note: playPattern() doesn't block. It shows the next frame once it is due and returns 
+// right away, so call it on every loop() along with the rest of the sketch (sensors, serial, 
+// other patterns). Avoid delay() in loop(), it holds back the frames.
+""")
+		if self.mDuplicateFrames > 0:
+			readMeFile.write("""
+// Memory Note: {0} frame(s) are identical to an earlier frame and share its data.
+// This saves {1} bytes of flash (PROGMEM).
+""".format(self.mDuplicateFrames, self.mFlashBytesSaved))
 		readMeFile.close()
 		pass
 		
@@ -730,17 +4359,1223 @@ void loop() {{
 End: Adafruit Code Generator
 '''
 
+'''
+Serial Streaming
+'''
+
+'''
+Serial port the frames are streamed to. Opened as a raw 8N1 port with
+termios where it is available (Linux, macOS), with pyserial otherwise.
+'''
+class SerialPort:
+
+	mPath = None
+	# File descriptor of the port opened with termios.
+	mFd = None
+	# pyserial port where termios is not available.
+	mSerial = None
+
+	def __init__(self, path, baudRate):
+		self.mPath = path
+		try:
+			import termios
+		except ImportError:
+			termios = None
+		if termios is None:
+			try:
+				import serial
+			except ImportError:
+				raise IOError("Streaming on this system needs pyserial (pip install pyserial).")
+			self.mSerial = serial.Serial(path, baudRate, timeout = 0)
+			return
+
+		speed = getattr(termios, "B{0}".format(baudRate), None)
+		if speed is None:
+			raise ValueError("Baud rate {0} is not supported on this system.".format(baudRate))
+		self.mFd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+		try:
+			attributes = termios.tcgetattr(self.mFd)
+			# No echo, line editing or translation of the bytes, reads return right away.
+			attributes[0] = 0
+			attributes[1] = 0
+			attributes[2] = termios.CS8 | termios.CREAD | termios.CLOCAL
+			attributes[3] = 0
+			attributes[4] = speed
+			attributes[5] = speed
+			attributes[6][termios.VMIN] = 0
+			attributes[6][termios.VTIME] = 0
+			termios.tcsetattr(self.mFd, termios.TCSANOW, attributes)
+		except termios.error as error:
+			self.close()
+			raise IOError("{0} is not a serial port: {1}".format(path, error))
+
+	def write(self, data):
+		if self.mSerial is not None:
+			self.mSerial.write(data)
+			return
+		data = bytes(data)
+		while len(data) > 0:
+			data = data[os.write(self.mFd, data):]
+
+	# Returns the next byte received, None if none arrived within timeout seconds.
+	def readByte(self, timeout):
+		if self.mSerial is not None:
+			self.mSerial.timeout = timeout
+			received = self.mSerial.read(1)
+		elif select.select([self.mFd], [], [], timeout)[0]:
+			received = os.read(self.mFd, 1)
+		else:
+			received = b""
+		if len(received) == 0:
+			return None
+		return bytearray(received)[0]
+
+	# Drops the bytes received so far, such as late replies to an earlier packet.
+	def discardInput(self):
+		while self.readByte(0) is not None:
+			pass
+
+	def close(self):
+		if self.mSerial is not None:
+			self.mSerial.close()
+			self.mSerial = None
+		if self.mFd is not None:
+			os.close(self.mFd)
+			self.mFd = None
+
+'''
+Streams the frames of a pattern to a board over a serial port for a live
+preview, instead of generating its code. The board runs the receiver sketch
+written to the output directory (StreamReceiver_<NAME>), which shows each
+frame as it arrives and replies once it is on the strip. The frames go
+through the same merging and color correction as generated patterns and
+are sent when due, following the pattern delay and frame durations.
+'''
+class AdafruitNeoPixelSerialStreamer(AdafruitNeoPixelStripCodeGenerator):
+
+	mStreamPort = None
+	mStreamBaud = None
+	# Number of times the pattern is streamed.
+	mStreamLoops = 1
+	# Frames shown by the receiver, bytes of the packets sent and frames sent again.
+	mStreamedFrames = 0
+	mStreamedBytes = 0
+	mResentFrames = 0
+	# Seconds spent streaming, and spent sending the frames and waiting for the receiver to show them.
+	mStreamSeconds = 0.0
+	mLinkSeconds = 0.0
+	# Milliseconds the streamed frames are due to be shown for.
+	mPatternMillis = 0
+	# time.time() the next frame is due at.
+	mNextFrameTime = None
+
+	# Milliseconds the receiver waits for the next byte of a packet before rejecting it.
+	RECEIVER_TIMEOUT = 100
+
+	def __init__(self, ledPattern, outFileName, outDir, frameProgress = None):
+		AdafruitNeoPixelStripCodeGenerator.__init__(self, ledPattern, outFileName, outDir, frameProgress = frameProgress)
+		self.mStreamPort = ledPattern.get(KEY_PATTERN_STREAM_PORT, STREAM_DEFAULT_PORT)
+		self.mStreamBaud = ledPattern.get(KEY_PATTERN_STREAM_BAUD, STREAM_BAUD_RATES[0])
+		self.mStreamLoops = max(1, ledPattern.get(KEY_PATTERN_STREAM_LOOPS, 1))
+		# The receiver shows every frame as it is sent.
+		self.mTweenTolerance = None
+		self.mStreamedFrames = 0
+		self.mStreamedBytes = 0
+		self.mResentFrames = 0
+		self.mStreamSeconds = 0.0
+		self.mLinkSeconds = 0.0
+		self.mPatternMillis = 0
+
+	def generate(self):
+		patternId = self.mLedPattern[KEY_PATTERN_ID]
+		sketchPath = self.writeReceiverSketch(patternId)
+		if self.mFrameEncoding not in (ENCODING_FULL, ENCODING_DELTA, ENCODING_RLE):
+			self.mGenerationNotes.append("Frames streamed as the smallest of Full, Delta and RLE packets.")
+
+		serialPort = SerialPort(self.mStreamPort, self.mStreamBaud)
+		try:
+			self.connectReceiver(serialPort, sketchPath)
+			startTime = time.time()
+			self.mNextFrameTime = startTime
+			# Colors on the strip once the receiver showed the last frame sent.
+			shownRgb = None
+			for loop in range(0, self.mStreamLoops):
+				if loop > 0 and self.mFrameProgress is not None:
+					self.mFrameProgress.restart("Streaming loop {0} of {1}...".format(loop + 1, self.mStreamLoops))
+				shownRgb = self.streamFrames(serialPort, shownRgb)
+			# Show the last frame for its duration too.
+			waitTime = self.mNextFrameTime - time.time()
+			if waitTime > 0:
+				time.sleep(waitTime)
+			self.mStreamSeconds = time.time() - startTime
+		finally:
+			serialPort.close()
+
+	# Pings the receiver until it answers. Boards reset when the port
+	# opens so it can take a couple of seconds before the sketch runs.
+	def connectReceiver(self, serialPort, sketchPath):
+		pingPacket = self.getStreamPacket(PACKET_PING, b"")
+		connectTime = time.time() + STREAM_CONNECT_TIMEOUT
+		while time.time() < connectTime:
+			serialPort.write(pingPacket)
+			if serialPort.readByte(STREAM_REPLY_TIMEOUT / 4) == STREAM_ACK:
+				# Drop the replies to the other pings.
+				time.sleep(STREAM_REPLY_TIMEOUT / 4)
+				serialPort.discardInput()
+				return
+		raise IOError("No stream receiver answered on {0}, upload {1} to the board at {2} baud first.".format(
+			self.mStreamPort, os.path.basename(sketchPath), self.mStreamBaud))
+
+	# Sends every frame of the pattern once it is due, like the non-blocking player:
+	# frames are due a frame duration after the previous one was due, and if
+	# the stream fell more than a frame behind it waits a full duration instead
+	# of catching up. Returns the colors left on the strip.
+	def streamFrames(self, serialPort, shownRgb):
+		for frame in self.iterPatternFrames():
+			frameRgb = self.getFrameRgb(frame)
+			waitTime = self.mNextFrameTime - time.time()
+			if waitTime > 0:
+				time.sleep(waitTime)
+			startTime = time.time()
+			self.sendFrame(serialPort, frameRgb, shownRgb)
+			shownRgb = frameRgb
+			self.mLinkSeconds += time.time() - startTime
+			addStageTime("stream", startTime)
+
+			frameDuration = self.getFrameDuration(frame)
+			self.mPatternMillis += frameDuration
+			self.mNextFrameTime += frameDuration / 1000.0
+			if startTime >= self.mNextFrameTime:
+				self.mNextFrameTime = startTime + frameDuration / 1000.0
+			if self.mFrameProgress is not None:
+				self.mFrameProgress.frameDone()
+		return shownRgb
+
+	# Sends a frame and waits for the receiver to show it. Rejected or
+	# unanswered frames are sent again as full frames, since the strip
+	# may hold part of them.
+	def sendFrame(self, serialPort, frameRgb, shownRgb):
+		packetType, payload = self.encodeStreamFrame(frameRgb, shownRgb)
+		for attempt in range(0, STREAM_RETRIES + 1):
+			packet = self.getStreamPacket(packetType, payload)
+			serialPort.write(packet)
+			self.mStreamedBytes += len(packet)
+			countProfile("streamBytes", len(packet))
+			if serialPort.readByte(STREAM_REPLY_TIMEOUT) == STREAM_ACK:
+				self.mStreamedFrames += 1
+				countProfile("streamFrames")
+				return
+			# Wait for the receiver to drop what is left of the packet.
+			time.sleep(self.RECEIVER_TIMEOUT / 1000.0)
+			serialPort.discardInput()
+			self.mResentFrames += 1
+			countProfile("streamResends")
+			packetType, payload = PACKET_FULL, bytes(frameRgb)
+		raise IOError("The stream receiver on {0} stopped answering.".format(self.mStreamPort))
+
+	# Returns the type and payload of the packet for a frame.
+	# The frame encoding picks the packets allowed, the smallest one is sent.
+	# Delta packets need the colors on the strip.
+	def encodeStreamFrame(self, frameRgb, shownRgb):
+		if len(frameRgb) > 0xFFFF:
+			raise ValueError("Frames of more than {0} LEDs can't be streamed.".format(0xFFFF // 3))
+		packets = [(PACKET_FULL, bytes(frameRgb))]
+		if self.mFrameEncoding != ENCODING_FULL:
+			if self.mFrameEncoding != ENCODING_RLE and shownRgb is not None and len(shownRgb) == len(frameRgb):
+				packets.append((PACKET_DELTA, self.getStreamDeltaPayload(frameRgb, shownRgb)))
+			if self.mFrameEncoding != ENCODING_DELTA:
+				packets.append((PACKET_RLE, self.getStreamRlePayload(frameRgb)))
+		return min(packets, key = lambda packet: len(packet[1]))
+
+	# LED index and color of every LED that changed.
+	def getStreamDeltaPayload(self, frameRgb, shownRgb):
+		payload = bytearray()
+		for colorStart in range(0, len(frameRgb), 3):
+			color = frameRgb[colorStart:colorStart + 3]
+			if color != shownRgb[colorStart:colorStart + 3]:
+				payload.extend(struct.pack("<H", colorStart // 3))
+				payload.extend(color)
+		return bytes(payload)
+
+	# Run length and color of the runs of LEDs sharing the same color.
+	def getStreamRlePayload(self, frameRgb):
+		payload = bytearray()
+		for color, colorRun in itertools.groupby(unpackRgbColors(frameRgb)):
+			runLength = len(list(colorRun))
+			while runLength > 0:
+				length = min(runLength, RLE_MAX_RUN_LENGTH)
+				payload.extend((length, (color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF))
+				runLength -= length
+		return bytes(payload)
+
+	# Frames a payload into a packet, see STREAM_SYNC.
+	def getStreamPacket(self, packetType, payload):
+		packetBody = struct.pack("<BH", packetType, len(payload)) + payload
+		return struct.pack("<B", STREAM_SYNC) + packetBody + struct.pack("<H", self.getStreamChecksum(packetBody))
+
+	# Fletcher-16 checksum, the receiver computes it byte by byte
+	# as the packet arrives. Sums are taken modulo 255 at the end.
+	def getStreamChecksum(self, data):
+		data = bytearray(data)
+		checksumLow = sum(data) % 255
+		checksumHigh = sum(map(operator.mul, data, range(len(data), 0, -1))) % 255
+		return (checksumHigh << 8) | checksumLow
+
+	def getGenerationSummary(self):
+		summary = list(self.mGenerationNotes)
+		if self.mMergedFrames > 0:
+			summary.append("{0} identical consecutive frames merged into a longer frame.".format(self.mMergedFrames))
+		if self.mStreamedFrames == 0:
+			return summary
+		framesPerSecond = self.mStreamedFrames / max(self.mStreamSeconds, 0.001)
+		patternFramesPerSecond = self.mStreamedFrames * 1000.0 / max(self.mPatternMillis, 1)
+		linkFramesPerSecond = self.mStreamedFrames / max(self.mLinkSeconds, 0.001)
+		summary.append("Streamed {0} frames to {1}: {2:.1f} fps (pattern {3:.1f} fps, link up to {4:.1f} fps), "
+			"{5:.0f} bytes per frame.".format(self.mStreamedFrames, self.mStreamPort, framesPerSecond,
+			patternFramesPerSecond, linkFramesPerSecond, self.mStreamedBytes / float(self.mStreamedFrames)))
+		if self.mResentFrames > 0:
+			summary.append("{0} frames sent again.".format(self.mResentFrames))
+		return summary
+
+	# Returns the name of the receiver sketch, also the name of its folder as the Arduino IDE expects.
+	def getReceiverSketchName(self, patternId):
+		return "StreamReceiver_{0}".format(patternId)
+
+	# Writes the sketch that receives the frames on the board and shows them.
+	# Packets are decoded into the strip as they arrive so the sketch needs
+	# no frame buffer. The strip is only shown once the checksum matches,
+	# and the reply keeps the frames from arriving while show() blocks the serial interrupts.
+	# Returns the path of the sketch.
+	def writeReceiverSketch(self, patternId):
+		sketchName = self.getReceiverSketchName(patternId)
+		sketchDir = os.path.join(self.mOutDir, sketchName)
+		if not os.path.isdir(sketchDir):
+			os.makedirs(sketchDir)
+		sketchPath = os.path.join(sketchDir, "{0}.ino".format(sketchName))
+		self.mOutputFiles.append(sketchPath)
+		sketchFile = open(sketchPath, "w")
+		self.generatePluginHeaderInfo(sketchFile)
+		sketchFile.write("""// Shows the frames streamed by the Gimp LEDs plug-in (LED Type: Serial Stream).
+// Upload it to the board, then stream the pattern to its serial port.
+#include <Adafruit_NeoPixel.h>
+
+#define LED_PIN    {0}
+#define LED_COUNT {1}
+#define STREAM_BAUD {2}
+// Milliseconds to wait for the next byte of a packet before rejecting it.
+#define STREAM_TIMEOUT {3}
+
+// Packets: sync byte, type, payload length (2 bytes, little-endian), payload and
+// Fletcher-16 checksum (2 bytes, little-endian) of the type, length and payload.
+#define STREAM_SYNC 0x{4:02X}
+#define PACKET_PING {5}
+#define PACKET_FULL {6}
+#define PACKET_DELTA {7}
+#define PACKET_RLE {8}
+#define STREAM_ACK 0x{9:02X}
+#define STREAM_NAK 0x{10:02X}
+
+Adafruit_NeoPixel strip(LED_COUNT, LED_PIN, NEO_{11} + NEO_KHZ800);
+uint16_t checksumLow = 0;
+uint16_t checksumHigh = 0;
+bool packetTimeout = false;
+
+// Reads the next byte of a packet and adds it to the checksum.
+uint8_t readPacketByte()
+{{
+  uint32_t startTime = millis();
+  while(!Serial.available())
+  {{
+    if(millis() - startTime > STREAM_TIMEOUT)
+    {{
+      packetTimeout = true;
+      return 0;
+    }}
+  }}
+  uint8_t value = Serial.read();
+  checksumLow = (checksumLow + value) % 255;
+  checksumHigh = (checksumHigh + checksumLow) % 255;
+  return value;
+}}
+
+uint32_t readPacketColor()
+{{
+  uint8_t red = readPacketByte();
+  uint8_t green = readPacketByte();
+  uint8_t blue = readPacketByte();
+  return strip.Color(red, green, blue);
+}}
+
+void setup()
+{{
+  Serial.begin(STREAM_BAUD);
+  strip.begin();
+  strip.show(); // Initialize all pixels to 'off'
+}}
+
+void loop()
+{{
+  if(!Serial.available() || Serial.read() != STREAM_SYNC)
+  {{
+    return;
+  }}
+  checksumLow = 0;
+  checksumHigh = 0;
+  packetTimeout = false;
+  uint8_t packetType = readPacketByte();
+  uint16_t payloadLength = readPacketByte();
+  payloadLength |= (uint16_t)readPacketByte() << 8;
+
+  // Colors are written into the strip as they arrive, the frame is only shown once the checksum matches.
+  uint16_t ledPos = 0;
+  uint16_t payloadPos = 0;
+  while(payloadPos < payloadLength && !packetTimeout)
+  {{
+    if(packetType == PACKET_FULL)
+    {{
+      strip.setPixelColor(ledPos++, readPacketColor());
+      payloadPos += 3;
+    }}
+    else if(packetType == PACKET_DELTA)
+    {{
+      ledPos = readPacketByte();
+      ledPos |= (uint16_t)readPacketByte() << 8;
+      strip.setPixelColor(ledPos, readPacketColor());
+      payloadPos += 5;
+    }}
+    else if(packetType == PACKET_RLE)
+    {{
+      uint8_t runLength = readPacketByte();
+      uint32_t runColor = readPacketColor();
+      for (; runLength > 0; runLength--)
+      {{
+        strip.setPixelColor(ledPos++, runColor);
+      }}
+      payloadPos += 4;
+    }}
+    else
+    {{
+      readPacketByte();
+      payloadPos++;
+    }}
+  }}
+
+  uint16_t checksum = (checksumHigh << 8) | checksumLow;
+  uint16_t packetChecksum = readPacketByte();
+  packetChecksum |= (uint16_t)readPacketByte() << 8;
+  if(packetTimeout || packetChecksum != checksum)
+  {{
+    // The plug-in sends the frame again in full.
+    Serial.write(STREAM_NAK);
+    return;
+  }}
+  if(packetType != PACKET_PING)
+  {{
+    strip.show();
+  }}
+  // Reply once the frame is shown so the next one doesn't arrive while show() blocks the serial interrupts.
+  Serial.write(STREAM_ACK);
+}}
+""".format(self.mLedPattern[LEY_PATTERN_LED_PIN], self.mLedPattern[KEY_PATTERN_TOTAL_LEDS], self.mStreamBaud,
+			self.RECEIVER_TIMEOUT, STREAM_SYNC, PACKET_PING, PACKET_FULL, PACKET_DELTA, PACKET_RLE,
+			STREAM_ACK, STREAM_NAK, self.mColorOrder))
+		sketchFile.close()
+		return sketchPath
+
+'''
+End: Serial Streaming
+'''
+
+'''
+Pattern Emulator
+'''
+
+'''
+Plays back the code generated for a pattern (Pattern_<NAME>.h) the way the
+player on the board does, without a board. The arrays of the header are
+read and every frame is decoded into a copy of the strip: full frames in
+any color format, delta, RLE, palette and native frames, the frame
+durations and the in-between frames of tweened fades. Only headers written
+by this plug-in are understood, they are not compiled.
+'''
+class LedPatternEmulator:
+	
+	mHeaderPath = None
+	mPatternId = None
+	mDelay = None
+	mTotalLeds = None
+	# Type of the entries of the frame arrays (uint32_t, uint16_t, uint8_t).
+	mDataType = None
+	# Array name -> text between its braces.
+	mArrays = None
+	# Name of the array of each frame, in playing order.
+	mFrameIds = None
+	mFrameSizes = None
+	mFrameTypes = None
+	mFrameDurations = None
+	mFrameTweens = None
+	# Packed 0xRRGGBB bytes of every palette color, None without a palette.
+	mPalette = None
+	# Color order of the strip for native frames, None for other patterns.
+	mNativeOrder = None
+	# (array name, decoded colors) of the last full frame decoded.
+	mDecodedFrame = None
+	# RGB565 value -> packed RGB bytes, built when first needed.
+	mRgb565Colors = None
+	
+	def __init__(self, headerPath):
+		self.mHeaderPath = headerPath
+		headerFile = open(headerPath, "r")
+		headerText = headerFile.read()
+		headerFile.close()
+		
+		patternMatch = re.search(r"const (\w+) \*const (\w+)\[\] PROGMEM = \{(.*?)\};", headerText, re.DOTALL)
+		if patternMatch is None:
+			raise ValueError("{0} is not a pattern generated by this plug-in.".format(os.path.basename(headerPath)))
+		self.mDataType, self.mPatternId, frameList = patternMatch.groups()
+		self.mFrameIds = frameList.replace(",", " ").split()
+		self.mDelay = self.getDefine(headerText, self.mPatternId + "_DELAY")
+		self.mTotalLeds = self.getDefine(headerText, self.mPatternId + "_TOTAL_LEDS")
+		arrays = re.findall(r"const \w+ (\w+)\[\] PROGMEM = \{(.*?)\};", headerText, re.DOTALL)
+		self.mArrays = dict(arrays)
+		if len(self.mArrays) != len(arrays):
+			# The sketch wouldn't compile either.
+			arrayIds = [arrayId for arrayId, arrayBody in arrays]
+			raise ValueError("{0} defines {1} more than once.".format(os.path.basename(headerPath), 
+				", ".join(sorted(set(arrayId for arrayId in arrayIds if arrayIds.count(arrayId) > 1)))))
+		
+		frameCount = len(self.mFrameIds)
+		self.mFrameSizes = self.getEntries(self.mPatternId + "_SIZES", frameCount)
+		self.mFrameTypes = self.getEntries(self.mPatternId + "_TYPES", frameCount)
+		self.mFrameDurations = self.getEntries(self.mPatternId + "_DURATIONS", frameCount)
+		self.mFrameTweens = self.getEntries(self.mPatternId + "_TWEENS", frameCount)
+		if self.mFrameSizes is None:
+			raise ValueError("{0} has no frame sizes.".format(os.path.basename(headerPath)))
+		paletteId = self.mPatternId + "_PALETTE"
+		if paletteId in self.mArrays:
+			paletteColors = self.mArrays[paletteId].replace(",", " ").split()
+			self.mPalette = self.getHexBytes(paletteId, len(paletteColors), 3)
+		orderMatch = re.search(r"color order of the strip \((\w+)\)", headerText)
+		if orderMatch is not None:
+			self.mNativeOrder = orderMatch.group(1)
+	
+	# Value of a #define of the header.
+	def getDefine(self, headerText, defineId):
+		defineMatch = re.search(r"#define {0} (\d+)".format(defineId), headerText)
+		if defineMatch is None:
+			raise ValueError("{0} has no {1}.".format(os.path.basename(self.mHeaderPath), defineId))
+		return int(defineMatch.group(1))
+	
+	# Returns the first entryCount numbers of an array, None if the header doesn't have it.
+	def getEntries(self, arrayId, entryCount):
+		arrayBody = self.mArrays.get(arrayId)
+		if arrayBody is None:
+			return None
+		return [int(entry, 0) for entry in arrayBody.replace(",", " ").split()[0:entryCount]]
+	
+	# Returns the bytes of the first entryCount entries of an array written as 
+	# zero-padded hex numbers of entryBytes bytes, decoded in a single pass.
+	def getHexBytes(self, arrayId, entryCount, entryBytes):
+		if entryCount == 0:
+			return bytearray()
+		hexDigits = "".join(self.mArrays[arrayId].replace("0x", " ").replace(",", " ").split())
+		arrayBytes = bytearray(binascii.unhexlify(hexDigits[0:entryCount * entryBytes * 2]))
+		if len(arrayBytes) != entryCount * entryBytes:
+			raise ValueError("Array {0} is shorter than its size.".format(arrayId))
+		return arrayBytes
+	
+	def getPatternId(self):
+		return self.mPatternId
+	
+	def getTotalLeds(self):
+		return self.mTotalLeds
+	
+	# Number of frames shown by the player, in-between frames included.
+	def getShownFrameCount(self):
+		return len(self.mFrameIds) + sum(self.mFrameTweens or [])
+	
+	# Milliseconds the pattern plays for.
+	def getPatternDuration(self):
+		frameTweens = self.mFrameTweens or [0] * len(self.mFrameIds)
+		return sum(self.getFrameDuration(framePos) * (1 + frameTweens[framePos]) 
+			for framePos in range(0, len(self.mFrameIds)))
+	
+	# Type of the frame at framePos.
+	def getFrameType(self, framePos):
+		if self.mFrameTypes is not None:
+			return self.mFrameTypes[framePos]
+		if self.mPalette is not None:
+			if len(self.mPalette) // 3 <= PALETTE_4_MAX_COLORS:
+				return FRAME_TYPE_PALETTE_4
+			return FRAME_TYPE_PALETTE_8
+		if self.mNativeOrder is not None:
+			return FRAME_TYPE_NATIVE
+		return FRAME_TYPE_FULL
+	
+	# Milliseconds the frame at framePos (and each of its in-between frames) is shown for.
+	def getFrameDuration(self, framePos):
+		if self.mFrameDurations is None:
+			return self.mDelay
+		return self.mFrameDurations[framePos]
+	
+	# Yields (packed RGB bytes of every LED of the strip, milliseconds shown, 
+	# True for in-between frames) for every frame the player shows, in order.
+	# Frames already on the strip are held instead of drawn again, like the player does.
+	# The strip starts off, or with the packed RGB bytes of what the sketch drew before 
+	# playPattern(). The first frame of a pass is always drawn over it.
+	def iterShownFrames(self, startRgb = None):
+		stripRgb = bytearray(self.mTotalLeds * 3)
+		if startRgb is not None:
+			stripRgb[:] = startRgb
+		shownFrameId = None
+		for framePos, frameId in enumerate(self.mFrameIds):
+			frameDuration = self.getFrameDuration(framePos)
+			tweenSteps = 0
+			if self.mFrameTweens is not None:
+				tweenSteps = self.mFrameTweens[framePos]
+			if frameId != shownFrameId or tweenSteps > 0:
+				self.renderFrame(framePos, stripRgb)
+				shownFrameId = frameId
+			yield bytes(stripRgb), frameDuration, False
+			
+			if tweenSteps == 0:
+				continue
+			# In-between frames fade from the colors of this frame to the next one.
+			fromRgb = self.decodeFullFrame(framePos)
+			toRgb = self.decodeFullFrame(framePos + 1)
+			for tween in range(1, tweenSteps + 1):
+				self.setLedColors(stripRgb, self.getTweenRgb(fromRgb, toRgb, tween, tweenSteps + 1))
+				shownFrameId = None
+				yield bytes(stripRgb), frameDuration, True
+	
+	# Writes the LEDs stored for the frame at framePos into the strip.
+	def renderFrame(self, framePos, stripRgb):
+		frameId = self.mFrameIds[framePos]
+		frameSize = self.mFrameSizes[framePos]
+		frameType = self.getFrameType(framePos)
+		if frameType == FRAME_TYPE_DELTA:
+			deltaEntries = self.getEntries(frameId, frameSize)
+			for entryPos in range(0, len(deltaEntries), 2):
+				self.setLedColor(stripRgb, deltaEntries[entryPos], deltaEntries[entryPos + 1])
+		elif frameType == FRAME_TYPE_RLE:
+			# Every run is a length byte and the 3 bytes of its color, 
+			# the colors are split off and repeated in a single pass.
+			runEntries = self.getHexBytes(frameId, frameSize, 4)
+			runColors = bytearray(frameSize * 3)
+			for channel in range(0, 3):
+				runColors[channel::3] = runEntries[channel + 1::4]
+			runColors = struct.unpack("3s" * frameSize, bytes(runColors))
+			self.setLedColors(stripRgb, b"".join(map(operator.mul, runColors, runEntries[0::4])))
+		else:
+			self.setLedColors(stripRgb, self.decodeFullFrame(framePos))
+	
+	# Returns the colors of the in-between frame at the given step of the fade 
+	# between two frames, every channel rounded the way the player does.
+	def getTweenRgb(self, fromRgb, toRgb, tween, steps):
+		return bytearray(self.getTweenChannel(fromChannel, toChannel, tween, steps) 
+			for fromChannel, toChannel in zip(fromRgb, toRgb))
+	
+	# Color channel at the given step of the fade between two channel values.
+	def getTweenChannel(self, fromChannel, toChannel, tween, steps):
+		if toChannel >= fromChannel:
+			return fromChannel + ((toChannel - fromChannel) * tween * 2 + steps) // (steps * 2)
+		return fromChannel - ((fromChannel - toChannel) * tween * 2 + steps) // (steps * 2)
+	
+	# Returns the packed RGB bytes of every LED of a frame stored with a color 
+	# of its own per LED (full, palette and native frames).
+	def decodeFullFrame(self, framePos):
+		frameId = self.mFrameIds[framePos]
+		if self.mDecodedFrame is not None and self.mDecodedFrame[0] == frameId:
+			return self.mDecodedFrame[1]
+		frameSize = self.mFrameSizes[framePos]
+		frameType = self.getFrameType(framePos)
+		if frameType == FRAME_TYPE_NATIVE:
+			nativeBytes = self.getHexBytes(frameId, frameSize, 3)
+			frameRgb = bytearray(len(nativeBytes))
+			for bytePos, channel in enumerate(self.mNativeOrder):
+				frameRgb["RGB".index(channel)::3] = nativeBytes[bytePos::3]
+		elif frameType in (FRAME_TYPE_PALETTE_8, FRAME_TYPE_PALETTE_4):
+			if frameType == FRAME_TYPE_PALETTE_8:
+				colorIndices = self.getEntries(frameId, frameSize)
+			else:
+				packedIndices = self.getHexBytes(frameId, (frameSize + 1) // 2, 1)
+				colorIndices = [0] * (len(packedIndices) * 2)
+				colorIndices[0::2] = [packedIndex >> 4 for packedIndex in packedIndices]
+				colorIndices[1::2] = [packedIndex & 0x0F for packedIndex in packedIndices]
+				colorIndices = colorIndices[0:frameSize]
+			paletteColors = [bytes(self.mPalette[colorIndex * 3:colorIndex * 3 + 3]) 
+				for colorIndex in range(0, len(self.mPalette) // 3)]
+			frameRgb = bytearray(b"".join(map(paletteColors.__getitem__, colorIndices)))
+		elif self.mDataType == "uint16_t":
+			rgb565Words = self.getHexBytes(frameId, frameSize, 2)
+			frameRgb = bytearray(b"".join(map(self.getRgb565Colors().__getitem__, 
+				struct.unpack(">{0}H".format(frameSize), bytes(rgb565Words)))))
+		else:
+			# 32-bit entries are written as 0xRRGGBB, packed 24-bit ones as 3 bytes.
+			frameRgb = self.getHexBytes(frameId, frameSize, 3)
+		self.mDecodedFrame = (frameId, frameRgb)
+		return frameRgb
+	
+	# Packed RGB bytes of every RGB565 value, the top bits repeated 
+	# in the low bits the way the player expands them.
+	def getRgb565Colors(self):
+		if self.mRgb565Colors is None:
+			self.mRgb565Colors = []
+			for rgb565 in range(0, 0x10000):
+				red = (rgb565 >> 8) & 0xF8
+				green = (rgb565 >> 3) & 0xFC
+				blue = (rgb565 << 3) & 0xF8
+				self.mRgb565Colors.append(bytes(bytearray((red | (red >> 5), green | (green >> 6), blue | (blue >> 5)))))
+		return self.mRgb565Colors
+	
+	# Sets the color (0xRRGGBB) of an LED, LEDs past the end of the strip are ignored.
+	def setLedColor(self, stripRgb, ledPos, color):
+		if ledPos < self.mTotalLeds:
+			stripRgb[ledPos * 3:ledPos * 3 + 3] = bytearray(((color >> 16) & 0xFF, (color >> 8) & 0xFF, color & 0xFF))
+	
+	# Sets the colors of the first LEDs of the strip from packed RGB bytes.
+	def setLedColors(self, stripRgb, ledRgb):
+		ledBytes = min(len(ledRgb), len(stripRgb))
+		stripRgb[0:ledBytes] = ledRgb[0:ledBytes]
+	
+	# Plays the pattern along the frames it was generated from (see 
+	# AdafruitNeoPixelStripCodeGenerator.getPlayerRgb) and raises a ValueError 
+	# at the first LED that doesn't show the color of its frame. Each source frame 
+	# is checked against what the strip shows when the frame starts, so merged 
+	# frames and in-between frames are checked against every frame they replace. 
+	# In-between frames can be off by the tween tolerance. Returns the frames checked.
+	# See iterShownFrames for startRgb.
+	def verifyFrames(self, ledFrames, codeGenerator, frameProgress = None, startRgb = None):
+		shownFrames = self.iterShownFrames(startRgb)
+		shownRgb, shownEnd, shownTween = None, 0, False
+		frameStart = 0
+		checkedFrames = 0
+		for frame in ledFrames:
+			while frameStart >= shownEnd:
+				shownFrame = next(shownFrames, None)
+				if shownFrame is None:
+					raise ValueError("The generated pattern ends after {0} ms, before frame {1}.".format(
+						shownEnd, frame.frameId))
+				shownRgb, shownDuration, shownTween = shownFrame
+				shownEnd += shownDuration
+			
+			startTime = time.time()
+			frameRgb = codeGenerator.getPlayerRgb(frame)[0:len(shownRgb)]
+			ledRgb = bytearray(shownRgb[0:len(frameRgb)])
+			if ledRgb != frameRgb:
+				tolerance = 0
+				if shownTween:
+					tolerance = codeGenerator.mTweenTolerance
+				for channelPos, (ledChannel, frameChannel) in enumerate(zip(ledRgb, frameRgb)):
+					if abs(ledChannel - frameChannel) > tolerance:
+						ledStart = channelPos - channelPos % 3
+						raise ValueError("Frame {0} differs from the generated pattern at {1} ms: LED {2} "
+							"shows #{3} instead of #{4}.".format(frame.frameId, frameStart, ledStart // 3, 
+							binascii.hexlify(bytes(ledRgb[ledStart:ledStart + 3])).decode("ascii"), 
+							binascii.hexlify(bytes(frameRgb[ledStart:ledStart + 3])).decode("ascii")))
+			addStageTime("verify", startTime)
+			
+			frameStart += codeGenerator.getFrameDuration(frame)
+			checkedFrames += 1
+			if frameProgress is not None:
+				frameProgress.frameDone()
+		
+		if next(shownFrames, None) is not None or shownEnd != frameStart:
+			raise ValueError("The generated pattern plays for {0} ms instead of {1} ms.".format(
+				self.getPatternDuration(), frameStart))
+		return checkedFrames
+
+'''
+Plays the frames of a pattern file (see PatternFile) the way LedPatternEmulator 
+plays generated code, so a pattern can be previewed before generating its code. 
+Frames are read from the map one at a time and put in LED order by the layout, 
+their colors dimmed by their alpha like the code generators do.
+'''
+class PatternFileEmulator:
+	
+	mPath = None
+	mLedLayout = None
+	mDelay = None
+	mPatternId = None
+	mWidth = None
+	mHeight = None
+	mTotalLeds = None
+	# Milliseconds every frame is shown for.
+	mFrameDurations = None
+	# Code generator with the default colors, dims the frames by their alpha.
+	mColorGenerator = None
+	
+	def __init__(self, path, ledLayout, frameDelay):
+		self.mPath = path
+		self.mLedLayout = ledLayout
+		self.mDelay = frameDelay
+		patternFile = PatternFile(path)
+		try:
+			self.mPatternId = nameToConst(patternFile.getName())
+			self.mWidth = patternFile.getWidth()
+			self.mHeight = patternFile.getHeight()
+			self.mTotalLeds = ledLayout.getLedCount(self.mWidth, self.mHeight)
+			self.mFrameDurations = [patternFile.getFrameDuration(framePos) 
+				for framePos in range(0, patternFile.getFrameCount())]
+		finally:
+			patternFile.close()
+		self.mColorGenerator = AdafruitNeoPixelStripCodeGenerator({KEY_PATTERN_ID: self.mPatternId}, 
+			self.mPatternId, os.path.dirname(path))
+	
+	def getPatternId(self):
+		return self.mPatternId
+	
+	def getWidth(self):
+		return self.mWidth
+	
+	def getHeight(self):
+		return self.mHeight
+	
+	def getTotalLeds(self):
+		return self.mTotalLeds
+	
+	def getShownFrameCount(self):
+		return len(self.mFrameDurations)
+	
+	def getFrameDuration(self, framePos):
+		if self.mFrameDurations[framePos] is None:
+			return self.mDelay
+		return self.mFrameDurations[framePos]
+	
+	def getPatternDuration(self):
+		return sum(self.getFrameDuration(framePos) for framePos in range(0, len(self.mFrameDurations)))
+	
+	# Yields (packed RGB bytes of every LED of the strip, milliseconds shown, False) 
+	# for every frame of the file. See LedPatternEmulator.iterShownFrames.
+	def iterShownFrames(self, startRgb = None):
+		stripRgb = bytearray(self.mTotalLeds * 3)
+		if startRgb is not None:
+			stripRgb[:] = startRgb
+		patternFile = PatternFile(self.mPath)
+		try:
+			for framePos in range(0, patternFile.getFrameCount()):
+				frameRgb = self.mColorGenerator.getFrameRgb(patternFile.readFrame(framePos, self.mLedLayout))
+				ledBytes = min(len(frameRgb), len(stripRgb))
+				stripRgb[0:ledBytes] = frameRgb[0:ledBytes]
+				yield bytes(stripRgb), self.getFrameDuration(framePos), False
+		finally:
+			patternFile.close()
+
+'''
+Draws the frames of an emulated pattern on the grid of LEDs they came from. 
+The LEDs are put back on the grid through the layout (mapping, rotation and 
+reversed rows) and every LED is drawn as a square. The LED drawn at every 
+pixel of the preview is looked up once, so drawing a frame is a single 
+gather over the colors of its LEDs.
+'''
+class PatternPreview:
+	
+	mGridWidth = None
+	mGridHeight = None
+	mLedCount = None
+	# Side in pixels of the square of each LED.
+	mLedSize = None
+	# Only every mFrameStep frame is drawn.
+	mFrameStep = 1
+	mImageWidth = None
+	mImageHeight = None
+	mGather = None
+	
+	def __init__(self, ledLayout, gridWidth, gridHeight, ledCount, frameCount):
+		self.mGridWidth = gridWidth
+		self.mGridHeight = gridHeight
+		self.mLedCount = ledCount
+		gridPixels = max(1, gridWidth * gridHeight)
+		self.mLedSize = PREVIEW_LED_SIZE
+		while self.mLedSize > 1 and gridPixels * self.mLedSize * self.mLedSize * frameCount > PREVIEW_MAX_PIXELS:
+			self.mLedSize -= 1
+		self.mFrameStep = max(1, -(-gridPixels * frameCount // PREVIEW_MAX_PIXELS))
+		self.mImageWidth = gridWidth * self.mLedSize
+		self.mImageHeight = gridHeight * self.mLedSize
+		
+		# LED drawn at every pixel of the grid, ledCount (the grid color) for pixels without one.
+		pixelLeds = [ledCount] * (gridWidth * gridHeight)
+		ledPixels = ledLayout.getLedPixels(gridWidth, gridHeight)
+		if ledPixels is None:
+			ledPixels = range(0, gridWidth * gridHeight)
+		for ledPos, pixelIndex in enumerate(ledPixels):
+			if ledPos < ledCount and pixelIndex != NO_PIXEL:
+				pixelLeds[pixelIndex] = ledPos
+		
+		# Squares of LED size leave their last row and column for the grid.
+		squarePixels = [squarePos < self.mLedSize - 1 or self.mLedSize < 3 for squarePos in range(0, self.mLedSize)]
+		imageLeds = []
+		for imageY in range(0, self.mImageHeight):
+			rowLeds = pixelLeds[(imageY // self.mLedSize) * gridWidth:(imageY // self.mLedSize + 1) * gridWidth]
+			if not squarePixels[imageY % self.mLedSize]:
+				imageLeds.extend([ledCount] * self.mImageWidth)
+				continue
+			for imageX in range(0, self.mImageWidth):
+				if squarePixels[imageX % self.mLedSize]:
+					imageLeds.append(rowLeds[imageX // self.mLedSize])
+				else:
+					imageLeds.append(ledCount)
+		self.mGather = operator.itemgetter(*imageLeds)
+	
+	# Returns the color of every LED as a 0x00BBGGRR number from their packed 
+	# RGB bytes, followed by the grid color for the pixels without an LED.
+	def getLedWords(self, ledRgb):
+		ledWords = bytearray(self.mLedCount * 4)
+		ledRgb = ledRgb[0:self.mLedCount * 3]
+		for channel in range(0, 3):
+			ledWords[channel:len(ledRgb) // 3 * 4:4] = ledRgb[channel::3]
+		gridColor = PREVIEW_GRID_COLOR
+		ledWords.extend(bytearray((gridColor >> 16, (gridColor >> 8) & 0xFF, gridColor & 0xFF, 0)))
+		return struct.unpack("<{0}I".format(self.mLedCount + 1), bytes(ledWords))
+	
+	# Returns the value of every pixel of the preview from the values of the LEDs.
+	def gatherPixels(self, ledValues):
+		imageValues = self.mGather(ledValues)
+		if self.mImageWidth * self.mImageHeight == 1:
+			return (imageValues,)
+		return imageValues
+	
+	# Returns the packed RGB bytes of colors given as 0x00BBGGRR numbers.
+	def getWordsRgb(self, colorWords):
+		wordBytes = struct.pack("<{0}I".format(len(colorWords)), *colorWords)
+		colorsRgb = bytearray(len(colorWords) * 3)
+		for channel in range(0, 3):
+			colorsRgb[channel::3] = wordBytes[channel::4]
+		return colorsRgb
+	
+	# Returns the packed RGB bytes of the preview of a frame from the packed RGB bytes of its LEDs.
+	def drawFrame(self, ledRgb):
+		return self.getWordsRgb(self.gatherPixels(self.getLedWords(ledRgb)))
+	
+	# Returns the preview of a frame as (palette index of every pixel, packed RGB 
+	# bytes of the palette). Frames with more than 256 colors are reduced to 256.
+	def drawIndexedFrame(self, ledRgb):
+		ledWords = self.getLedWords(ledRgb)
+		paletteWords = sorted(set(ledWords))
+		if len(paletteWords) > 256:
+			ledIndices, paletteRgb = self.reduceLedColors(ledWords)
+		else:
+			paletteIndices = dict(zip(paletteWords, range(0, len(paletteWords))))
+			ledIndices = tuple(map(paletteIndices.__getitem__, ledWords))
+			paletteRgb = self.getWordsRgb(paletteWords)
+		return bytearray(self.gatherPixels(ledIndices)), paletteRgb
+	
+	# Reduces the colors of the LEDs to a palette of 256 with Pillow. Only the LEDs 
+	# are reduced, not the pixels of the preview, which would take far longer.
+	# Returns (palette index of every LED, packed RGB bytes of the palette).
+	def reduceLedColors(self, ledWords):
+		from PIL import Image
+		ledImage = Image.frombytes("RGB", (len(ledWords), 1), bytes(self.getWordsRgb(ledWords)))
+		ledImage = ledImage.quantize(256, method = Image.FASTOCTREE)
+		return tuple(bytearray(ledImage.tobytes())), bytearray(ledImage.getpalette())
+	
+	# Yields the (preview drawn by drawFrame, milliseconds shown) of the frames 
+	# drawn, frames left out add their time to the frame drawn before them.
+	def iterDrawnFrames(self, shownFrames, drawFrame, frameProgress = None):
+		drawnFrame = None
+		for framePos, (ledRgb, duration, tween) in enumerate(shownFrames):
+			if framePos % self.mFrameStep == 0:
+				if drawnFrame is not None:
+					yield drawnFrame
+				startTime = time.time()
+				drawnFrame = [drawFrame(ledRgb), 0]
+				addStageTime("preview", startTime)
+			drawnFrame[1] += duration
+			if frameProgress is not None:
+				frameProgress.frameDone()
+		if drawnFrame is not None:
+			yield drawnFrame
+	
+	# Writes the frames as an animated GIF that loops forever, every frame 
+	# with a palette of its own. GIF frames are timed in hundredths of a second.
+	def writeGif(self, path, shownFrames, frameProgress = None):
+		try:
+			from PIL import Image
+		except ImportError:
+			raise ValueError("Animated GIF previews need the Pillow package, use a PNG contact sheet instead.")
+		imageSize = (self.mImageWidth, self.mImageHeight)
+		frameImages = []
+		frameDurations = []
+		for (imageIndices, paletteRgb), duration in self.iterDrawnFrames(shownFrames, self.drawIndexedFrame, frameProgress):
+			frameImage = Image.frombytes("P", imageSize, bytes(imageIndices))
+			frameImage.putpalette(bytes(paletteRgb))
+			frameImages.append(frameImage)
+			frameDurations.append(duration)
+		startTime = time.time()
+		frameImages[0].save(path, save_all = True, append_images = frameImages[1:], duration = frameDurations, loop = 0)
+		addStageTime("preview", startTime)
+	
+	# Writes the frames side by side in rows, as a PNG about as wide as it is tall.
+	def writeContactSheet(self, path, shownFrames, frameCount, frameProgress = None):
+		drawnCount = -(-frameCount // self.mFrameStep)
+		spacing = max(1, self.mLedSize)
+		columns = max(1, min(drawnCount, int(math.ceil(math.sqrt(drawnCount * self.mImageHeight / float(self.mImageWidth))))))
+		sheetWidth = columns * (self.mImageWidth + spacing) - spacing
+		rowCount = -(-drawnCount // columns)
+		sheetHeight = rowCount * (self.mImageHeight + spacing) - spacing
+		drawnFrames = self.iterDrawnFrames(shownFrames, self.drawFrame, frameProgress)
+		writePngFile(path, sheetWidth, sheetHeight, self.iterSheetRows(drawnFrames, columns, rowCount, spacing, sheetWidth))
+	
+	# Yields the rows of pixels of a contact sheet, spacing pixels of grid between the frames.
+	def iterSheetRows(self, drawnFrames, columns, rowCount, spacing, sheetWidth):
+		gridColor = PREVIEW_GRID_COLOR
+		gridRgb = bytearray((gridColor >> 16, (gridColor >> 8) & 0xFF, gridColor & 0xFF))
+		spacingRgb = gridRgb * spacing
+		imageRowBytes = self.mImageWidth * 3
+		for rowPos in range(0, rowCount):
+			rowImages = [imageRgb for imageRgb, duration in itertools.islice(drawnFrames, columns)]
+			if rowPos > 0:
+				for spacingRow in range(0, spacing):
+					yield gridRgb * sheetWidth
+			for imageY in range(0, self.mImageHeight):
+				sheetRow = spacingRgb.join([imageRgb[imageY * imageRowBytes:(imageY + 1) * imageRowBytes] 
+					for imageRgb in rowImages])
+				yield sheetRow + gridRgb * (sheetWidth - len(sheetRow) // 3)
+
+# Returns the path of the preview of a pattern next to its generated code.
+def getPreviewPath(outDir, patternId, previewType):
+	return os.path.join(outDir, "Pattern_{0}_Preview{1}".format(patternId, ".gif" if previewType == PREVIEW_GIF else ".png"))
+
+# Plays back a generated pattern and writes its preview next to it. 
+# The LEDs are drawn on a grid of gridWidth x gridHeight pixels laid out by ledLayout. 
+# Returns the summary of the preview.
+def writePatternPreview(emulator, ledLayout, gridWidth, gridHeight, outDir, previewType, progress):
+	frameCount = emulator.getShownFrameCount()
+	patternPreview = PatternPreview(ledLayout, gridWidth, gridHeight, emulator.getTotalLeds(), frameCount)
+	previewPath = getPreviewPath(outDir, emulator.getPatternId(), previewType)
+	frameProgress = FrameProgress(progress, frameCount, "Drawing preview...")
+	progress.setText("Drawing preview...")
+	if previewType == PREVIEW_GIF:
+		patternPreview.writeGif(previewPath, emulator.iterShownFrames(), frameProgress)
+	else:
+		patternPreview.writeContactSheet(previewPath, emulator.iterShownFrames(), frameCount, frameProgress)
+	
+	summary = "Preview of {0} frames ({1:.1f}s) written to {2}".format(frameCount, 
+		emulator.getPatternDuration() / 1000.0, os.path.basename(previewPath))
+	if patternPreview.mFrameStep > 1:
+		summary += ", every {0} frames drawn".format(patternPreview.mFrameStep)
+	return summary + "."
+
+# Plays back a pattern generated before (Pattern_<NAME>.h) and writes its preview. 
+# See writePatternPreview, the grid is a strip of all the LEDs without gridSize.
+def previewPatternCode(headerPath, ledLayout, gridSize, outDir, previewType, progress):
+	progress.setText("Reading generated code...")
+	emulator = LedPatternEmulator(headerPath)
+	gridWidth, gridHeight = gridSize or (emulator.getTotalLeds(), 1)
+	writeEmulatorPreview(emulator, ledLayout, gridWidth, gridHeight, outDir, previewType, progress)
+
+# Plays the frames of a pattern file and writes their preview, without generating code. 
+# The grid is the size of the pattern.
+def previewPatternFile(patternPath, ledLayout, frameDelay, outDir, previewType, progress):
+	progress.setText("Reading pattern file...")
+	emulator = PatternFileEmulator(patternPath, ledLayout, frameDelay)
+	writeEmulatorPreview(emulator, ledLayout, emulator.getWidth(), emulator.getHeight(), outDir, previewType, progress)
+
+# Writes the preview of an emulator and reports it as done.
+def writeEmulatorPreview(emulator, ledLayout, gridWidth, gridHeight, outDir, previewType, progress):
+	doneText = "Preview Done! " + writePatternPreview(emulator, ledLayout, gridWidth, gridHeight, outDir, previewType, progress)
+	progress.update(1.0)
+	progress.setText(doneText)
+	progress.end()
+
+'''
+End: Pattern Emulator
+'''
+
+		
+'''
+Command Line
+'''
+# Command line names of the frame encoding choices.
+COMMAND_LINE_ENCODINGS = {
+	"full": ENCODING_FULL,
+	"delta": ENCODING_DELTA,
+	"rle": ENCODING_RLE,
+	"palette": ENCODING_PALETTE,
+	"native": ENCODING_NATIVE,
+	"auto": ENCODING_AUTO
+}
+
+# Command line names of the color format choices.
+COMMAND_LINE_COLOR_FORMATS = {
+	"rgb32": COLOR_FORMAT_RGB32,
+	"rgb24": COLOR_FORMAT_RGB24,
+	"rgb565": COLOR_FORMAT_RGB565,
+	"rgb565-dither": COLOR_FORMAT_RGB565_DITHER
+}
+
+# Command line names of the player choices.
+COMMAND_LINE_PLAYERS = {
+	"blocking": PLAYER_BLOCKING,
+	"non-blocking": PLAYER_NON_BLOCKING
+}
+
+# Command line names of the profiling report choices.
+COMMAND_LINE_PROFILE_REPORTS = {
+	"none": PROFILE_REPORT_NONE,
+	"json": PROFILE_REPORT_JSON,
+	"csv": PROFILE_REPORT_CSV
+}
+
+# Command line names of the preview choices.
+COMMAND_LINE_PREVIEWS = {
+	"none": PREVIEW_NONE,
+	"gif": PREVIEW_GIF,
+	"png": PREVIEW_PNG
+}
+
+# Parses the WIDTHxHEIGHT size of an LED grid given on the command line.
+def parseGridSize(text):
+	import argparse
+	sizeMatch = re.match(r"^(\d+)x(\d+)$", text.lower())
+	if sizeMatch is None or int(sizeMatch.group(1)) == 0 or int(sizeMatch.group(2)) == 0:
+		raise argparse.ArgumentTypeError("'{0}' is not a WIDTHxHEIGHT size.".format(text))
+	return int(sizeMatch.group(1)), int(sizeMatch.group(2))
+
+# Generates the patterns from image files without GIMP. 
+# Every input (directory of PNG frames, JSON frame manifest or 
+# multi-page image file) generates one pattern. Returns the exit code.
+def runCommandLine(arguments):
+	import argparse
+	parser = argparse.ArgumentParser(description="Generates LED patterns from image frames without GIMP.")
+	parser.add_argument("inputs", nargs="+", 
+		help="Directory of PNG frames, JSON frame manifest, pattern file (.ledpattern) or (multi-page) image file. "
+		"One pattern is generated per input. Generated patterns (Pattern_<NAME>.h) are played back and previewed instead.")
+	parser.add_argument("-o", "--out", default=os.getcwd(), 
+		help="Directory where the code will be placed (default: current directory).")
+	parser.add_argument("--delay", type=int, default=200, 
+		help="Delay in milliseconds of each frame (default: 200).")
+	parser.add_argument("--row-order", choices=sorted(ROW_ORDER_NAMES), default="standard", 
+		help="Order in which the pixels of each row map to LEDs (default: standard).")
+	parser.add_argument("--wiring", choices=sorted(LED_WIRING_NAMES), default="rows", 
+		help="Whether the LEDs follow the rows or the columns of the matrix (default: rows).")
+	parser.add_argument("--rotation", type=int, choices=LED_ROTATIONS, default=0, 
+		help="Clockwise rotation of the matrix, the first LED is in the top left corner once rotated (default: 0).")
+	parser.add_argument("--led-map", 
+		help="CSV or JSON file mapping the pixels to the LEDs, replaces --row-order, --wiring and --rotation.")
+	parser.add_argument("--led-pin", type=int, default=6, 
+		help="Pin on the board where the LEDs are connected (default: 6).")
+	parser.add_argument("--encoding", choices=sorted(COMMAND_LINE_ENCODINGS), default="full", 
+		help="How the frames are stored in the generated code (default: full).")
+	parser.add_argument("--color-format", choices=sorted(COMMAND_LINE_COLOR_FORMATS), default="rgb32", 
+		help="How the colors of full frames are stored: 32-bit, packed 24-bit or 16-bit RGB565 (default: rgb32).")
+	parser.add_argument("--color-order", choices=[colorOrder.lower() for colorOrder in LED_COLOR_ORDERS], default="grb", 
+		help="Color order of the strip (NEO_GRB, ...) used to store native frames (default: grb).")
+	parser.add_argument("--gamma", type=float, default=GAMMA_NONE, 
+		help="Gamma correction applied to the colors when generating, about 2.2-2.8 for even fades (default: 1.0, none).")
+	parser.add_argument("--brightness", type=int, default=BRIGHTNESS_FULL, 
+		help="Brightness in percent applied to the colors when generating, instead of strip.setBrightness() (default: 100).")
+	parser.add_argument("--tween", type=int, nargs="?", const=TWEEN_TOLERANCE, metavar="TOLERANCE", 
+		help="Replaces the frames of linear fades by in-between frames computed by the player, full frames only. "
+		"Frames can differ from the computed colors by up to TOLERANCE per color channel (default: {0}).".format(TWEEN_TOLERANCE))
+	parser.add_argument("--board", choices=sorted(BOARD_PROFILES),  
+		help="Board the pattern must fit in, the generation fails if it doesn't (default: not checked).")
+	parser.add_argument("--stream", metavar="PORT",
+		help="Streams the frames to the board on the serial PORT for a live preview instead of generating code. "
+		"The board must run the StreamReceiver_<NAME> sketch written to the output directory.")
+	parser.add_argument("--baud", type=int, choices=STREAM_BAUD_RATES, default=STREAM_BAUD_RATES[0],
+		help="Baud rate of the stream, must match the receiver sketch (default: {0}).".format(STREAM_BAUD_RATES[0]))
+	parser.add_argument("--loops", type=int, default=1,
+		help="Number of times the pattern is streamed (default: 1).")
+	parser.add_argument("--preview", choices=sorted(COMMAND_LINE_PREVIEWS),
+		help="Plays the generated code back and writes it to Pattern_<NAME>_Preview.gif (needs Pillow) "
+		"or a .png contact sheet (default: none, png for Pattern_<NAME>.h inputs).")
+	parser.add_argument("--preview-only", action="store_true",
+		help="Previews {0} inputs from their frames without generating code.".format(PATTERN_FILE_EXTENSION))
+	parser.add_argument("--verify", action="store_true",
+		help="Plays the generated code back and fails if it doesn't show the frames of the input, for CI.")
+	parser.add_argument("--save-pattern", action="store_true",
+		help="Saves the frames read to Pattern_<NAME>{0}, an input that skips reading the images again.".format(
+		PATTERN_FILE_EXTENSION))
+	parser.add_argument("--size", type=parseGridSize, metavar="WIDTHxHEIGHT",
+		help="Size of the LED grid of Pattern_<NAME>.h inputs (default: a strip of all its LEDs).")
+	parser.add_argument("--player", choices=sorted(COMMAND_LINE_PLAYERS), default="blocking", 
+		help="Whether playPattern() blocks until the pattern is done or shows one frame when due and returns (default: blocking).")
+	parser.add_argument("--cache-dir", default=FRAME_CACHE_DIR, 
+		help="Directory of the cache of extracted and encoded frames (default: {0}).".format(FRAME_CACHE_DIR))
+	parser.add_argument("--cache-size", type=int, default=FRAME_CACHE_MAX_BYTES // (1024 * 1024), 
+		help="Size limit of the frame cache in MB (default: {0}).".format(FRAME_CACHE_MAX_BYTES // (1024 * 1024)))
+	parser.add_argument("--cache", action="store_true", 
+		help="Reuses the frames extracted and encoded by previous runs from the frame cache, and caches the new ones.")
+	parser.add_argument("-j", "--workers", type=int, default=1, 
+		help="Worker processes used to read and encode the frames, 0 uses one per CPU core (default: 1).")
+	parser.add_argument("--profile-report", choices=sorted(COMMAND_LINE_PROFILE_REPORTS), default="none", 
+		help="Writes the timings and counters of each stage to Pattern_<NAME>_Profile.json/.csv (default: none).")
+	parser.add_argument("--cprofile", action="store_true", 
+		help="Runs the generation under cProfile and writes its stats to Pattern_<NAME>_Profile.prof.")
+	options = parser.parse_args(arguments)
+	if options.delay < 0:
+		parser.error("--delay can't be negative.")
+	if options.gamma <= 0:
+		parser.error("--gamma must be more than 0.")
+	if not 0 < options.brightness <= 100:
+		parser.error("--brightness must be between 1 and 100.")
+	if options.tween is not None and not 0 < options.tween <= 255:
+		parser.error("--tween tolerance must be between 1 and 255.")
+	if options.loops < 1:
+		parser.error("--loops must be at least 1.")
+	if options.stream is not None and (options.verify or options.preview not in (None, "none")):
+		parser.error("--verify and --preview play the generated code back, they can't be used with --stream.")
 		
-register(
-    "python_fu_code_minion_led_pattern_generator",
-    #"Python-Fu: LED Pattern Generator",
-	"Generates LED pattern from Image",
-    """Uses the pixels in the current image to generate an LED pattern for Arduino. Layers will be used as frames in the pattern and only visible layers are used. Layer Groups are also supported and will be included in the final patten if visible. 
+	if not os.path.isdir(options.out):
+		os.makedirs(options.out)
+	
+	try:
+		ledLayout = createLedLayout(ROW_ORDER_NAMES[options.row_order], 
+			LED_WIRING_NAMES[options.wiring], options.rotation, options.led_map)
+	except (IOError, OSError, ValueError) as error:
+		# The errors of layout files name the file.
+		sys.stderr.write("{0}\n".format(error))
+		return 1
+	
+	frameCache = None
+	if options.cache:
+		frameCache = FrameCache(options.cache_dir, options.cache_size * 1024 * 1024)
+	ledType = CHOICE_ADAFRUIT_NEOPIXEL_ARDUINO
+	if options.stream is not None:
+		ledType = CHOICE_SERIAL_STREAM
+	
+	for inputPath in options.inputs:
+		try:
+			if inputPath.endswith(".h"):
+				# Code generated before is played back and previewed.
+				previewPatternCode(inputPath, ledLayout, options.size, options.out, 
+					COMMAND_LINE_PREVIEWS[options.preview or "png"], ConsoleProgress(os.path.basename(inputPath)))
+				continue
+			if options.preview_only and inputPath.endswith(PATTERN_FILE_EXTENSION):
+				# Frames saved before are previewed as they are.
+				previewPatternFile(inputPath, ledLayout, options.delay, options.out, 
+					COMMAND_LINE_PREVIEWS[options.preview or "png"], ConsoleProgress(os.path.basename(inputPath)))
+				continue
+			imageSource = createImageSource(inputPath)
+			generateLedPatternFromSource(imageSource, ledType,  
+				options.delay, ledLayout, options.led_pin, 
+				COMMAND_LINE_ENCODINGS[options.encoding], options.out, ConsoleProgress(imageSource.getName()), 
+				profileDump = options.cprofile, workers = options.workers, frameCache = frameCache, 
+				profileReport = COMMAND_LINE_PROFILE_REPORTS[options.profile_report], 
+				player = COMMAND_LINE_PLAYERS[options.player], colorOrder = options.color_order.upper(), 
+				colorFormat = COMMAND_LINE_COLOR_FORMATS[options.color_format], board = options.board, 
+				gamma = options.gamma, brightness = options.brightness, tweenTolerance = options.tween, 
+				streamPort = options.stream, streamBaud = options.baud, streamLoops = options.loops, 
+				preview = COMMAND_LINE_PREVIEWS[options.preview or "none"], verify = options.verify, 
+				savePattern = options.save_pattern)
+		except (IOError, OSError, ValueError) as error:
+			sys.stderr.write("{0}: {1}\n".format(inputPath, error))
+			return 1
+	return 0
+
+if GIMP_AVAILABLE:
+	register(
+	    "python_fu_code_minion_led_pattern_generator",
+	    #"Python-Fu: LED Pattern Generator",
+		"Generates LED pattern from Image",
+	    """Uses the pixels in the current image to generate an LED pattern for Arduino. Layers will be used as frames in the pattern and only visible layers are used. Layer Groups are also supported and will be included in the final patten if visible. 
 	
 UI Fields Help
 LED Type: Type of LEDs for which to generated the code for. 
 - Currently supporting: 
 -- Adafruit NeoPixel for Arduino
+-- Serial Stream (Live Preview): Instead of generating code, the frames are streamed to an Adafruit NeoPixel strip on a board connected to the Stream Serial Port. Upload the StreamReceiver_<NAME> sketch written to the Directory to the board first.
 	
 Image: The GIMP image to use as an imput for the generation of the LED pattern. 
 	
@@ -752,25 +5587,102 @@ Row Order Type: This is the order in which the pixels translated to LED position
 -- Flip Odd: This will flip the order of the pixels in the odd rows. First pixel will mapped to last LED and last pixel will map to the first LED.
 -- Flip Even: This will flip the order of the pixels in the even rows. First pixel will mapped to last LED and last pixel will map to the first LED.
 	
+LED Wiring: Whether the LEDs follow the rows (default) or the columns of the matrix. Row Ordering then flips the odd/even columns instead.
+	
+Matrix Rotation: Clockwise rotation of the matrix. The first LED is the top left corner of the rotated matrix.
+	
+LED Map File: CSV or JSON file with the LED index of each pixel, or a list of tiled panels with their own orientation. When set it replaces Row Ordering, LED Wiring and Matrix Rotation.
+	
+Frame Encoding: How the frames are stored in the generated code.
+- Currently supporting: 
+-- Full Frames: Every frame stores the color of all its LEDs.
+-- Delta Frames: Only the LEDs that changed from the previous frame are stored. Frames where most LEDs change are still stored in full.
+-- RLE Frames: Runs of LEDs with the same color are stored as a single entry when that makes the frame smaller.
+-- Color Palette: Colors are stored once in a palette and each LED stores the index of its color (4-bit for up to 16 colors, 8-bit for up to 256). Patterns with more colors are stored as full frames.
+-- Native Strip Bytes: Frames are stored as 3 bytes per LED in the color order of the strip and copied into the strip with a single memcpy_P. strip.setBrightness() has no effect on them.
+-- Auto (Smallest That Fits): The pattern is measured with Full, Delta, RLE and Palette frames and the smallest one that fits the Board Flash Budget is used.
+	
+Color Format: How the colors of Full Frames are stored, trading color depth for flash.
+- Currently supporting: 
+-- 32-bit: Every LED is a uint32_t (one byte unused).
+-- 24-bit Packed: Every LED takes 3 bytes, same colors with 25% less flash.
+-- 16-bit RGB565: Every LED takes 2 bytes (5 bits red, 6 green, 5 blue), half the flash of 32-bit.
+-- 16-bit RGB565 Dithered: RGB565 with ordered dithering to hide the banding of gradients.
+	
+LED Color Order: Color order of the strip (NEO_GRB, NEO_RGB, ...), used by Native Strip Bytes and the generated ReadMe.
+	
+Gamma Correction: Gamma applied to the colors when generating, 1.0 leaves them as they are. About 2.2-2.8 makes fades look even on LEDs.
+	
+Brightness: Brightness in percent applied to the colors when generating, so the board doesn't need strip.setBrightness() and doesn't scale every LED on each show().
+	
+Board Flash Budget: Board the pattern must fit in. The flash the pattern takes with each encoding is measured before writing any code and the generation stops with an error if it doesn't fit. The bytes of each frame are written to Pattern_<NAME>_Budget.csv.
+	
+Player: How the generated playPattern() plays the pattern.
+- Currently supporting: 
+-- Blocking (delay): playPattern() plays the whole pattern, waiting with delay() between frames.
+-- Non-Blocking (millis): playPattern() is called on every loop(). It shows the next frame once millis() says it is due and returns right away so the sketch keeps running.
+	
+Tween Linear Fades: Frames of linear fades (Full Frames only) are not stored, the player computes them from the frames before and after the fade.
+	
+Tween Tolerance: Largest difference of a color channel (0-255) between a frame and the color the player computes for it.
+	
+Stream Serial Port: Serial port of the board the frames are streamed to (/dev/ttyUSB0, /dev/ttyACM0, COM3, ...).
+	
+Stream Baud Rate: Baud rate of the stream, the receiver sketch is written with the same rate.
+	
+Stream Loops: Number of times the pattern is streamed.
+	
+Preview: Plays the generated code back the way the board would and draws it next to the code as Pattern_<NAME>_Preview.gif (Animated GIF, needs the Pillow package) or .png (PNG Contact Sheet with every frame side by side). The LEDs are drawn where they are on the image.
+	
+Save Intermediate Pattern: Reads the layers once and saves their pixels to Pattern_<NAME>.ledpattern next to the code, the generation then reads them from that file. The file can be given to the command line instead of the image to generate the pattern again with other options, without GIMP.
+	
+Reuse Unchanged Frames: Keeps the encoded frames in a cache so frames that did not change since the last generation are not encoded again.
+	
+Profiling Report: Writes the time spent in each stage of the generation along with the PDB calls, frames, pixels and bytes written to Pattern_<NAME>_Profile.json or .csv next to the generated code.
+	
+cProfile Dump: Runs the generation under cProfile and writes its stats to Pattern_<NAME>_Profile.prof next to the generated code.
+	
 Directory: Directory where the code will be placed once generation is complete. It is recommended to make this your Arduino sketch folder for convenience but not required. 
 	
 	""",
-    "Frank E. Hernandez",
-    "Frank E. Hernandez",
-    "2020",
-    "Generate LED Pattern...",
-    "*",      # Alternately use RGB, RGB*, GRAY*, INDEXED etc. (Options "" for Create a new image, "*" for Any Image" )
-    [
-        (PF_OPTION, "ledType", "LED Type", 0, ("Adafruit NeoPixel", "Coming Soon...")),
-        (PF_IMAGE, "image", "Input image", None),
-        (PF_SPINNER, "frameDelay", "Frame Delay (ms)", 200, (1, 80000, 1)),
-		(PF_OPTION, "rowOrderType", "Row Ordering", 0, ("Standard", "Flip Odd", "Flip Even")),
-        (PF_SPINNER, "ledPin", "LED Pin", 6, (1, 80000, 1)),
-		(PF_DIRNAME, "dir", "Directory", os.getcwd())
-
-		# Python-Fu Type, paramter-name, ui-text, default
-    ],
-    [],
-    generate_led_pattern, menu="<Image>/File/Create" )
-
-main()
\ No newline at end of file
+	    "Frank E. Hernandez",
+	    "Frank E. Hernandez",
+	    "2020",
+	    "Generate LED Pattern...",
+	    "*",      # Alternately use RGB, RGB*, GRAY*, INDEXED etc. (Options "" for Create a new image, "*" for Any Image" )
+	    [
+	        (PF_OPTION, "ledType", "LED Type", 0, ("Adafruit NeoPixel", "Serial Stream (Live Preview)")),
+	        (PF_IMAGE, "image", "Input image", None),
+	        (PF_SPINNER, "frameDelay", "Frame Delay (ms)", 200, (1, 80000, 1)),
+			(PF_OPTION, "rowOrderType", "Row Ordering", 0, ("Standard", "Flip Odd", "Flip Even")),
+			(PF_OPTION, "ledWiring", "LED Wiring", 0, ("Rows", "Columns")),
+			(PF_OPTION, "ledRotation", "Matrix Rotation", 0, ("None", "90 Clockwise", "180", "270 Clockwise")),
+			(PF_FILENAME, "ledMapFile", "LED Map File (Optional)", ""),
+	        (PF_SPINNER, "ledPin", "LED Pin", 6, (1, 80000, 1)),
+			(PF_OPTION, "frameEncoding", "Frame Encoding", 0, ("Full Frames", "Delta Frames", "RLE Frames", "Color Palette", "Native Strip Bytes", "Auto (Smallest That Fits)")),
+			(PF_OPTION, "colorFormat", "Color Format", 0, ("32-bit", "24-bit Packed", "16-bit RGB565", "16-bit RGB565 Dithered")),
+			(PF_OPTION, "colorOrder", "LED Color Order", 0, LED_COLOR_ORDERS),
+			(PF_SPINNER, "gamma", "Gamma Correction", 1.0, (0.1, 4.0, 0.1)),
+			(PF_SLIDER, "brightness", "Brightness (%)", 100, (1, 100, 1)),
+			(PF_OPTION, "boardProfile", "Board Flash Budget", 0, ("None", "Arduino Uno/Nano", "Arduino Leonardo", "Arduino Mega 2560", "ESP8266", "ESP32")),
+			(PF_OPTION, "player", "Player", 0, ("Blocking (delay)", "Non-Blocking (millis)")),
+			(PF_TOGGLE, "tween", "Tween Linear Fades", False),
+			(PF_SPINNER, "tweenTolerance", "Tween Tolerance", TWEEN_TOLERANCE, (1, 255, 1)),
+			(PF_STRING, "streamPort", "Stream Serial Port", STREAM_DEFAULT_PORT),
+			(PF_OPTION, "streamBaud", "Stream Baud Rate", 0, tuple(str(baudRate) for baudRate in STREAM_BAUD_RATES)),
+			(PF_SPINNER, "streamLoops", "Stream Loops", 1, (1, 1000, 1)),
+			(PF_OPTION, "preview", "Preview", 0, ("None", "Animated GIF", "PNG Contact Sheet")),
+			(PF_TOGGLE, "savePattern", "Save Intermediate Pattern", False),
+			(PF_TOGGLE, "useCache", "Reuse Unchanged Frames", False),
+			(PF_OPTION, "profileReport", "Profiling Report", 0, ("None", "JSON", "CSV")),
+			(PF_TOGGLE, "profileDump", "cProfile Dump", False),
+			(PF_DIRNAME, "dir", "Directory", os.getcwd())
+
+			# Python-Fu Type, paramter-name, ui-text, default
+	    ],
+	    [],
+	    generate_led_pattern, menu="<Image>/File/Create" )
+
+	main()
+elif __name__ == "__main__":
+	sys.exit(runCommandLine(sys.argv[1:]))